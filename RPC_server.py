@@ -1,11 +1,35 @@
 from jsonrpc import JSONRPCResponseManager, dispatcher
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import itertools
+import os
 import threading
-from comment_scraper import fetch_app_urls_to_crawl, crawl_comments
-from app_scraper_check import give_information_app, check_and_create_app_id
-from analyze_sentiment import analyze_and_update_sentiment, fetch_comments_to_analyze
+from crawl_coordinator import LEASED_ELSEWHERE
+from crawl_scheduler import plan_crawl
+import sentiment_rollup
+import comment_query_api
+import tracing_func
+import live_profiler
+from tracing_func import trace
+from live_profiler import run_profiled
+from lazy_import_func import lazy_module
+from analyze_sentiment import (analyze_and_update_sentiment, analyze_texts as analyze_text_items, sentiment_summary,
+                               warmup_models, model_status as sentiment_model_status)
+from micro_batcher import MicroBatcher
+from scrape_spool import SPOOL_ENABLED, spool
+from inference_client import InferenceServiceError
+from sentiment_work_queue import iter_claimed_batches, release_leases
+from worker_id_func import worker_id
+from sentiment_rescore import rescore_outdated
 from logging_config import setup_logger
 
+# Selenium and scikit-learn are imported on the first request that needs them, so the server starts quickly
+comment_scraper = lazy_module("comment_scraper")
+comment_fetcher = lazy_module("comment_fetcher")
+app_scraper_check = lazy_module("app_scraper_check")
+persian_locale_func = lazy_module("persian_locale_func")
+topic_extraction = lazy_module("topic_extraction")
+comment_export = lazy_module("comment_export")
+
 # Setup logger
 logger = setup_logger('rpc_server', 'rpc_server.log')
 
@@ -16,6 +40,19 @@ tasks_lock = threading.Lock()
 # Event for synchronization
 crawl_event = threading.Event()  # Signaled when crawling is complete
 
+# Set to stop a running background re-scoring
+rescore_stop = threading.Event()
+
+# Daily app info update, run inside the server when DAILY_TASK_IN_RPC is set
+daily_scheduler = None
+
+# Most texts accepted by one analyze_texts call
+ANALYZE_TEXTS_MAX = int(os.getenv("ANALYZE_TEXTS_MAX", 100))
+# Concurrent analyze_texts calls are scored together
+text_batcher = MicroBatcher(analyze_text_items, name="analyze-texts")
+# Tags the items of each call, so near duplicates are never merged across callers
+analyze_texts_calls = itertools.count()
+
 
 class RequestHandler(BaseHTTPRequestHandler):
     def do_POST(self):
@@ -36,23 +73,27 @@ class RequestHandler(BaseHTTPRequestHandler):
 def perform_task(task_id, task_function, *args):
     global tasks_status
 
-    # Update task status to "working"
-    with tasks_lock:
-        tasks_status[task_id] = {"status": "working", "description": tasks_status[task_id]["description"]}
-
-    try:
-        # Execute the actual task function
-        logger.info(f"Starting task {task_id}: {tasks_status[task_id]['description']}")
-        task_function(*args)
-        # Update task status to "completed"
+    # Every run of a task gets its own trace id, so its spans can be told apart
+    with trace(f"task{task_id}") as trace_id:
+        # Update task status to "working"
         with tasks_lock:
-            tasks_status[task_id]["status"] = "completed"
-        logger.info(f"Task {task_id} completed successfully.")
-    except Exception as e:
-        # Update task status to "failed"
-        with tasks_lock:
-            tasks_status[task_id] = {"status": "failed", "description": tasks_status[task_id]["description"], "error": str(e)}
-        logger.error(f"Task {task_id} failed: {e}", exc_info=True)
+            tasks_status[task_id] = {"status": "working", "description": tasks_status[task_id]["description"],
+                                     "trace_id": trace_id}
+
+        try:
+            # Execute the actual task function
+            logger.info(f"Starting task {task_id}: {tasks_status[task_id]['description']} (trace {trace_id})")
+            run_profiled(task_function, *args)
+            # Update task status to "completed"
+            with tasks_lock:
+                tasks_status[task_id]["status"] = "completed"
+            logger.info(f"Task {task_id} completed successfully.")
+        except Exception as e:
+            # Update task status to "failed"
+            # Updated in place, so the progress of a failed run stays visible
+            with tasks_lock:
+                tasks_status[task_id].update({"status": "failed", "trace_id": trace_id, "error": str(e)})
+            logger.error(f"Task {task_id} failed: {e}", exc_info=True)
 
 
 @dispatcher.add_method
@@ -96,14 +137,76 @@ def sentiment_analysis(app_ids):
     return {"task_id": task_id, "message": "Task started: Sentiment analysis"}
 
 
+@dispatcher.add_method
+def scheduled_crawl(app_ids=None):
+    """Crawl and analyze only the apps whose store data changed since their last crawl."""
+    global tasks_status, crawl_event
+
+    crawl_event.clear()
+    task_id = "3"
+    with tasks_lock:
+        tasks_status[task_id] = {"status": "started", "description": "Crawling changed apps and analyzing sentiment"}
+    logger.info(f"Task {task_id} started: Scheduled crawl for app_ids {app_ids or 'all'}")
+
+    def wrapped_task():
+        try:
+            plans = [p for p in plan_crawl(app_ids) if p["crawl"]]
+            with tasks_lock:
+                tasks_status[task_id]["planned_app_ids"] = [p["app_id"] for p in plans]
+            comment_fetcher.crawl_apps([(p["app_id"], p["app_url"]) for p in plans])
+        finally:
+            crawl_event.set()
+        analyze_sentiments([p["app_id"] for p in plans])
+
+    threading.Thread(target=perform_task, args=(task_id, wrapped_task)).start()
+    return {"task_id": task_id, "message": "Task started: Scheduled crawl"}
+
+
+@dispatcher.add_method
+def crawl_plan(app_ids=None):
+    """Preview which apps a scheduled crawl would pick, highest expected volume first."""
+    plans = plan_crawl(app_ids)
+    return [{k: v for k, v in p.items() if k != "app_url"} for p in plans]
+
+
+@dispatcher.add_method
+def rescore_sentiments(app_ids=None, max_rows=None):
+    """Re-score comments of an older model version in the background, yielding to live analysis."""
+    global tasks_status
+
+    task_id = "4"
+    with tasks_lock:
+        if tasks_status.get(task_id, {}).get("status") in ("started", "working"):
+            return {"task_id": task_id, "message": "Re-scoring is already running"}
+        tasks_status[task_id] = {"status": "started", "description": "Re-scoring outdated sentiments"}
+    rescore_stop.clear()
+    logger.info(f"Task {task_id} started: Re-scoring outdated sentiments for app_ids {app_ids or 'all'}")
+
+    def wrapped_task():
+        with tasks_lock:
+            progress = tasks_status[task_id]["progress"] = {}
+        rescore_outdated(app_ids, max_rows, rescore_stop, progress)
+
+    threading.Thread(target=perform_task, args=(task_id, wrapped_task), daemon=True).start()
+    return {"task_id": task_id, "message": "Task started: Re-scoring outdated sentiments"}
+
+
+@dispatcher.add_method
+def stop_rescore():
+    """Stop the background re-scoring after its current chunk; a later run picks up the remaining rows."""
+    rescore_stop.set()
+    logger.info("Re-scoring stop requested through RPC.")
+    return {"status": "requested", "message": "Re-scoring will stop after the current chunk"}
+
+
 @dispatcher.add_method
 def check_add_url(crawl_url, crawl_app_nickname="unknown"):
     try:
         selected_domain = crawl_url.split("/")[2]
 
         if selected_domain == "cafebazaar.ir":
-            app_data = give_information_app(crawl_app_nickname, crawl_url)
-            [long_report, short_report] = check_and_create_app_id(app_data)
+            app_data = app_scraper_check.give_information_app(crawl_app_nickname, crawl_url)
+            [long_report, short_report] = app_scraper_check.check_and_create_app_id(app_data)
             logger.info(f"App URL checked. Report: {long_report}")
         else:
             long_report = f"The {crawl_url} is not related to Cafebazaar or not valid. Please try again"
@@ -129,34 +232,228 @@ def check_task_status(task_id):
             return {"status": "error", "message": "Task ID not found"}
 
 
+@dispatcher.add_method
+def daily_task_status():
+    """Next and last run of the embedded daily app info update."""
+    if daily_scheduler is None:
+        return {"status": "error", "message": "Daily task is not scheduled in this server"}
+    return daily_scheduler.status()
+
+
+@dispatcher.add_method
+def run_daily_task_now():
+    """Start the daily app info update now, or once more after the current run."""
+    if daily_scheduler is None:
+        return {"status": "error", "message": "Daily task is not scheduled in this server"}
+    daily_scheduler.run_now()
+    logger.info("Daily app info update requested through RPC.")
+    return {"status": "requested", "message": "Daily app info update requested"}
+
+
+@dispatcher.add_method
+def sentiment_trend(app_ids, date_from, date_to):
+    """Daily sentiment counts and average score per app between two Jalali dates (YYYYMMDD)."""
+    return sentiment_rollup.sentiment_trend(app_ids, date_from, date_to)
+
+
+@dispatcher.add_method
+def compare_apps(app_ids, date_from, date_to):
+    """Sentiment totals and average score per app between two Jalali dates (YYYYMMDD)."""
+    return sentiment_rollup.compare_apps(app_ids, date_from, date_to)
+
+
+@dispatcher.add_method
+def list_comments(app_id, columns=None, sentiments=None, min_rating=None, max_rating=None,
+                  date_from=None, date_to=None, limit=50, cursor=None):
+    """One page of an app's comments, newest first; pass the returned next_cursor to get the next page."""
+    try:
+        return comment_query_api.list_comments(app_id, columns, sentiments, min_rating, max_rating,
+                                               date_from, date_to, limit, cursor)
+    except ValueError as e:
+        # Bad cursor, unknown columns or a non-numeric limit
+        return {"status": "error", "message": str(e)}
+
+
+@dispatcher.add_method
+def extract_topics(app_ids, date_from=None, date_to=None, rebuild=False):
+    """Update the complaint and praise topics of apps for a Jalali date window in the background."""
+    global tasks_status
+
+    task_id = "5"
+    with tasks_lock:
+        tasks_status[task_id] = {"status": "started", "description": "Extracting complaint and praise topics"}
+    logger.info(f"Task {task_id} started: Extracting topics for app_ids {app_ids}")
+
+    def wrapped_task():
+        for app_id in app_ids:
+            topic_extraction.extract_topics(app_id, date_from, date_to, rebuild)
+
+    threading.Thread(target=perform_task, args=(task_id, wrapped_task)).start()
+    return {"task_id": task_id, "message": "Task started: Extracting topics"}
+
+
+@dispatcher.add_method
+def app_topics(app_id, polarity=None, date_from=None, date_to=None):
+    """Stored complaint ("complaint") and praise ("praise") topics of an app, largest first."""
+    return topic_extraction.get_topics(app_id, polarity, date_from, date_to)
+
+
+@dispatcher.add_method
+def export_comments(app_ids, export_format="csv", columns=None, sentiments=None, min_rating=None, max_rating=None,
+                    date_from=None, date_to=None, rows_per_file=None):
+    """Stream comments and sentiment of apps to CSV or Parquet files on the server in the background."""
+    global tasks_status
+
+    task_id = "6"
+    with tasks_lock:
+        if tasks_status.get(task_id, {}).get("status") in ("started", "working"):
+            return {"task_id": task_id, "message": "An export is already running"}
+        tasks_status[task_id] = {"status": "started", "description": "Exporting comments"}
+    logger.info(f"Task {task_id} started: Exporting comments of app_ids {app_ids} as {export_format}")
+
+    def wrapped_task():
+        with tasks_lock:
+            progress = tasks_status[task_id]["progress"] = {}
+        options = {} if rows_per_file is None else {"rows_per_file": rows_per_file}
+        comment_export.export_comments(app_ids, export_format, columns, sentiments, min_rating, max_rating,
+                                       date_from, date_to, progress=progress, **options)
+
+    threading.Thread(target=perform_task, args=(task_id, wrapped_task)).start()
+    return {"task_id": task_id, "message": "Task started: Exporting comments"}
+
+
+@dispatcher.add_method
+def trace_stats(trace_id=None, recent=0):
+    """Time per stage (count, total, max) of one trace, e.g. the trace_id of a task status, or of all traces."""
+    result = {"enabled": tracing_func.tracing_enabled(), "spans": tracing_func.span_stats(trace_id)}
+    if recent:
+        result["recent"] = tracing_func.recent_spans(trace_id, recent)
+    return result
+
+
+@dispatcher.add_method
+def set_tracing(enabled):
+    """Switch span timing on or off without restarting the server."""
+    tracing_func.set_tracing(enabled)
+    return {"enabled": tracing_func.tracing_enabled()}
+
+
+@dispatcher.add_method
+def start_profile(mode="sampling", interval_ms=10):
+    """Start profiling the live server: "sampling" samples every thread, "cprofile" profiles tasks started from now on."""
+    try:
+        return live_profiler.start_capture(mode, interval_ms)
+    except (RuntimeError, ValueError) as e:
+        return {"status": "error", "message": str(e)}
+
+
+@dispatcher.add_method
+def stop_profile(limit=50):
+    """Stop the running profile and return the hottest functions (and collapsed stacks when sampling)."""
+    try:
+        return live_profiler.stop_capture(limit)
+    except RuntimeError as e:
+        return {"status": "error", "message": str(e)}
+
+
+@dispatcher.add_method
+def analyze_texts(texts, ratings=None):
+    """
+    Score texts now with the same model cascade as sentiment_analysis; nothing is stored. Optional ratings (1-5, one per
+    text) let the second model decide for 1 and 5, as for stored comments.
+    """
+    if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+        return {"status": "error", "message": "texts must be a list of strings"}
+    if len(texts) > ANALYZE_TEXTS_MAX:
+        return {"status": "error", "message": f"At most {ANALYZE_TEXTS_MAX} texts per call"}
+    if ratings is not None and len(ratings) != len(texts):
+        return {"status": "error", "message": "ratings must have one entry per text"}
+    try:
+        call = next(analyze_texts_calls)
+        return text_batcher.submit([(text, rating, call) for text, rating in zip(texts, ratings or [None] * len(texts))])
+    except (OSError, InferenceServiceError) as e:
+        return {"status": "error", "message": f"Inference service failed: {e}"}
+
+
+@dispatcher.add_method
+def warmup(models=None):
+    """Load the sentiment models now (all of them by default) instead of on the first analysis."""
+    try:
+        return warmup_models(models)
+    except KeyError as e:
+        return {"status": "error", "message": f"Unknown model: {e}"}
+    except (OSError, InferenceServiceError) as e:
+        return {"status": "error", "message": f"Inference service failed: {e}"}
+
+
+@dispatcher.add_method
+def model_status():
+    """Which sentiment models are loaded, in use or idle, and how long they took to load."""
+    try:
+        return sentiment_model_status()
+    except (OSError, InferenceServiceError) as e:
+        return {"status": "error", "message": f"Inference service failed: {e}"}
+
+
+@dispatcher.add_method
+def spool_status():
+    """Scraped data waiting in the local spool for the database, and the last drain error if any."""
+    return spool.status()
+
+
+@dispatcher.add_method
+def scraper_stats():
+    """Counters of the app page scrapers in this server process."""
+    return {"locale_misses": persian_locale_func.locale_miss_count()}
+
+
 def fetch_and_crawl_comments(app_ids):
     logger.info("Fetching app URLs and crawling comments...")
-    apps = fetch_app_urls_to_crawl(app_ids)
-    for app_id, app_url in apps:
-        try:
-            logger.info(f"Starting to crawl comments for app_id {app_id} at {app_url}")
-            crawl_comments(app_id, app_url)
-            logger.info(f"Finished crawling comments for app_id {app_id}")
-        except Exception as e:
-            logger.error(f"Error crawling comments for app_id {app_id}: {e}", exc_info=True)
+    apps = comment_scraper.fetch_app_urls_to_crawl(app_ids)
+    # HTTP fetcher first, Selenium as the fallback for apps it cannot handle
+    results = comment_fetcher.crawl_apps(apps)
+    for app_id, fetcher_name in results.items():
+        if fetcher_name == LEASED_ELSEWHERE:
+            logger.info(f"Skipped app_id {app_id}: another crawler node is crawling it")
+        elif fetcher_name:
+            logger.info(f"Finished crawling comments for app_id {app_id} with the {fetcher_name} fetcher")
+        else:
+            logger.error(f"Error crawling comments for app_id {app_id}: all fetchers failed")
 
 
 def analyze_sentiments(app_ids):
     logger.info("Starting sentiment analysis...")
+    # Comments are leased in batches, so other analyzers (threads or hosts) never score the same ones
+    owner = worker_id()
     for app_id in app_ids:
         try:
-            comments = fetch_comments_to_analyze(app_id)
-            if not comments:
+            analyzed = 0
+            for comments in iter_claimed_batches(app_id, owner):
+                analyze_and_update_sentiment(comments, app_id)
+                analyzed += len(comments)
+            if not analyzed:
                 logger.info(f"No comments left to analyze for app_id {app_id}")
                 continue
-            analyze_and_update_sentiment(comments, app_id)
-            logger.info(f"Sentiment analysis completed for app_id {app_id}")
+            logger.info(f"Sentiment analysis completed for app_id {app_id} ({analyzed} comments)")
         except Exception as e:
             logger.error(f"Error during sentiment analysis for app_id {app_id}: {e}", exc_info=True)
+            release_leases(owner)
+    sentiment_summary.flush()
 
 
 if __name__ == "__main__":
     logger.info("Server running on port 5000...")
     crawl_event.set()
-    server = HTTPServer(("0.0.0.0", 5000), RequestHandler)
+    if SPOOL_ENABLED:
+        # Replays whatever an earlier run or an outage left in the spool
+        spool.start_drainer()
+    if os.getenv("DAILY_TASK_IN_RPC", "").lower() in ("1", "true", "yes"):
+        from daily_app_info_update import create_daily_scheduler
+        daily_scheduler = create_daily_scheduler()
+        daily_scheduler.start()
+    if os.getenv("MODEL_WARMUP_ON_START", "").lower() in ("1", "true", "yes"):
+        # Load the models in the background; requests are served meanwhile
+        threading.Thread(target=warmup_models, name="model-warmup", daemon=True).start()
+    # One thread per request, so concurrent analyze_texts calls can share a model batch
+    server = ThreadingHTTPServer(("0.0.0.0", 5000), RequestHandler)
     server.serve_forever()
@@ -1,32 +1,78 @@
 # Import libraries
-from transformers import MT5ForConditionalGeneration, MT5Tokenizer, pipeline
+import math
+import os
+import re
 import time
-# from googletrans import Translator
-from deep_translator import GoogleTranslator
 # Connect to database
 from connect_to_database_func import connect_db
+from sentiment_rollup import record_sentiment_change
+from normalize_persian_text_func import normalize_persian_text
+from near_duplicate_detector import NearDuplicateDetector
+from model_registry import ModelRegistry
+from inference_client import InferenceClient
 from dotenv import load_dotenv
-from logging_config import setup_logger  # Import logger setup function
+from tracing_func import span, traced
+from logging_config import setup_logger, LogSummary  # Import logger setup function
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Identifies the model cascade below; bump it when a model or the cascade rules change
+MODEL_VERSION = os.getenv("SENTIMENT_MODEL_VERSION", "mt5-parsinlu+distilbert-sst2:v1")
+
 # Initialize logger
 logger = setup_logger(name="sentiment_analysis", log_file="analyze_sentiment.log")
+# Scored comments are logged as periodic totals per sentiment; per-comment lines are DEBUG
+sentiment_summary = LogSummary(logger, "Scored comments")
+
+MT5_MODEL_NAME = "persiannlp/mt5-base-parsinlu-sentiment-analysis"
+
+
+# Models are loaded on first use (or by warmup) and released after MODEL_IDLE_TTL_SECONDS without use
+def load_mt5():
+    from transformers import MT5ForConditionalGeneration, MT5Tokenizer
+    tokenizer = MT5Tokenizer.from_pretrained(MT5_MODEL_NAME)
+    model = MT5ForConditionalGeneration.from_pretrained(MT5_MODEL_NAME)
+    return tokenizer, model
+
+
+# The second model (Hugging Face pipeline)
+def load_classifier():
+    from transformers import pipeline
+    return pipeline("sentiment-analysis", device=-1)
+
+
+def load_translator():
+    # from googletrans import Translator
+    from deep_translator import GoogleTranslator
+    return GoogleTranslator(source="auto", target="en")
+
+
+model_registry = ModelRegistry()
+model_registry.register("mt5", load_mt5)
+model_registry.register("classifier", load_classifier)
+model_registry.register("translator", load_translator)
 
-# Load the tokenizer and model
-logger.info("Loading MT5 model and tokenizer...")
-model_name = "persiannlp/mt5-base-parsinlu-sentiment-analysis"
-tokenizer = MT5Tokenizer.from_pretrained(model_name)
-model = MT5ForConditionalGeneration.from_pretrained(model_name)
+# With INFERENCE_SOCKET set, scoring goes to the shared inference service (inference_service.py)
+# and this process never loads the models itself
+INFERENCE_SOCKET = os.getenv("INFERENCE_SOCKET")
+inference_client = InferenceClient(INFERENCE_SOCKET) if INFERENCE_SOCKET else None
 
-# Load the second model (Hugging Face pipeline)
-logger.info("Loading Hugging Face sentiment classifier...")
-classifier = pipeline("sentiment-analysis", device=-1)
+# Groups near-identical comments before inference
+near_duplicate_detector = NearDuplicateDetector()
+
+# First-model results that the second model may refine
+NON_SENTIMENT_RESULTS = ["no sentiment expressed", "mixed", "neutral"]
+
+# Long-text policy: review chunks of at most this many tokens, and at most this many chunks per review
+SENTIMENT_MAX_TOKENS = int(os.getenv("SENTIMENT_MAX_TOKENS", 256))
+SENTIMENT_MAX_CHUNKS = int(os.getenv("SENTIMENT_MAX_CHUNKS", 4))
+# Chunks scored by the MT5 model in one forward pass
+SENTIMENT_BATCH_SIZE = int(os.getenv("SENTIMENT_BATCH_SIZE", 16))
+# Characters sent to the translator for the second model
+SECOND_MODEL_MAX_CHARS = int(os.getenv("SECOND_MODEL_MAX_CHARS", 2000))
+SENTENCE_END = re.compile(r"(?<=[.!?\u061f\u06d4])\s+|\n+")
 
-# Initialize Google Translator
-# translator = Translator()
-translator = GoogleTranslator(source="auto", target="en")
 # Sentiment mapping for scoring
 SENTIMENT_SCORES = {
     "very negative": -2,
@@ -60,17 +106,31 @@ def fetch_comments_to_analyze(app_id):
         return []
 
 # Update the comment table with the sentiment result and sentiment score
+@traced("db_write")
 def update_sentiment(comment_id, sentiment_result, sentiment_score, second_model_processed):
     # logger.info(f"Updating sentiment for comment_id: {comment_id}")
     try:
         conn = connect_db()
         cursor = conn.cursor()
         query = """
-            UPDATE comment
-            SET sentiment_result = %s, sentiment_score = %s, second_model_processed = %s
-            WHERE comment_id = %s;
+            WITH old AS (
+                SELECT comment_id, app_id, comment_date_jalali, sentiment_result, sentiment_score
+                FROM comment WHERE comment_id = %s FOR UPDATE
+            )
+            UPDATE comment AS c
+            SET sentiment_result = %s, sentiment_score = %s, second_model_processed = %s, model_version = %s,
+                analysis_lease_owner = NULL, analysis_lease_expires = NULL
+            FROM old
+            WHERE c.comment_id = old.comment_id
+            RETURNING old.app_id, old.comment_date_jalali, old.sentiment_result, old.sentiment_score;
         """
-        cursor.execute(query, (sentiment_result, sentiment_score, second_model_processed, comment_id))
+        cursor.execute(query, (comment_id, sentiment_result, sentiment_score, second_model_processed, MODEL_VERSION))
+        old = cursor.fetchone()
+        if old is not None:
+            # Move the comment between rollup buckets in the same transaction
+            app_id, comment_date_jalali, old_result, old_score = old
+            record_sentiment_change(cursor, app_id, comment_date_jalali, old_result, old_score,
+                                    sentiment_result, sentiment_score)
         conn.commit()
         cursor.close()
         conn.close()
@@ -78,38 +138,165 @@ def update_sentiment(comment_id, sentiment_result, sentiment_score, second_model
     except Exception as e:
         logger.error(f"Error updating sentiment for comment_id: {comment_id}: {e}", exc_info=True)
 
-def run_model(context, text_b="نظر شما چیست", **generator_args):
-    try:
-        logger.debug(f"Running MT5 model for text: {context}")
-        input_ids = tokenizer.encode(context + "<sep>" + text_b, return_tensors="pt")
-        res = model.generate(input_ids, **generator_args)
-        output = tokenizer.batch_decode(res, skip_special_tokens=True)
-
-        if not output:
-            raise ValueError("Model returned empty output.")
-        logger.info(f"MT5 model output: {output[0]}")
-        return output[0]
-    except Exception as e:
-        logger.error(f"Error in run_model: {e}", exc_info=False)
+# Split a review into sentences on Persian and Latin sentence ends and line breaks
+def split_sentences(text):
+    return [sentence.strip() for sentence in SENTENCE_END.split(text) if sentence.strip()]
+
+# Pack whole sentences into chunks of at most `max_tokens` tokens
+def chunk_text(text, max_tokens=SENTIMENT_MAX_TOKENS, max_chunks=SENTIMENT_MAX_CHUNKS):
+    sentences = split_sentences(text) or [text]
+    with model_registry.use("mt5") as (tokenizer, _):
+        lengths = [len(ids) for ids in tokenizer(sentences, add_special_tokens=False)["input_ids"]]
+    chunks, current, current_tokens = [], [], 0
+    for sentence, length in zip(sentences, lengths):
+        if current and current_tokens + length > max_tokens:
+            chunks.append(" ".join(current))
+            current, current_tokens = [], 0
+        # A single sentence over the limit is cut to SENTIMENT_MAX_TOKENS when it is scored
+        current.append(sentence)
+        current_tokens += length
+    chunks.append(" ".join(current))
+    if len(chunks) > max_chunks:
+        # Keep the opening and the conclusion of very long reviews
+        chunks = chunks[:max_chunks - 1] + chunks[-1:]
+    return chunks
+
+# Combine the labels of a review's chunks into one sentiment
+def aggregate_chunk_labels(labels):
+    """
+    Chunks without sentiment are ignored. Positive and negative chunks together make the review "mixed";
+    otherwise the mean chunk score is mapped back to a label.
+    """
+    scores = [SENTIMENT_SCORES[label] for label in labels
+              if label in SENTIMENT_SCORES and label != "no sentiment expressed"]
+    if not scores:
         return "no sentiment expressed"
+    if len(set(labels)) == 1:
+        return labels[0]
+    if any(score > 0 for score in scores) and any(score < 0 for score in scores):
+        return "mixed"
+    mean = sum(scores) / len(scores)
+    if mean <= -1.5:
+        return "very negative"
+    if mean <= -0.5:
+        return "negative"
+    if mean >= 1.5:
+        return "very positive"
+    if mean >= 0.5:
+        return "positive"
+    return "neutral"
+
+# Run the MT5 model over many short texts, in length-sorted batches to keep padding low
+def score_texts(texts, text_b="نظر شما چیست", batch_size=SENTIMENT_BATCH_SIZE, confidences=None, **generator_args):
+    """Pass a list as `confidences` to get the model's probability of each label in it (None where scoring failed)."""
+    results = ["no sentiment expressed"] * len(texts)
+    if confidences is not None:
+        confidences[:] = [None] * len(texts)
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    with model_registry.use("mt5") as (tokenizer, model):
+        # "<sep>", the question and the end-of-sequence token are appended after the context is cut to length,
+        # so an over-long chunk loses the end of its context and never the prompt the model was trained on
+        question_ids = tokenizer(["<sep>" + text_b])["input_ids"][0]
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            try:
+                context_ids = tokenizer([texts[i] for i in batch], add_special_tokens=False)["input_ids"]
+                inputs = tokenizer.pad({"input_ids": [list(ids[:SENTIMENT_MAX_TOKENS]) + list(question_ids)
+                                                      for ids in context_ids]}, return_tensors="pt")
+                with span("infer", batch=len(batch), tokens=len(inputs["input_ids"][0])):
+                    if confidences is None:
+                        res = model.generate(**inputs, **generator_args)
+                    else:
+                        generated = model.generate(**inputs, output_scores=True, return_dict_in_generate=True,
+                                                   **generator_args)
+                        res = generated.sequences
+                        for i, probability in zip(batch, label_probabilities(model, generated, tokenizer.pad_token_id)):
+                            confidences[i] = probability
+                output = tokenizer.batch_decode(res, skip_special_tokens=True)
+                if len(output) != len(batch):
+                    raise ValueError("Model returned an output of the wrong size.")
+                for i, label in zip(batch, output):
+                    results[i] = label.strip().lower()
+            except Exception as e:
+                logger.error(f"Error in score_texts: {e}", exc_info=False)
+    return results
+
+# Probability of each generated label: the product of its token probabilities
+def label_probabilities(model, generated, pad_token_id):
+    transition_scores = model.compute_transition_scores(generated.sequences, generated.scores, normalize_logits=True)
+    steps = len(transition_scores[0])
+    probabilities = []
+    for scores, tokens in zip(transition_scores.tolist(), generated.sequences[:, -steps:].tolist()):
+        # Finished labels are padded up to the longest one in the batch
+        log_probability = sum(score for score, token in zip(scores, tokens) if token != pad_token_id)
+        probabilities.append(round(math.exp(log_probability), 4))
+    return probabilities
+
+# Score whole reviews: long ones are chunked, every chunk goes through the same batch stream
+def score_sentiments(texts, confidences=None, **generator_args):
+    if inference_client is not None and not generator_args:
+        if confidences is None:
+            return inference_client.score_sentiments(texts)
+        labels, confidences[:] = inference_client.score_sentiments_with_confidence(texts)
+        return labels
+    return score_sentiments_in_process(texts, confidences, **generator_args)
+
+def score_sentiments_in_process(texts, confidences=None, **generator_args):
+    chunked = [chunk_text(text) for text in texts]
+    chunk_confidences = None if confidences is None else []
+    chunk_labels = score_texts([chunk for chunks in chunked for chunk in chunks], confidences=chunk_confidences,
+                               **generator_args)
+    labels = iter(chunk_labels)
+    results = [aggregate_chunk_labels([next(labels) for _ in chunks]) for chunks in chunked]
+    if confidences is not None:
+        # A chunked review gets the mean confidence of its chunks
+        chunk_confidences = iter(chunk_confidences)
+        confidences[:] = []
+        for chunks in chunked:
+            scored = [c for c in (next(chunk_confidences) for _ in chunks) if c is not None]
+            confidences.append(round(sum(scored) / len(scored), 4) if scored else None)
+    return results
 
 def run_second_model(comment_text):
+    return second_model_prediction(comment_text)[0]
+
+@traced("second_model")
+def second_model_prediction(comment_text):
+    """(label, classifier score) of the translated text."""
+    if inference_client is not None:
+        return inference_client.second_model_predictions([comment_text])[0]
+    return second_model_prediction_in_process(comment_text)
+
+def second_model_prediction_in_process(comment_text):
     try:
-        logger.debug(f"Running second model for text: {comment_text}")
-        # translated_text = translator.translate(comment_text, dest="en").text
-        translated_text = translator.translate(comment_text)
+        logger.debug("Running second model for text: %s", comment_text)
+        with model_registry.use("translator") as translator:
+            # translated_text = translator.translate(comment_text, dest="en").text
+            translated_text = translator.translate(comment_text[:SECOND_MODEL_MAX_CHARS])
         if not translated_text:
             raise ValueError("Translation returned empty text.")
         
-        result = classifier(translated_text)
+        with model_registry.use("classifier") as classifier:
+            result = classifier(translated_text, truncation=True)
         if not result or not isinstance(result, list):
             raise ValueError("Classifier returned invalid result.")
         
-        logger.info(f"Second model output: {result[0]['label']}")
-        return result[0]["label"]
+        logger.debug("Second model output: %s", result[0]["label"])
+        return result[0]["label"], round(float(result[0].get("score", 0)), 4)
     except Exception as e:
         logger.error(f"Error in run_second_model: {e}", exc_info=False)
-        return "no sentiment expressed"
+        return "no sentiment expressed", None
+
+# Load the models here, or check that the inference service is up
+def warmup_models(names=None):
+    if inference_client is not None:
+        return inference_client.status()
+    return model_registry.warmup(names)
+
+def model_status():
+    if inference_client is not None:
+        return inference_client.status()
+    return model_registry.status()
 
 # Validate sentiment result and assign score
 def validate_and_score_sentiment(sentiment_result):
@@ -117,37 +304,101 @@ def validate_and_score_sentiment(sentiment_result):
     if sentiment_result not in SENTIMENT_SCORES:
         sentiment_result = "no sentiment expressed"
     sentiment_score = SENTIMENT_SCORES[sentiment_result]
-    logger.debug(f"Validated sentiment: {sentiment_result}, Score: {sentiment_score}")
+    logger.debug("Validated sentiment: %s, Score: %s", sentiment_result, sentiment_score)
     return sentiment_result, sentiment_score
+
+# Apply conditional update logic based on second model result and rating
+def apply_second_model(sentiment_result, second_model_result, comment_rating):
+    """Returns (sentiment_result, second_model_processed)."""
+    if second_model_result == "NEGATIVE" and comment_rating == 1:
+        return "negative", True
+    if second_model_result == "POSITIVE" and comment_rating == 5:
+        return "positive", True
+    # Otherwise, retain the result of the first model
+    return sentiment_result, False
+
+# Score texts on demand with the same cascade as analyze_and_update_sentiment, without touching the database
+def analyze_texts(items):
+    """
+    `items` are (text, rating or None) pairs; the second model is only consulted for ratings 1 and 5.
+    Items may carry a third element naming the request they came from: near duplicates are only merged within a request,
+    so the requests of one micro-batch share the model batch but never each other's labels.
+    Returns one dict per item with the label, its score, the model confidences and whether the second model decided.
+    """
+    texts = [normalize_persian_text(item[0]) for item in items]
+    requests = {}
+    for i, item in enumerate(items):
+        requests.setdefault(item[2] if len(item) > 2 else None, []).append(i)
+    clusters = []
+    for indexes in requests.values():
+        clusters.extend([indexes[i] for i in cluster]
+                        for cluster in near_duplicate_detector.cluster([texts[i] for i in indexes]))
+    confidences = []
+    model_results = score_sentiments([texts[cluster[0]] for cluster in clusters], confidences)
+
+    results = [None] * len(items)
+    for cluster, model_result, confidence in zip(clusters, model_results, confidences):
+        second_model_result = second_model_confidence = None
+        try:
+            if model_result.lower() in NON_SENTIMENT_RESULTS and any(items[i][1] in (1, 5) for i in cluster):
+                second_model_result, second_model_confidence = second_model_prediction(texts[cluster[0]])
+        except Exception as e:
+            logger.error(f"Error in the second model for an online text: {e}", exc_info=True)
+            for i in cluster:
+                results[i] = {"label": "Missed Value", "score": 11, "confidences": {"model": confidence},
+                              "second_model": False}
+            continue
+        for i in cluster:
+            sentiment_result, second_model_processed = apply_second_model(model_result, second_model_result, items[i][1])
+            sentiment_result, sentiment_score = validate_and_score_sentiment(sentiment_result)
+            item_confidences = {"model": confidence}
+            if second_model_result is not None:
+                item_confidences["second_model"] = second_model_confidence
+            results[i] = {"label": sentiment_result, "score": sentiment_score, "confidences": item_confidences,
+                          "second_model": second_model_processed}
+    return results
+
 # Main function to fetch comments for a specific app_id and update sentiments
 def analyze_and_update_sentiment(comments, app_id):
-    logger.info(f"Starting sentiment analysis for app_id: {app_id}")
-    for comment_id, comment_text, comment_rating in comments:
-        try:
-            logger.info(f"Analyzing sentiment for comment_id: {comment_id}")
-            sentiment_result = run_model(comment_text)
-            second_model_processed = False
-            # If the first model returns "non-sentiment", run the second model
-            if sentiment_result.lower() in ["no sentiment expressed", "mixed", "neutral"]:
-                logger.debug(f"Running second model for comment_id: {comment_id}")
-                second_model_result = run_second_model(comment_text)
-
-            # Apply conditional update logic based on second model result and rating
-                if second_model_result == "NEGATIVE" and comment_rating == 1:
-                    sentiment_result = "negative"
-                    second_model_processed = True
-                    print("second_model is used")
-                elif second_model_result == "POSITIVE" and comment_rating == 5:
-                    sentiment_result = "positive"
-                    second_model_processed = True
-                    print("second_model is used")
-                # Otherwise, retain "no sentiment expressed"
+    logger.debug("Starting sentiment analysis for app_id: %s", app_id)
+    # Near-identical comments are scored once and the label is fanned out to the whole cluster
+    texts = [normalize_persian_text(comment_text) for _, comment_text, _ in comments]
+    clusters = near_duplicate_detector.cluster(texts)
+    logger.debug("Scoring %d distinct texts for %d comments of app_id: %s", len(clusters), len(comments), app_id)
+    sentiment_summary.add("near_duplicates", len(comments) - len(clusters))
 
-            sentiment_result, sentiment_score = validate_and_score_sentiment(sentiment_result)
-            update_sentiment(comment_id, sentiment_result, sentiment_score, second_model_processed)
-            logger.info(f"Updated comment_id: {comment_id} with sentiment: {sentiment_result}, score: {sentiment_score}")
+    # One batched pass of the first model over every distinct text
+    model_results = score_sentiments([texts[cluster[0]] for cluster in clusters])
+
+    for cluster, model_result in zip(clusters, model_results):
+        members = [comments[i] for i in cluster]
+        text = texts[cluster[0]]
+        try:
+            logger.debug("Analyzing sentiment for comment_id: %s (%d similar comments): %s", members[0][0], len(members), model_result)
+            second_model_result = None
+            # If the first model returns "non-sentiment", run the second model; it only matters for ratings 1 and 5
+            if model_result.lower() in NON_SENTIMENT_RESULTS and any(rating in (1, 5) for _, _, rating in members):
+                logger.debug("Running second model for comment_id: %s", members[0][0])
+                second_model_result = run_second_model(text)
         except Exception as e:
-            logger.error(f"Error processing comment_id: {comment_id}: {e}", exc_info=True)
-            update_sentiment(comment_id, "Missed Value", 11, False)
+            logger.error(f"Error processing comment_id: {members[0][0]}: {e}", exc_info=True)
+            for comment_id, _, _ in members:
+                update_sentiment(comment_id, "Missed Value", 11, False)
             continue
-        time.sleep(0.3)
+
+        for comment_id, _, comment_rating in members:
+            try:
+                sentiment_result, second_model_processed = apply_second_model(model_result, second_model_result, comment_rating)
+                sentiment_result, sentiment_score = validate_and_score_sentiment(sentiment_result)
+                update_sentiment(comment_id, sentiment_result, sentiment_score, second_model_processed)
+                logger.debug("Updated comment_id: %s with sentiment: %s, score: %s", comment_id, sentiment_result, sentiment_score)
+                sentiment_summary.add(sentiment_result)
+                if second_model_processed:
+                    sentiment_summary.add("second_model")
+            except Exception as e:
+                logger.error(f"Error processing comment_id: {comment_id}: {e}", exc_info=True)
+                update_sentiment(comment_id, "Missed Value", 11, False)
+                sentiment_summary.add("Missed Value")
+        if second_model_result is not None:
+            # Pace the translation requests of the second model
+            time.sleep(0.3)
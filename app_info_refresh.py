@@ -0,0 +1,113 @@
+# Import libraries
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from tenacity import Retrying, wait_exponential, stop_after_attempt, stop_after_delay
+from app_scraper_logging import fetch_urls_to_crawl, give_information_app, get_or_create_app_id, log_scrape
+from convert_to_jalali_func import convert_to_jalali
+from scrape_spool import drain_spool
+from logging_config import setup_logger
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Setup logger
+logger = setup_logger('app_info_refresh', 'daily_task.log')
+
+# Number of apps refreshed at the same time (each one runs its own Chrome)
+APP_INFO_WORKERS = int(os.getenv("APP_INFO_WORKERS", 3))
+# Retry policy per app: at most this many attempts, and no new attempt after the time budget is spent
+APP_INFO_MAX_ATTEMPTS = int(os.getenv("APP_INFO_MAX_ATTEMPTS", 3))
+APP_INFO_TIME_BUDGET = int(os.getenv("APP_INFO_TIME_BUDGET", 600))
+
+
+def process_app_info(app_id, app_nickname, app_url, last_base_64, app_scraped_time, app_scraped_time_jalali,
+                     page_load_timeout=350):
+    """
+    Process app information by scraping and logging results.
+    Raises RuntimeError when the app page could not be scraped, so the caller can retry.
+    """
+    logger.info(f"Processing app_id {app_id}, nickname: {app_nickname}")
+
+    # Scrape app data
+    app_data = give_information_app(app_id, app_nickname, app_url, last_base_64, page_load_timeout)
+    if not app_data:
+        raise RuntimeError(f"Failed to scrape app information for app_id {app_id}, nickname: {app_nickname}")
+
+    # Update app_info and retrieve the app_id
+    app_id = get_or_create_app_id(app_data, app_nickname)
+    logger.info(f"Updated app_info for app_id {app_id}, nickname: {app_nickname}")
+
+    # Log the scrape
+    log_scrape(app_data, app_id, app_nickname, app_scraped_time, app_scraped_time_jalali)
+    logger.info(f"Logged scrape for app_id {app_id}, nickname: {app_nickname}")
+
+
+def refresh_app(app, app_scraped_time, app_scraped_time_jalali,
+                max_attempts=APP_INFO_MAX_ATTEMPTS, time_budget=APP_INFO_TIME_BUDGET):
+    """Refresh one app under the retry policy and return its entry of the run summary."""
+    app_id, app_nickname, app_url, last_base_64 = app
+    start_time = time.monotonic()
+    result = {"app_id": app_id, "app_nickname": app_nickname, "status": "failed", "attempts": 0, "error": None}
+
+    retrying = Retrying(
+        wait=wait_exponential(multiplier=1, min=4, max=10),
+        stop=stop_after_attempt(max_attempts) | stop_after_delay(time_budget),
+        reraise=True,
+    )
+    try:
+        for attempt in retrying:
+            with attempt:
+                result["attempts"] = attempt.retry_state.attempt_number
+                # A single page load may not outlive what is left of the budget
+                remaining = max(time_budget - (time.monotonic() - start_time), 30)
+                process_app_info(app_id, app_nickname, app_url, last_base_64, app_scraped_time,
+                                 app_scraped_time_jalali, page_load_timeout=min(350, int(remaining)))
+        result["status"] = "ok"
+    except Exception as e:
+        result["error"] = str(e)
+        logger.error(f"Error processing app_id {app_id}, nickname: {app_nickname}: {e}", exc_info=True)
+
+    result["seconds"] = round(time.monotonic() - start_time, 1)
+    return result
+
+
+def refresh_all_apps(workers=APP_INFO_WORKERS, max_attempts=APP_INFO_MAX_ATTEMPTS, time_budget=APP_INFO_TIME_BUDGET):
+    """Refresh every app with a bounded pool of workers and return a run summary."""
+    urls_to_crawl = fetch_urls_to_crawl()
+    logger.info(f"Refreshing {len(urls_to_crawl)} apps with {workers} workers.")
+
+    app_time_now = datetime.now()
+    app_scraped_time = app_time_now
+    app_scraped_time_jalali = convert_to_jalali(app_time_now)
+
+    start_time = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="app_info") as executor:
+        results = list(executor.map(
+            lambda app: refresh_app(app, app_scraped_time, app_scraped_time_jalali, max_attempts, time_budget),
+            urls_to_crawl,
+        ))
+
+    summary = {
+        "started": app_time_now.strftime('%Y-%m-%d %H:%M:%S'),
+        "seconds": round(time.monotonic() - start_time, 1),
+        "workers": workers,
+        "succeeded": sum(1 for r in results if r["status"] == "ok"),
+        "failed": sum(1 for r in results if r["status"] != "ok"),
+        "apps": results,
+    }
+    log_run_summary(summary)
+    # Load the spooled scrape logs before the process may exit; what cannot be loaded stays spooled
+    drain_spool()
+    return summary
+
+
+def log_run_summary(summary):
+    """Write the run summary, slowest apps first, to the daily task log."""
+    logger.info(f"App info refresh finished in {summary['seconds']}s: "
+                f"{summary['succeeded']} succeeded, {summary['failed']} failed.")
+    for result in sorted(summary["apps"], key=lambda r: r["seconds"], reverse=True):
+        logger.info(f"  app_id {result['app_id']} ({result['app_nickname']}): {result['status']} "
+                    f"in {result['seconds']}s after {result['attempts']} attempt(s)")
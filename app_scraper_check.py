@@ -1,10 +1,10 @@
 # Import libraries
 from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-import time
+# Force the Persian locale
+from persian_locale_func import persian_url, persian_chrome_options, apply_persian_locale, record_locale_miss, locale_miss_count
 #convert to base64
 from convert_image_to_base64_func import convert_image_to_base64
 # to solve time out problem
@@ -16,6 +16,7 @@ from urllib.parse import urlparse
 from connect_to_database_func import connect_db
 from dotenv import load_dotenv
 from convert_image_to_base64_func import convert_image_to_base64
+from tracing_func import span
 from logging_config import setup_logger
 
 # Load environment variables from .env file
@@ -160,7 +161,8 @@ def is_persian(text):
 def load_page(driver, url):
     """Load a webpage with retries."""
     try:
-        driver.get(url)
+        with span("page_load", url=url):
+            driver.get(url)
         logger.info(f"Page loaded successfully: {url}")
     except Exception as e:
         logger.error(f"Error loading page: {url}: {e}", exc_info=True)
@@ -169,27 +171,27 @@ def load_page(driver, url):
 
 def give_information_app(app_nickname, url):
     """Scrape app information from the given URL."""
-    chrome_options = Options()
+    chrome_options = persian_chrome_options()
     chrome_options.add_argument("--headless")
-    chrome_options.add_argument("--lang=fa")
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-dev-shm-usage")
     chrome_options.add_argument("--disable-cache")
     chrome_options.add_argument("--incognito")
 
     driver = webdriver.Chrome(options=chrome_options)
+    # Set a longer page load timeout
     driver.set_page_load_timeout(350)
 
-    retry_count = 0
-    max_retries = 5  # Set a limit to retries
     App_info_zone = None  # Initialize to avoid unbound error
-    App_Name = None       # Ensure App_Name is always defined
+    App_Name = None  # Ensure App_Name is always defined
 
-    while retry_count < max_retries:
-        try:
-            load_page(driver, url)
+    try:
+        apply_persian_locale(driver)
+        # The locale is forced up front and verified once; a miss gets a single reload, not a refresh loop
+        for _ in range(2):
+            load_page(driver, persian_url(url))
             wait = WebDriverWait(driver, 20)
-            
+
             # Wait for the main app details
             wait.until(EC.presence_of_element_located((By.CLASS_NAME, 'AppDetails__col')))
             App_info_zone = driver.find_element(By.CLASS_NAME, 'AppDetails__col')
@@ -198,33 +200,33 @@ def give_information_app(app_nickname, url):
             if is_persian(App_Name):
                 logger.info("App information loaded in Persian.")
                 break
-            else:
-                logger.warning("App information in English. Retrying...")
-                retry_count += 1
-                time.sleep(2)
-                driver.refresh()
-        except Exception as e:
-            logger.error(f"Error during scraping attempt: {e}", exc_info=True)
-            retry_count += 1
-            continue
-
-    if retry_count == max_retries or App_info_zone is None or App_Name is None:
-        logger.error(f"Failed to scrape app details after {max_retries} retries.")
+            record_locale_miss()
+            logger.warning(f"App information in English despite the forced locale ({locale_miss_count()} locale misses so far).")
+            App_info_zone = None
+            apply_persian_locale(driver)
+    except Exception as e:
+        # Genuine page load failures were already retried by load_page
+        logger.error(f"Error during scraping attempt: {e}", exc_info=True)
+        App_info_zone = None
+
+    if App_info_zone is None:
+        logger.error("Failed to load app details in Persian.")
         driver.quit()
         return None
 
     # Ensure App_info_zone is defined before use
     try:
         # If the retry loop succeeded, App_info_zone should be defined
-        App_Name_Company = App_info_zone.find_element(By.CLASS_NAME, 'DetailsPageHeader__company').text
-        App_Version = App_info_zone.find_element(By.CLASS_NAME, 'DetailsPageHeader__subtitles').text
-        App_Install = App_info_zone.find_elements(By.CLASS_NAME, 'InfoCube__content')[0].text
-        App_Total_Rate = App_info_zone.find_elements(By.CLASS_NAME, 'InfoCube__title')[1].text
-        App_Average_Rate = App_info_zone.find_elements(By.CLASS_NAME, 'InfoCube__content')[1].text
-        App_Category = App_info_zone.find_elements(By.CLASS_NAME, 'InfoCube__content')[2].text
-        App_Size = App_info_zone.find_elements(By.CLASS_NAME, 'InfoCube__content')[3].text
-        App_Last_Update = App_info_zone.find_elements(By.CLASS_NAME, 'InfoCube__content')[4].text
-        App_Img = App_info_zone.find_element(By.TAG_NAME, 'img').get_attribute('src')
+        with span("extract", url=url):
+            App_Name_Company = App_info_zone.find_element(By.CLASS_NAME, 'DetailsPageHeader__company').text
+            App_Version = App_info_zone.find_element(By.CLASS_NAME, 'DetailsPageHeader__subtitles').text
+            App_Install = App_info_zone.find_elements(By.CLASS_NAME, 'InfoCube__content')[0].text
+            App_Total_Rate = App_info_zone.find_elements(By.CLASS_NAME, 'InfoCube__title')[1].text
+            App_Average_Rate = App_info_zone.find_elements(By.CLASS_NAME, 'InfoCube__content')[1].text
+            App_Category = App_info_zone.find_elements(By.CLASS_NAME, 'InfoCube__content')[2].text
+            App_Size = App_info_zone.find_elements(By.CLASS_NAME, 'InfoCube__content')[3].text
+            App_Last_Update = App_info_zone.find_elements(By.CLASS_NAME, 'InfoCube__content')[4].text
+            App_Img = App_info_zone.find_element(By.TAG_NAME, 'img').get_attribute('src')
 
         App_Img_Base64 = convert_image_to_base64(App_Img)
         app_package_name = extract_app_package_name(url)
@@ -1,18 +1,18 @@
 # Import libraries
 from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-import time
-# To solve time out problem
-from tenacity import retry, wait_exponential, stop_after_attempt
+# Force the Persian locale
+from persian_locale_func import persian_url, persian_chrome_options, apply_persian_locale, record_locale_miss, locale_miss_count
 from selenium.common.exceptions import TimeoutException
 # Convert to base64
-from convert_image_to_base64_func import convert_image_to_base64
+from convert_image_to_base64_func import fetch_icon
 # Connect to database
 from connect_to_database_func import connect_db
+from scrape_spool import SPOOL_ENABLED, spool_scrape_log
 from dotenv import load_dotenv
+from tracing_func import span
 from logging_config import setup_logger
 
 # Load environment variables from .env file
@@ -55,20 +55,24 @@ def get_or_create_app_id(data , app_nickname):
 
         if result:
             app_id = result[0]
-            update_query = """
+            params = [
+                data['App_Img'], data['App_Name_Company'], data['App_Version'],
+                data['App_Total_Rate'], data['App_Average_Rate'], data['App_Install'],
+                data['App_Category'], data['App_Size'], data['App_Last_Update'],
+            ]
+            # Leave the icon column alone when the icon did not change
+            set_icon = ""
+            if data.get('App_Img_Base64_Changed', True):
+                set_icon = ", app_img_base64 = %s"
+                params.append(data['App_Img_Base64'])
+            update_query = f"""
             UPDATE app_info
             SET app_img = %s, app_name_company = %s, app_version = %s, 
                 app_total_rate = %s, app_average_rate = %s, app_install = %s, 
-                app_category = %s, app_size = %s, app_last_update = %s, 
-                app_img_base64 = %s
+                app_category = %s, app_size = %s, app_last_update = %s{set_icon}
             WHERE app_id = %s;
             """
-            cursor.execute(update_query, (
-                data['App_Img'], data['App_Name_Company'], data['App_Version'],
-                data['App_Total_Rate'], data['App_Average_Rate'], data['App_Install'],
-                data['App_Category'], data['App_Size'], data['App_Last_Update'],
-                data['App_Img_Base64'], app_id
-            ))
+            cursor.execute(update_query, (*params, app_id))
             logger.info(f"Successfully updated app_info for app_id {app_id}.")
         else:
             logger.error(f"App does not exist in the database for {data['App_Name']}.")
@@ -84,6 +88,11 @@ def get_or_create_app_id(data , app_nickname):
 
 def log_scrape(data, app_id, app_nickname, app_scraped_time, app_scraped_time_jalali):
     """Log each scrape into the log_app table."""
+    if SPOOL_ENABLED:
+        # Loaded by the spool drainer, so a database outage does not lose the scrape
+        spool_scrape_log(data, app_id, app_nickname, app_scraped_time, app_scraped_time_jalali)
+        logger.info(f"Spooled scrape log for app_id {app_id}.")
+        return
     conn = connect_db()
     cursor = conn.cursor()
     try:
@@ -114,23 +123,22 @@ def is_persian(text):
     """Checks if the text contains Persian characters."""
     return any("\u0600" <= char <= "\u06FF" for char in text)
 
-# Retry with exponential backoff for driver.get
-@retry(wait=wait_exponential(multiplier=1, min=4, max=10), stop=stop_after_attempt(3), reraise=True)
+# Single attempt; retries of the nightly refresh are owned by app_info_refresh.refresh_app
 def load_page(driver, url):
-    """Load a webpage with retries."""
+    """Load a webpage."""
     try:
-        driver.get(url)
+        with span("page_load", url=url):
+            driver.get(url)
         logger.info(f"Page loaded successfully: {url}")
     except Exception as e:
         logger.error(f"Error loading page: {url}: {e}", exc_info=False)
         raise
 
 
-def give_information_app(app_id, app_name, url, last_base_64):
+def give_information_app(app_id, app_name, url, last_base_64, page_load_timeout=350):
     """Scrape app information from the given URL."""
-    chrome_options = Options()
+    chrome_options = persian_chrome_options()
     chrome_options.add_argument("--headless")
-    chrome_options.add_argument("--lang=fa")
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-dev-shm-usage")
     chrome_options.add_argument("--disable-cache")
@@ -138,18 +146,18 @@ def give_information_app(app_id, app_name, url, last_base_64):
 
     driver = webdriver.Chrome(options=chrome_options)
     # Set a longer page load timeout
-    driver.set_page_load_timeout(350)
+    driver.set_page_load_timeout(page_load_timeout)
 
-    retry_count = 0
-    max_retries = 5  # Set a limit to retries
     App_info_zone = None  # Initialize to avoid unbound error
     App_Name = None  # Ensure App_Name is always defined
 
-    while retry_count < max_retries:
-        try:
-            load_page(driver, url)
+    try:
+        apply_persian_locale(driver)
+        # The locale is forced up front and verified once; a miss gets a single reload, not a refresh loop
+        for _ in range(2):
+            load_page(driver, persian_url(url))
             wait = WebDriverWait(driver, 20)
-            
+
             # Wait for the main app details
             wait.until(EC.presence_of_element_located((By.CLASS_NAME, 'AppDetails__col')))
             App_info_zone = driver.find_element(By.CLASS_NAME, 'AppDetails__col')
@@ -158,35 +166,33 @@ def give_information_app(app_id, app_name, url, last_base_64):
             if is_persian(App_Name):
                 logger.info("App information loaded in Persian.")
                 break
-            else:
-                logger.warning("App information in English. Retrying...")
-                retry_count += 1
-                time.sleep(2)
-                driver.refresh()
-        except Exception as e:
-            logger.error(f"Error during scraping attempt: {e}", exc_info=False)
-            retry_count += 1
-
-    if retry_count == max_retries or App_info_zone is None:
-        if retry_count == max_retries:
-            logger.error(f"Failed to scrape app details after {max_retries} retries.")
-        else:
-            logger.error("App_info_zone was not set. Exiting function.")
+            record_locale_miss()
+            logger.warning(f"App information in English despite the forced locale ({locale_miss_count()} locale misses so far).")
+            App_info_zone = None
+            apply_persian_locale(driver)
+    except Exception as e:
+        # Genuine failures are retried by the caller, within its time budget
+        logger.error(f"Error during scraping attempt: {e}", exc_info=False)
+        App_info_zone = None
+
+    if App_info_zone is None:
+        logger.error("Failed to load app details in Persian.")
         driver.quit()
         return None
 
     try:
-        App_Name_Company = App_info_zone.find_element(By.CLASS_NAME, 'DetailsPageHeader__company').text
-        App_Version = App_info_zone.find_element(By.CLASS_NAME, 'DetailsPageHeader__subtitles').text
-        App_Install = App_info_zone.find_elements(By.CLASS_NAME, 'InfoCube__content')[0].text
-        App_Total_Rate = App_info_zone.find_elements(By.CLASS_NAME, 'InfoCube__title')[1].text
-        App_Average_Rate = App_info_zone.find_elements(By.CLASS_NAME, 'InfoCube__content')[1].text
-        App_Category = App_info_zone.find_elements(By.CLASS_NAME, 'InfoCube__content')[2].text
-        App_Size = App_info_zone.find_elements(By.CLASS_NAME, 'InfoCube__content')[3].text
-        App_Last_Update = App_info_zone.find_elements(By.CLASS_NAME, 'InfoCube__content')[4].text
-        App_Img = App_info_zone.find_element(By.TAG_NAME, 'img').get_attribute('src')
-
-        App_Img_Base64 = convert_image_to_base64(App_Img, last_base_64)
+        with span("extract", url=url):
+            App_Name_Company = App_info_zone.find_element(By.CLASS_NAME, 'DetailsPageHeader__company').text
+            App_Version = App_info_zone.find_element(By.CLASS_NAME, 'DetailsPageHeader__subtitles').text
+            App_Install = App_info_zone.find_elements(By.CLASS_NAME, 'InfoCube__content')[0].text
+            App_Total_Rate = App_info_zone.find_elements(By.CLASS_NAME, 'InfoCube__title')[1].text
+            App_Average_Rate = App_info_zone.find_elements(By.CLASS_NAME, 'InfoCube__content')[1].text
+            App_Category = App_info_zone.find_elements(By.CLASS_NAME, 'InfoCube__content')[2].text
+            App_Size = App_info_zone.find_elements(By.CLASS_NAME, 'InfoCube__content')[3].text
+            App_Last_Update = App_info_zone.find_elements(By.CLASS_NAME, 'InfoCube__content')[4].text
+            App_Img = App_info_zone.find_element(By.TAG_NAME, 'img').get_attribute('src')
+
+        App_Img_Base64, App_Img_Changed = fetch_icon(App_Img, last_base_64)
         APP_INFO = {
             'App_Name': App_Name,
             'App_Img': App_Img,
@@ -199,7 +205,8 @@ def give_information_app(app_id, app_name, url, last_base_64):
             'App_Size': App_Size,
             'App_Last_Update': App_Last_Update,
             'App_URL': url,
-            'App_Img_Base64': App_Img_Base64
+            'App_Img_Base64': App_Img_Base64,
+            'App_Img_Base64_Changed': App_Img_Changed
         }
         # logger.info(f"Scraped data: {APP_INFO}")
     except Exception as e:
@@ -0,0 +1,139 @@
+# Import libraries
+import argparse
+import json
+from db_migrations import run_migrations
+# Connect to database
+from connect_to_database_func import connect_db
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Everything is seeded into this schema of the local database and dropped afterwards
+BENCH_SCHEMA = "query_plan_bench"
+
+SCHEMA_SQL = """
+CREATE TABLE app_info (
+    app_id SERIAL PRIMARY KEY, app_name TEXT, app_nickname TEXT, app_url TEXT,
+    active BOOLEAN DEFAULT TRUE, deleted BOOLEAN DEFAULT FALSE, last_update_comment_scraping INTEGER
+);
+CREATE TABLE comment (
+    comment_id SERIAL PRIMARY KEY, app_id INTEGER, user_name TEXT, comment_text TEXT,
+    comment_rating REAL, comment_date DATE, second_model_processed BOOLEAN,
+    comment_idd BIGINT UNIQUE, comment_date_jalali INTEGER,
+    sentiment_result TEXT, sentiment_score INTEGER
+);
+CREATE TABLE log_app (
+    app_id INTEGER, app_total_rate TEXT, app_version TEXT, app_last_update TEXT,
+    app_scraped_time TIMESTAMP, app_scraped_time_jalali INTEGER
+);
+"""
+
+SEED_SQL = """
+INSERT INTO app_info (app_name, app_nickname, app_url)
+SELECT 'app ' || i, 'com.bench.app' || i, 'https://cafebazaar.ir/app/com.bench.app' || i
+FROM generate_series(1, %(apps)s) AS i;
+
+INSERT INTO comment (app_id, user_name, comment_text, comment_rating, comment_date,
+                     second_model_processed, comment_idd, comment_date_jalali, sentiment_result, sentiment_score)
+SELECT 1 + i %% %(apps)s, 'user', repeat('متن نظر ', 8), 1 + i %% 5, date '2020-01-01' + (i %% 1500),
+       FALSE, i, CASE WHEN i %% 100 = 0 THEN NULL ELSE 14000101 END,
+       CASE WHEN i %% 20 = 0 THEN NULL ELSE 'positive' END,
+       CASE WHEN i %% 20 = 0 THEN NULL ELSE 1 END
+FROM generate_series(1, %(comments)s) AS i;
+
+INSERT INTO log_app (app_id, app_total_rate, app_version, app_last_update, app_scraped_time, app_scraped_time_jalali)
+SELECT a, (1000 + d) || ' ratings', '1.0', '1403/01/01', timestamp '2024-01-01' + d * interval '1 day', 14030101 + d
+FROM generate_series(1, %(apps)s) AS a, generate_series(0, 364) AS d;
+"""
+
+# The hot queries of the application, with representative parameters
+HOT_QUERIES = {
+    "fetch_comments_to_analyze": (
+        "SELECT comment_id, comment_text, comment_rating FROM comment WHERE app_id = %s AND sentiment_score IS NULL",
+        (7,),
+    ),
+    "get_or_create_app_id": (
+        "SELECT app_id FROM app_info WHERE app_nickname = %s",
+        ("com.bench.app7",),
+    ),
+    "check_and_create_app_id": (
+        "SELECT app_id, deleted FROM app_info WHERE app_name = %s AND app_nickname = %s",
+        ("app 7", "com.bench.app7"),
+    ),
+    "update_jalali_dates": (
+        "SELECT comment_id, comment_date FROM comment "
+        "WHERE (comment_date_jalali IS NULL OR comment_date_jalali = 0) AND comment_id > %s "
+        "ORDER BY comment_id LIMIT 5000",
+        (0,),
+    ),
+    "crawl_scheduler_latest_snapshot": (
+        "SELECT app_total_rate FROM log_app WHERE app_id = %s ORDER BY app_scraped_time DESC LIMIT 1",
+        (7,),
+    ),
+}
+
+
+def scan_types(plan):
+    """Collect the scan node types of an EXPLAIN (FORMAT JSON) plan tree."""
+    types = []
+    if "Scan" in plan["Node Type"]:
+        types.append(plan["Node Type"] + (f" using {plan['Index Name']}" if "Index Name" in plan else ""))
+    for child in plan.get("Plans", []):
+        types.extend(scan_types(child))
+    return types
+
+
+def capture_plans(cursor):
+    """EXPLAIN ANALYZE every hot query; returns {name: {"scans": [...], "execution_ms": ...}}."""
+    plans = {}
+    for name, (query, params) in HOT_QUERIES.items():
+        cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, params)
+        result = cursor.fetchone()[0][0]
+        plans[name] = {"scans": scan_types(result["Plan"]), "execution_ms": result["Execution Time"]}
+    return plans
+
+
+def run_benchmark(apps, comments, keep=False):
+    conn = connect_db()
+    conn.autocommit = True
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE; CREATE SCHEMA {BENCH_SCHEMA};")
+        cursor.execute(f"SET search_path TO {BENCH_SCHEMA};")
+        cursor.execute(SCHEMA_SQL)
+        print(f"Seeding {apps} apps and {comments} comments...")
+        cursor.execute(SEED_SQL, {"apps": apps, "comments": comments})
+        cursor.execute("ANALYZE;")
+
+        before = capture_plans(cursor)
+        run_migrations(conn)
+        cursor.execute(f"SET search_path TO {BENCH_SCHEMA};")
+        cursor.execute("ANALYZE;")
+        after = capture_plans(cursor)
+    finally:
+        if not keep:
+            cursor.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE;")
+        cursor.close()
+        conn.close()
+
+    return {"apps": apps, "comments": comments, "before": before, "after": after}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare hot query plans before and after the migrations on a seeded local Postgres.")
+    parser.add_argument("--apps", type=int, default=2000)
+    parser.add_argument("--comments", type=int, default=1_000_000)
+    parser.add_argument("--output", help="Write the plans as JSON to this file")
+    parser.add_argument("--keep", action="store_true", help=f"Keep the {BENCH_SCHEMA} schema afterwards")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.apps, args.comments, args.keep)
+    for name in HOT_QUERIES:
+        before, after = report["before"][name], report["after"][name]
+        print(f"{name}:")
+        print(f"  before: {before['execution_ms']:9.2f} ms  {', '.join(before['scans'])}")
+        print(f"  after:  {after['execution_ms']:9.2f} ms  {', '.join(after['scans'])}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
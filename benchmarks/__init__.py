@@ -0,0 +1 @@
+# End-to-end pipeline benchmarks: python -m benchmarks.run_benchmark --help
@@ -0,0 +1,196 @@
+# Import libraries
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from benchmarks.synthetic_corpus import generate_corpus
+from benchmarks.stub_models import install_stub_models
+from inference_client import InferenceClient, INFERENCE_SOCKET
+from benchmarks.standin_db import StandinDatabase
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Synthetic comments are stored under this app
+BENCH_APP_ID = 1
+
+
+class StageTimer:
+    """Latencies of the calls of one pipeline stage and the number of comments they handled."""
+
+    def __init__(self):
+        self.latencies = []
+        self.items = 0
+
+    @contextmanager
+    def measure(self, items):
+        start = time.perf_counter()
+        yield
+        self.latencies.append(time.perf_counter() - start)
+        self.items += items
+
+    def report(self):
+        seconds = sum(self.latencies)
+        ordered = sorted(self.latencies)
+        return {
+            "calls": len(ordered),
+            "items": self.items,
+            "seconds": round(seconds, 4),
+            "items_per_second": round(self.items / seconds, 1) if seconds else None,
+            "latency_ms": {
+                "p50": round(statistics.median(ordered) * 1000, 3) if ordered else None,
+                "p95": round(ordered[math.ceil(0.95 * len(ordered)) - 1] * 1000, 3) if ordered else None,
+                "max": round(ordered[-1] * 1000, 3) if ordered else None,
+            },
+        }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def prepare_postgres(db_name):
+    """Point connect_db at a dedicated local database and recreate the schema in it."""
+    if db_name == os.getenv("DB_NAME"):
+        raise SystemExit("Refusing to benchmark against DB_NAME: pass a separate, disposable --pg-database.")
+    os.environ["DB_NAME"] = db_name
+    from connect_to_database_func import connect_db
+    from db_migrations import run_migrations
+    from benchmark_query_plans import SCHEMA_SQL
+
+    conn = connect_db()
+    conn.autocommit = True
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DROP SCHEMA IF EXISTS public CASCADE; CREATE SCHEMA public;")
+        cursor.execute(SCHEMA_SQL)
+        cursor.execute("INSERT INTO app_info (app_name, app_nickname) VALUES ('benchmark', 'com.bench.app');")
+        run_migrations(conn)
+    finally:
+        cursor.close()
+        conn.close()
+    return connect_db
+
+
+def clear_jalali_dates(database, connect):
+    if database is not None:
+        database.clear_jalali_dates()
+        return
+    conn = connect()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("UPDATE public.comment SET comment_date_jalali = NULL WHERE app_id = %s;", (BENCH_APP_ID,))
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def run_benchmark(size, duplicate_ratio, long_ratio, models, db, pg_database=None, insert_batch=500, seed=1,
+                  inference_socket=None):
+    if models == "stub":
+        install_stub_models()
+    database = None
+    if db == "standin":
+        database = StandinDatabase()
+        connect = database.connect
+    else:
+        connect = prepare_postgres(pg_database)
+
+    stages = {name: StageTimer() for name in
+              ("load_models", "generate_corpus", "build_rows", "save_comments_to_db",
+               "analyze_and_update_sentiment", "jalali_backfill")}
+
+    import analyze_sentiment
+    if models == "service":
+        # Score through a running inference service instead of loading the models here
+        analyze_sentiment.inference_client = InferenceClient(inference_socket)
+    with stages["load_models"].measure(0):
+        analyze_sentiment.warmup_models()
+    import comment_scraper
+    import convert_to_jalali
+    import sentiment_rollup
+    from sentiment_work_queue import ANALYSIS_BATCH_SIZE
+    for module in (analyze_sentiment, comment_scraper, convert_to_jalali, sentiment_rollup):
+        module.connect_db = connect
+
+    with stages["generate_corpus"].measure(size):
+        corpus = generate_corpus(size, duplicate_ratio, long_ratio, seed)
+
+    for start in range(0, size, insert_batch):
+        batch = corpus[start:start + insert_batch]
+        with stages["build_rows"].measure(len(batch)):
+            rows = [comment_scraper.build_comment_row(BENCH_APP_ID, c["user_name"], c["comment_text"], c["rating"],
+                                                      c["date"], c["comment_idd"]) for c in batch]
+        with stages["save_comments_to_db"].measure(len(rows)):
+            comment_scraper.save_comments_to_db(rows)
+
+    comments = analyze_sentiment.fetch_comments_to_analyze(BENCH_APP_ID)
+    for start in range(0, len(comments), ANALYSIS_BATCH_SIZE):
+        batch = comments[start:start + ANALYSIS_BATCH_SIZE]
+        with stages["analyze_and_update_sentiment"].measure(len(batch)):
+            analyze_sentiment.analyze_and_update_sentiment(batch, BENCH_APP_ID)
+
+    clear_jalali_dates(database, connect)
+    with stages["jalali_backfill"].measure(len(comments)):
+        convert_to_jalali.update_jalali_dates(BENCH_APP_ID, resume=False)
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "models": models,
+        "db": db,
+        "corpus": {"size": size, "duplicate_ratio": duplicate_ratio, "long_ratio": long_ratio, "seed": seed},
+        "stages": {name: timer.report() for name, timer in stages.items()},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if database is not None:
+        report["statements"] = dict(database.statements)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure pipeline throughput on a synthetic Persian corpus.")
+    parser.add_argument("--size", type=int, default=2000, help="Number of synthetic comments")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.3, help="Share of repeated reviews")
+    parser.add_argument("--long-ratio", type=float, default=0.05, help="Share of multi-paragraph reviews")
+    parser.add_argument("--models", choices=("stub", "real", "service"), default="stub")
+    parser.add_argument("--inference-socket", default=INFERENCE_SOCKET,
+                        help="Socket of the inference service for --models service")
+    parser.add_argument("--db", choices=("standin", "postgres"), default="standin")
+    parser.add_argument("--pg-database", help="Disposable local database for --db postgres; its schema is dropped")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    parser.add_argument("--verbose", action="store_true", help="Keep the pipeline's INFO logs")
+    args = parser.parse_args()
+    if args.db == "postgres" and not args.pg_database:
+        parser.error("--db postgres needs --pg-database")
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    report = run_benchmark(args.size, args.duplicate_ratio, args.long_ratio, args.models, args.db,
+                           args.pg_database, seed=args.seed, inference_socket=args.inference_socket)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
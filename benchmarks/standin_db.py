@@ -0,0 +1,175 @@
+# Import libraries
+import re
+import time
+from collections import defaultdict
+
+# Simulated network and server time of one statement
+STANDIN_SECONDS_PER_STATEMENT = 0.0005
+
+
+def _sql(statement):
+    if isinstance(statement, bytes):
+        statement = statement.decode("utf-8")
+    return " ".join(statement.split())
+
+
+class StandinDatabase:
+    """
+    In-memory stand-in for the few statements the benchmarked stages run, so the Python side of the
+    pipeline can be measured without a PostgreSQL server. Every statement costs STANDIN_SECONDS_PER_STATEMENT.
+    """
+
+    def __init__(self, seconds_per_statement=STANDIN_SECONDS_PER_STATEMENT):
+        self.seconds_per_statement = seconds_per_statement
+        # comment_id -> row dict
+        self.comments = {}
+        self.comment_ids_by_idd = {}
+        self.rollups = defaultdict(lambda: [0, 0])
+        self.statements = defaultdict(int)
+        self.handlers = [
+            (re.compile(r"^INSERT INTO public\.comment "), self._insert_comments),
+            (re.compile(r"^INSERT INTO sentiment_daily_rollup AS r"), self._add_rollups),
+            (re.compile(r"^DELETE FROM sentiment_daily_rollup"), self._clear_rollups),
+            (re.compile(r"^INSERT INTO sentiment_daily_rollup \("), self._rebuild_rollups),
+            (re.compile(r"^SELECT setval"), self._reset_sequence),
+            (re.compile(r"^SELECT comment_id, comment_text, comment_rating FROM comment WHERE app_id = %s AND "
+                        r"sentiment_score IS NULL"), self._unscored),
+            (re.compile(r"^WITH old AS"), self._update_sentiment),
+            (re.compile(r"^SELECT comment_id, comment_date FROM public\.comment"), self._missing_jalali),
+            (re.compile(r"^UPDATE public\.comment AS c SET comment_date_jalali"), self._set_jalali),
+        ]
+
+    def connect(self):
+        return StandinConnection(self)
+
+    def execute(self, statement, params, values):
+        sql = _sql(statement)
+        time.sleep(self.seconds_per_statement)
+        for pattern, handler in self.handlers:
+            if pattern.search(sql):
+                self.statements[handler.__name__.strip("_")] += 1
+                return handler(params, values)
+        raise NotImplementedError(f"Stand-in database does not support: {sql[:120]}")
+
+    def clear_jalali_dates(self):
+        for row in self.comments.values():
+            row["comment_date_jalali"] = None
+
+    def _insert_comments(self, params, values):
+        inserted = []
+        for app_id, user_name, text, rating, comment_date, second, comment_idd, jalali in values:
+            if comment_idd in self.comment_ids_by_idd:
+                continue
+            comment_id = len(self.comments) + 1
+            self.comment_ids_by_idd[comment_idd] = comment_id
+            self.comments[comment_id] = {
+                "comment_id": comment_id, "app_id": app_id, "comment_text": text, "comment_rating": rating,
+                "comment_date": comment_date, "comment_date_jalali": jalali,
+                "sentiment_result": None, "sentiment_score": None,
+            }
+            inserted.append((app_id, jalali))
+        return inserted, len(inserted)
+
+    def _add_rollups(self, params, values):
+        for app_id, date, result, count, score in values:
+            self.rollups[(app_id, date, result)][0] += count
+            self.rollups[(app_id, date, result)][1] += score
+        return [], len(values)
+
+    def _clear_rollups(self, params, values):
+        keys = [key for key in self.rollups if not params or key[0] == params[0]]
+        for key in keys:
+            del self.rollups[key]
+        return [], len(keys)
+
+    def _rebuild_rollups(self, params, values):
+        app_ids = params[1:]
+        for row in self.comments.values():
+            if app_ids and row["app_id"] != app_ids[0]:
+                continue
+            key = (row["app_id"], row["comment_date_jalali"] or 0, row["sentiment_result"] or params[0])
+            self.rollups[key][0] += 1
+            self.rollups[key][1] += row["sentiment_score"] or 0
+        return [], len(self.rollups)
+
+    def _reset_sequence(self, params, values):
+        return [(len(self.comments),)], 1
+
+    def _unscored(self, params, values):
+        rows = [(r["comment_id"], r["comment_text"], r["comment_rating"]) for r in self.comments.values()
+                if r["app_id"] == params[0] and r["sentiment_score"] is None]
+        return rows, len(rows)
+
+    def _update_sentiment(self, params, values):
+        comment_id, result, score = params[:3]
+        row = self.comments.get(comment_id)
+        if row is None:
+            return [], 0
+        old = (row["app_id"], row["comment_date_jalali"], row["sentiment_result"], row["sentiment_score"])
+        row["sentiment_result"], row["sentiment_score"] = result, score
+        return [old], 1
+
+    def _missing_jalali(self, params, values):
+        start_after = params[0]
+        rows = [(r["comment_id"], r["comment_date"]) for r in self.comments.values()
+                if not r["comment_date_jalali"] and r["comment_id"] > start_after
+                and (len(params) < 2 or r["app_id"] == params[1])]
+        return rows, len(rows)
+
+    def _set_jalali(self, params, values):
+        for comment_id, jalali in values:
+            self.comments[comment_id]["comment_date_jalali"] = jalali
+        return [], len(values)
+
+
+class StandinCursor:
+    def __init__(self, connection, name=None):
+        self.connection = connection
+        self.name = name
+        self.itersize = 2000
+        self.rowcount = -1
+        self._rows = []
+        self._values = []
+
+    def mogrify(self, template, args):
+        # execute_values joins the mogrified rows into one statement; keep the rows themselves instead
+        self._values.append(tuple(args))
+        return b"(?)"
+
+    def execute(self, statement, params=None):
+        values, self._values = self._values, []
+        self._rows, self.rowcount = self.connection.database.execute(statement, tuple(params or ()), values)
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchmany(self, size):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def close(self):
+        pass
+
+
+class StandinConnection:
+    encoding = "UTF8"
+
+    def __init__(self, database):
+        self.database = database
+        self.autocommit = False
+
+    def cursor(self, name=None):
+        return StandinCursor(self, name)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
@@ -0,0 +1,104 @@
+# Import libraries
+import sys
+import time
+import types
+import zlib
+import numpy as np
+
+# Simulated inference cost, so batching and padding show up in the numbers
+STUB_SECONDS_PER_TOKEN = 0.00002
+STUB_SECONDS_PER_TRANSLATION = 0.002
+
+LABELS = ["very negative", "negative", "neutral", "mixed", "positive", "very positive", "no sentiment expressed"]
+
+
+def _label(text):
+    return LABELS[zlib.crc32(text.encode("utf-8")) % len(LABELS)]
+
+
+class StubTokenizer:
+    """Whitespace tokenizer with the parts of the Hugging Face tokenizer API analyze_sentiment uses."""
+
+    @classmethod
+    def from_pretrained(cls, name):
+        return cls()
+
+    def __call__(self, texts, add_special_tokens=True, padding=False, truncation=False, max_length=None, **kwargs):
+        input_ids = [text.split() for text in texts]
+        if truncation and max_length:
+            input_ids = [ids[:max_length] for ids in input_ids]
+        if padding:
+            width = max((len(ids) for ids in input_ids), default=0)
+            input_ids = [ids + [""] * (width - len(ids)) for ids in input_ids]
+        return {"input_ids": input_ids}
+
+    def pad(self, encoded_inputs, return_tensors=None):
+        input_ids = encoded_inputs["input_ids"]
+        width = max((len(ids) for ids in input_ids), default=0)
+        return {"input_ids": [ids + [""] * (width - len(ids)) for ids in input_ids]}
+
+    def encode(self, text, return_tensors=None):
+        return [text.split()]
+
+    pad_token_id = 0
+
+    def batch_decode(self, outputs, skip_special_tokens=True):
+        return [output[-1] if isinstance(output, np.ndarray) else output for output in outputs]
+
+
+class StubModel:
+    @classmethod
+    def from_pretrained(cls, name):
+        return cls()
+
+    def generate(self, input_ids, **kwargs):
+        # Cost grows with the padded batch, like a real forward pass
+        time.sleep(STUB_SECONDS_PER_TOKEN * sum(len(ids) for ids in input_ids))
+        labels = [_label(" ".join(token for token in ids if token)) for ids in input_ids]
+        if kwargs.get("return_dict_in_generate"):
+            # One "token" per label, after the decoder start
+            sequences = np.empty((len(labels), 2), dtype=object)
+            sequences[:, 0] = 0
+            sequences[:, 1] = labels
+            return types.SimpleNamespace(sequences=sequences, scores=None)
+        return labels
+
+    def compute_transition_scores(self, sequences, scores, normalize_logits=False):
+        return np.array([[-0.1 - zlib.crc32(label.encode("utf-8")) % 10 / 10] for label in sequences[:, -1]])
+
+
+def stub_pipeline(task, **kwargs):
+    def classify(text, **call_kwargs):
+        return [{"label": "POSITIVE" if zlib.crc32(text.encode("utf-8")) % 2 else "NEGATIVE", "score": 0.9}]
+    return classify
+
+
+class StubTranslator:
+    def __init__(self, source="auto", target="en"):
+        pass
+
+    def translate(self, text):
+        time.sleep(STUB_SECONDS_PER_TRANSLATION)
+        return text
+
+
+def install_stub_models():
+    """Make `transformers` and `deep_translator` resolve to the stubs; call before any model is loaded."""
+    analyze_sentiment = sys.modules.get("analyze_sentiment")
+    if analyze_sentiment is not None and any(s["loaded"] for s in analyze_sentiment.model_registry.status().values()):
+        raise RuntimeError("analyze_sentiment has already loaded the real models")
+    transformers = types.ModuleType("transformers")
+    transformers.MT5Tokenizer = StubTokenizer
+    transformers.MT5ForConditionalGeneration = StubModel
+    transformers.pipeline = stub_pipeline
+    deep_translator = types.ModuleType("deep_translator")
+    deep_translator.GoogleTranslator = StubTranslator
+    sys.modules["transformers"] = transformers
+    sys.modules["deep_translator"] = deep_translator
+
+
+if __name__ == "__main__":
+    # Run the inference service with the stubs, for benchmarks with --models service
+    install_stub_models()
+    import inference_service
+    inference_service.serve()
@@ -0,0 +1,71 @@
+# Import libraries
+import random
+from datetime import date, timedelta
+
+# Building blocks of synthetic app store reviews of a banking app
+FEATURES = ["پرداخت قبض", "انتقال وجه", "رمز پویا", "ورود با اثر انگشت", "خرید شارژ", "کارت به کارت",
+            "صورتحساب", "پشتیبانی", "آپدیت جدید", "نمایش موجودی"]
+PRAISES = ["عالیه", "خیلی سریع انجام میشه", "بدون مشکل کار می‌کنه", "واقعا راحته", "از همه بانک‌ها بهتره"]
+COMPLAINTS = ["خطا میده", "کار نمی‌کنه", "خیلی کنده", "مدام قطع میشه", "پیامکش نمیاد", "بعد از ورود بسته میشه"]
+NEUTRAL = ["لطفا گزینه {} رو اضافه کنید", "{} کجاست؟", "چرا {} تغییر کرده"]
+CLOSINGS = ["ممنون", "لطفا درستش کنید", "امیدوارم بهتر بشه", "پنج ستاره", "یک ستاره هم زیاده"]
+USERS = ["علی", "مریم", "رضا", "سارا", "کاربر بازار", "محمد", "زهرا"]
+
+# Noise that near-duplicates pick up when users paste the same review
+ARABIC_FORMS = str.maketrans({"ی": "ي", "ک": "ك"})
+EMOJI = ["😡", "👍", "🙏", "❤️", "😞"]
+
+
+def _sentence(rng, rating):
+    feature = rng.choice(FEATURES)
+    if rating >= 4:
+        return f"{feature} {rng.choice(PRAISES)}"
+    if rating <= 2:
+        return f"{feature} {rng.choice(COMPLAINTS)}"
+    return rng.choice(NEUTRAL).format(feature)
+
+
+def _review(rng, rating, sentences):
+    body = ". ".join(_sentence(rng, rating) for _ in range(sentences))
+    return f"{body}. {rng.choice(CLOSINGS)}"
+
+
+def _near_duplicate(rng, text):
+    """A copy with the variations normalization has to undo: Arabic letters, stretched letters, emoji."""
+    variant = rng.randrange(3)
+    if variant == 0:
+        return text.translate(ARABIC_FORMS)
+    if variant == 1:
+        position = rng.randrange(len(text))
+        return text[:position] + text[position] * 4 + text[position + 1:]
+    return f"{text} {rng.choice(EMOJI) * rng.randint(1, 3)}"
+
+
+def generate_corpus(size, duplicate_ratio=0.3, long_ratio=0.05, seed=1, start_date=date(2024, 1, 1), days=365):
+    """
+    Synthetic Persian reviews as dicts of comment_idd, user_name, comment_text, rating and date (YYYY/MM/DD).
+    `duplicate_ratio` of them repeat an earlier review (exactly or with noise); `long_ratio` are multi-paragraph.
+    """
+    rng = random.Random(seed)
+    comments = []
+    for i in range(size):
+        rating = rng.choices([1, 2, 3, 4, 5], weights=[30, 8, 7, 10, 45])[0]
+        if comments and rng.random() < duplicate_ratio:
+            original = rng.choice(comments)
+            rating = original["rating"]
+            text = original["comment_text"]
+            if rng.random() < 0.5:
+                text = _near_duplicate(rng, text)
+        elif rng.random() < long_ratio:
+            text = "\n".join(_review(rng, rating, rng.randint(4, 8)) for _ in range(rng.randint(3, 6)))
+        else:
+            text = _review(rng, rating, rng.randint(1, 2))
+        comment_date = start_date + timedelta(days=rng.randrange(days))
+        comments.append({
+            "comment_idd": 800_000_000 + i,
+            "user_name": rng.choice(USERS),
+            "comment_text": text,
+            "rating": rating,
+            "date": comment_date.strftime("%Y/%m/%d"),
+        })
+    return comments
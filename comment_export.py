@@ -0,0 +1,234 @@
+# Import libraries
+import argparse
+import csv
+import os
+import time
+from datetime import datetime
+# Connect to database
+from connect_to_database_func import connect_db
+from comment_query_api import COMMENT_COLUMNS, DEFAULT_COLUMNS, comment_filters
+from logging_config import setup_logger
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Setup logger
+logger = setup_logger('comment_export', 'comment_export.log')
+
+# Directory the export files are written to
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+# Rows fetched from the server-side cursor at a time; also the Parquet row group size
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 10000))
+# A new part file is started after this many rows; 0 writes a single file
+EXPORT_ROWS_PER_FILE = int(os.getenv("EXPORT_ROWS_PER_FILE", 1000000))
+EXPORT_FORMATS = ("csv", "parquet")
+EXPORT_COLUMNS = COMMENT_COLUMNS + ("model_version",)
+
+# Parquet type of each column; comment_date_jalali stays a YYYYMMDD integer, as in the database
+PARQUET_TYPES = {
+    "comment_id": "int64",
+    "app_id": "int64",
+    "user_name": "string",
+    "comment_text": "string",
+    "comment_rating": "float32",
+    "comment_date": "date32",
+    "comment_date_jalali": "int32",
+    "sentiment_result": "string",
+    "sentiment_score": "int16",
+    "second_model_processed": "bool",
+    "model_version": "string",
+}
+
+
+def parquet_schema(columns):
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    fields = []
+    for column in columns:
+        metadata = {"calendar": "jalali", "format": "YYYYMMDD"} if column == "comment_date_jalali" else None
+        fields.append(pa.field(column, getattr(pa, PARQUET_TYPES[column])(), metadata=metadata))
+    return pa.schema(fields)
+
+
+# Parquet columns read through a cast, so every value fits the schema: the scraper stores comment_date as
+# 'YYYY-MM-DD' text and ratings as percent / 20, which can be fractional
+PARQUET_SELECT = {
+    "comment_date": "comment_date::date",
+    "comment_rating": "comment_rating::real",
+}
+
+
+class CsvPartWriter:
+    def __init__(self, path, columns):
+        # The byte order mark lets spreadsheet programs detect UTF-8 Persian text
+        self.file = open(path, "w", newline="", encoding="utf-8-sig")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetPartWriter:
+    def __init__(self, path, columns):
+        import pyarrow.parquet as pq
+        self.schema = parquet_schema(columns)
+        self.writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+
+    def write(self, rows):
+        import pyarrow as pa
+        # One row group per chunk, built column by column with the fixed schema
+        arrays = [pa.array([row[i] for row in rows], type=field.type) for i, field in enumerate(self.schema)]
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+PART_WRITERS = {"csv": CsvPartWriter, "parquet": ParquetPartWriter}
+
+
+class RollingExport:
+    """Write rows to numbered part files, starting a new one every `rows_per_file` rows."""
+
+    def __init__(self, output_dir, prefix, export_format, columns, rows_per_file):
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.export_format = export_format
+        self.columns = columns
+        self.rows_per_file = rows_per_file
+        self.files = []
+        self._writer = None
+        self._path = None
+        self._rows_in_file = 0
+
+    def _open(self):
+        self._path = os.path.join(self.output_dir, f"{self.prefix}-part{len(self.files):05d}.{self.export_format}")
+        # Written under a temporary name, so readers never see a half-written part
+        self._writer = PART_WRITERS[self.export_format](self._path + ".tmp", self.columns)
+        self._rows_in_file = 0
+
+    def _finish(self):
+        self._writer.close()
+        os.replace(self._path + ".tmp", self._path)
+        self.files.append(self._path)
+        self._writer = None
+
+    def write(self, rows):
+        while rows:
+            if self._writer is None:
+                self._open()
+            room = self.rows_per_file - self._rows_in_file if self.rows_per_file else len(rows)
+            self._writer.write(rows[:room])
+            self._rows_in_file += len(rows[:room])
+            rows = rows[room:]
+            if self.rows_per_file and self._rows_in_file >= self.rows_per_file:
+                self._finish()
+
+    def close(self):
+        if self._writer is None and not self.files:
+            # An empty export still gets a file with the header or schema
+            self._open()
+        if self._writer is not None:
+            self._finish()
+        return self.files
+
+    def abort(self):
+        """Remove every part written so far, so a failed export never looks complete."""
+        if self._writer is not None:
+            self._writer.close()
+            os.remove(self._path + ".tmp")
+            self._writer = None
+        for path in self.files:
+            if os.path.exists(path):
+                os.remove(path)
+        self.files.clear()
+
+
+def export_comments(app_ids, export_format="csv", columns=None, sentiments=None, min_rating=None, max_rating=None,
+                    date_from=None, date_to=None, output_dir=EXPORT_DIR, prefix=None,
+                    rows_per_file=EXPORT_ROWS_PER_FILE, chunk_size=EXPORT_CHUNK_SIZE, progress=None):
+    """
+    Stream the comments of apps into CSV or Parquet part files with constant memory, ordered by app and comment_id.
+    Dates are Jalali YYYYMMDD integers. `progress`, if given, is a dict updated as rows are written.
+    Returns {"files", "rows", "seconds"}.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}")
+    columns = list(columns or DEFAULT_COLUMNS)
+    unknown = [c for c in columns if c not in EXPORT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown columns: {unknown}")
+    if export_format == "parquet":
+        parquet_schema(columns)
+    prefix = prefix or f"comments-{datetime.now():%Y%m%d-%H%M%S}"
+    os.makedirs(output_dir, exist_ok=True)
+
+    conditions, params = comment_filters(sentiments, min_rating, max_rating, date_from, date_to)
+    conditions.insert(0, "app_id = ANY(%s)")
+    params.insert(0, list(app_ids))
+    select = [PARQUET_SELECT.get(c, c) if export_format == "parquet" else c for c in columns]
+    query = f"""
+        SELECT {", ".join(select)}
+        FROM public.comment
+        WHERE {" AND ".join(conditions)}
+        ORDER BY app_id, comment_id
+    """
+
+    export = RollingExport(output_dir, prefix, export_format, columns, rows_per_file)
+    if progress is not None:
+        progress.update({"rows": 0, "files": export.files})
+    total_rows = 0
+    start_time = time.monotonic()
+    conn = connect_db()
+    # Named cursor: rows stay on the server and arrive `itersize` at a time
+    db_cursor = conn.cursor(name="comment_export")
+    db_cursor.itersize = chunk_size
+    try:
+        db_cursor.execute(query, params)
+        while True:
+            rows = db_cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            export.write(rows)
+            total_rows += len(rows)
+            if progress is not None:
+                progress["rows"] = total_rows
+        files = export.close()
+    except Exception:
+        export.abort()
+        raise
+    finally:
+        db_cursor.close()
+        conn.close()
+
+    seconds = round(time.monotonic() - start_time, 1)
+    logger.info(f"Exported {total_rows} comments of apps {list(app_ids)} to {len(files)} {export_format} files "
+                f"in {seconds}s.")
+    return {"files": files, "rows": total_rows, "seconds": seconds}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export comments and their sentiment to CSV or Parquet files.")
+    parser.add_argument("--app-id", type=int, action="append", required=True, help="App to export (repeatable)")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--columns", help=f"Comma-separated columns out of: {', '.join(EXPORT_COLUMNS)}")
+    parser.add_argument("--sentiment", action="append", help="Only this sentiment, or 'unscored' (repeatable)")
+    parser.add_argument("--min-rating", type=int)
+    parser.add_argument("--max-rating", type=int)
+    parser.add_argument("--date-from", type=int, help="First Jalali date, YYYYMMDD")
+    parser.add_argument("--date-to", type=int, help="Last Jalali date, YYYYMMDD")
+    parser.add_argument("--output-dir", default=EXPORT_DIR)
+    parser.add_argument("--prefix", help="File name prefix (default: comments-<timestamp>)")
+    parser.add_argument("--rows-per-file", type=int, default=EXPORT_ROWS_PER_FILE, help="0 writes a single file")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+    print(export_comments(args.app_id, args.format, args.columns.split(",") if args.columns else None,
+                          args.sentiment, args.min_rating, args.max_rating, args.date_from, args.date_to,
+                          args.output_dir, args.prefix, args.rows_per_file, args.chunk_size))
@@ -0,0 +1,206 @@
+# Import libraries
+import asyncio
+from abc import ABC, abstractmethod
+import os
+import threading
+import time
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from comment_scraper import crawl_comments, build_comment_row, store_crawled_comments
+from scrape_spool import drain_spool
+from crawl_coordinator import run_leased, requeue_expired_leases, LEASED_ELSEWHERE, LeaseLostError
+from tracing_func import span
+from logging_config import setup_logger
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Setup logger
+logger = setup_logger('comment_fetcher', 'comment_fetcher.log')
+
+# Review endpoint of Cafe Bazaar; point it at comment_fixture_server.py to work offline
+COMMENT_API_URL = os.getenv("COMMENT_API_URL", "https://api.cafebazaar.ir/rest-v1/process/ReviewRequest")
+COMMENT_PAGE_SIZE = int(os.getenv("COMMENT_PAGE_SIZE", 50))
+COMMENT_MAX_PAGES = int(os.getenv("COMMENT_MAX_PAGES", 2000))
+COMMENT_FETCH_CONCURRENCY = int(os.getenv("COMMENT_FETCH_CONCURRENCY", 4))
+# "http" tries the API first and falls back to Selenium, "selenium" always uses the browser
+COMMENT_FETCHER = os.getenv("COMMENT_FETCHER", "http")
+
+# (connect, read) timeouts in seconds
+HTTP_TIMEOUT = (5, 30)
+
+
+def extract_package_name(app_url):
+    """Extract the package name (e.g. com.pmb.mobile) from a Cafe Bazaar app URL."""
+    path = urlparse(app_url).path.rstrip("/")
+    return path.split("/")[-1]
+
+
+def create_http_session(pool_size=COMMENT_FETCH_CONCURRENCY):
+    """Create a pooled HTTP session that retries transient server errors."""
+    retries = Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=None)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Content-Type": "application/json", "Accept-Language": "fa"})
+    return session
+
+
+class CommentFetcher(ABC):
+    """Base class of comment fetchers."""
+
+    name = "base"
+
+    @abstractmethod
+    def crawl(self, app_id, app_url):
+        """Store the comments of one app; raise on failure, so the next fetcher is tried."""
+
+
+class SeleniumCommentFetcher(CommentFetcher):
+    """Fetch comments by clicking through the app page in headless Chrome."""
+
+    name = "selenium"
+
+    # crawl_comments binds a fixed remote debugging port, so only one browser may run at a time
+    _browser_lock = threading.Lock()
+
+    def crawl(self, app_id, app_url):
+        with self._browser_lock, span("fetch", app_id=app_id, fetcher=self.name):
+            crawl_comments(app_id, app_url)
+        return None
+
+
+class HttpCommentFetcher(CommentFetcher):
+    """Page through comments with plain HTTP requests against the review endpoint."""
+
+    name = "http"
+
+    def __init__(self, api_url=COMMENT_API_URL, page_size=COMMENT_PAGE_SIZE, max_pages=COMMENT_MAX_PAGES, session=None):
+        self.api_url = api_url
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.session = session or create_http_session()
+
+    def request_page(self, package_name, start):
+        """Request one page of reviews and return (reviews, has_more)."""
+        payload = {
+            "properties": {"language": 2, "clientVersion": "web"},
+            "singleRequest": {
+                "reviewRequest": {"packageName": package_name, "start": start, "end": start + self.page_size}
+            },
+        }
+        with span("fetch", package=package_name, start=start):
+            response = self.session.post(self.api_url, json=payload, timeout=HTTP_TIMEOUT)
+            response.raise_for_status()
+            reply = response.json()["singleReply"]["reviewReply"]
+        if "reviews" not in reply:
+            raise ValueError(f"Review reply for {package_name} has no reviews field")
+        reviews = reply["reviews"]
+        has_more = reply.get("hasMore", len(reviews) == self.page_size)
+        return reviews, has_more
+
+    def parse_review(self, app_id, review):
+        """Convert one API review into a `comment` table row."""
+        return build_comment_row(
+            app_id,
+            review.get("user", ""),
+            review.get("comment", ""),
+            review.get("rate", 0),
+            review.get("date"),
+            int(review["id"]),
+            date_format="%Y-%m-%d",
+        )
+
+    def fetch(self, app_id, app_url):
+        """Fetch every comment of an app as `comment` table rows."""
+        package_name = extract_package_name(app_url)
+        comments_data = []
+        start = 0
+        for _ in range(self.max_pages):
+            reviews, has_more = self.request_page(package_name, start)
+            if not reviews and start == 0:
+                # An unknown package or a changed API; the browser fallback gets a chance before the counts are reset
+                raise ValueError(f"No reviews returned for {package_name}")
+            for review in reviews:
+                try:
+                    comments_data.append(self.parse_review(app_id, review))
+                except (KeyError, TypeError, ValueError) as e:
+                    logger.warning(f"Skipping malformed review for app_id {app_id}: {e}")
+            if not reviews or not has_more:
+                break
+            start += len(reviews)
+        logger.info(f"Fetched {len(comments_data)} comments over HTTP for app_id {app_id}.")
+        return comments_data
+
+    def crawl(self, app_id, app_url):
+        comments_data = self.fetch(app_id, app_url)
+        return store_crawled_comments(app_id, comments_data, len(comments_data))
+
+
+def crawl_app(app_id, app_url, fetchers):
+    """Crawl one app with the first fetcher that succeeds. Returns the name of that fetcher or None."""
+    for fetcher in fetchers:
+        start_time = time.monotonic()
+        try:
+            fetcher.crawl(app_id, app_url)
+            logger.info(f"Crawled app_id {app_id} with {fetcher.name} fetcher in {time.monotonic() - start_time:.1f}s.")
+            return fetcher.name
+        except LeaseLostError:
+            # Another node crawls the app now; no fallback either
+            raise
+        except Exception as e:
+            logger.warning(f"{fetcher.name} fetcher failed for app_id {app_id}: {e}", exc_info=True)
+    logger.error(f"All fetchers failed for app_id {app_id}.")
+    return None
+
+
+def default_fetchers():
+    """Fetchers in order of preference, according to COMMENT_FETCHER."""
+    if COMMENT_FETCHER == "selenium":
+        return [SeleniumCommentFetcher()]
+    return [HttpCommentFetcher(), SeleniumCommentFetcher()]
+
+
+async def crawl_apps_async(apps, fetchers=None, concurrency=COMMENT_FETCH_CONCURRENCY):
+    """
+    Crawl (app_id, app_url) pairs concurrently, at most `concurrency` apps at a time.
+    Each app is crawled under a crawl lease, so several crawler nodes can share one list of apps.
+    """
+    fetchers = fetchers or default_fetchers()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def crawl_one(app_id, app_url):
+        async with semaphore:
+            try:
+                return await asyncio.to_thread(run_leased, app_id, crawl_app, app_id, app_url, fetchers)
+            except Exception as e:
+                logger.error(f"Error coordinating the crawl of app_id {app_id}: {e}", exc_info=True)
+                return None
+
+    async def crawl_all(pairs):
+        results = await asyncio.gather(*(crawl_one(app_id, app_url) for app_id, app_url in pairs))
+        return dict(zip((app_id for app_id, _ in pairs), results))
+
+    results = await crawl_all(apps)
+
+    # Apps held by a node that died meanwhile are picked up once more
+    held_elsewhere = {app_id for app_id, result in results.items() if result == LEASED_ELSEWHERE}
+    if held_elsewhere:
+        requeued = set(await asyncio.to_thread(requeue_expired_leases)) & held_elsewhere
+        results.update(await crawl_all([(app_id, app_url) for app_id, app_url in apps if app_id in requeued]))
+    return results
+
+
+def crawl_apps(apps, fetchers=None, concurrency=COMMENT_FETCH_CONCURRENCY):
+    """
+    Blocking wrapper around crawl_apps_async.
+    Returns {app_id: fetcher name, None when every fetcher failed, or LEASED_ELSEWHERE}.
+    """
+    results = asyncio.run(crawl_apps_async(list(apps), fetchers, concurrency))
+    # Load the spooled comments now, so the analysis that follows a crawl sees them
+    drain_spool()
+    return results
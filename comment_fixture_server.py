@@ -0,0 +1,73 @@
+# Import libraries
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Recorded review pages, one JSON list of reviews per package name
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "comments")
+
+
+def load_recorded_reviews(fixtures_dir=FIXTURES_DIR):
+    """Load {package_name: [review, ...]} from the fixtures directory."""
+    recorded = {}
+    for file_name in os.listdir(fixtures_dir):
+        if file_name.endswith(".json"):
+            with open(os.path.join(fixtures_dir, file_name), encoding="utf-8") as f:
+                recorded[file_name[:-len(".json")]] = json.load(f)
+    return recorded
+
+
+def make_handler(recorded, latency=0.0):
+    """Build a request handler that answers review requests the way the Cafe Bazaar endpoint does."""
+
+    class FixtureRequestHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            content_length = int(self.headers['Content-Length'])
+            request = json.loads(self.rfile.read(content_length).decode())
+            review_request = request["singleRequest"]["reviewRequest"]
+            reviews = recorded.get(review_request["packageName"])
+            if reviews is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+
+            start, end = review_request["start"], review_request["end"]
+            page = reviews[start:end]
+            body = json.dumps({"singleReply": {"reviewReply": {"reviews": page, "hasMore": end < len(reviews)}}})
+
+            if latency:
+                time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(body.encode("utf-8"))
+
+        def log_message(self, format, *args):
+            pass
+
+    return FixtureRequestHandler
+
+
+def start_fixture_server(host="127.0.0.1", port=0, fixtures_dir=FIXTURES_DIR, latency=0.0):
+    """Serve recorded pages in a background thread. Returns (server, api_url); call server.shutdown() to stop."""
+    server = ThreadingHTTPServer((host, port), make_handler(load_recorded_reviews(fixtures_dir), latency))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_url = f"http://{host}:{server.server_address[1]}/rest-v1/process/ReviewRequest"
+    return server, api_url
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve recorded Cafe Bazaar review pages for offline crawling.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fixtures-dir", default=FIXTURES_DIR)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before answering each page")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(load_recorded_reviews(args.fixtures_dir), args.latency))
+    print(f"Serving recorded review pages on http://{args.host}:{args.port}/rest-v1/process/ReviewRequest")
+    print("Set COMMENT_API_URL to this address to crawl against it.")
+    server.serve_forever()
@@ -0,0 +1,128 @@
+# Import libraries
+import base64
+from datetime import date
+# Connect to database
+from connect_to_database_func import connect_db
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Columns a caller may ask for
+COMMENT_COLUMNS = (
+    "comment_id", "app_id", "user_name", "comment_text", "comment_rating", "comment_date",
+    "comment_date_jalali", "sentiment_result", "sentiment_score", "second_model_processed",
+)
+DEFAULT_COLUMNS = ("comment_id", "comment_text", "comment_rating", "comment_date_jalali", "sentiment_result")
+# Bounds on the size of one response
+MAX_PAGE_SIZE = 200
+MAX_TEXT_LENGTH = 2000
+# Filter value that matches comments without a sentiment yet
+UNSCORED = "unscored"
+
+
+def encode_cursor(comment_date, comment_id):
+    """Opaque cursor pointing just after (comment_date, comment_id). comment_date is a date or 'YYYY-MM-DD' text."""
+    if isinstance(comment_date, date):
+        comment_date = comment_date.isoformat()
+    return base64.urlsafe_b64encode(f"{comment_date}|{comment_id}".encode()).decode()
+
+
+def decode_cursor(cursor_token):
+    """
+    (comment_date, comment_id) of a cursor. The date stays 'YYYY-MM-DD' text, an untyped literal to Postgres, so it
+    compares with comment_date whether the column holds dates or the scraper's date strings.
+    """
+    try:
+        comment_date, comment_id = base64.urlsafe_b64decode(cursor_token.encode()).decode().split("|")
+        date.fromisoformat(comment_date)
+        return comment_date, int(comment_id)
+    except ValueError:
+        raise ValueError("Invalid cursor")
+
+
+def _serialize(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, str) and len(value) > MAX_TEXT_LENGTH:
+        return value[:MAX_TEXT_LENGTH]
+    return value
+
+
+def comment_filters(sentiments=None, min_rating=None, max_rating=None, date_from=None, date_to=None):
+    """SQL conditions and parameters for the comment filters shared by list_comments and comment_export."""
+    conditions = []
+    params = []
+    if sentiments:
+        sentiments = list(sentiments)
+        condition = "sentiment_result = ANY(%s)"
+        if UNSCORED in sentiments:
+            condition = f"({condition} OR sentiment_result IS NULL)"
+        conditions.append(condition)
+        params.append(sentiments)
+    if min_rating is not None:
+        conditions.append("comment_rating >= %s")
+        params.append(min_rating)
+    if max_rating is not None:
+        conditions.append("comment_rating <= %s")
+        params.append(max_rating)
+    if date_from is not None:
+        conditions.append("comment_date_jalali >= %s")
+        params.append(date_from)
+    if date_to is not None:
+        conditions.append("comment_date_jalali <= %s")
+        params.append(date_to)
+    return conditions, params
+
+
+def list_comments(app_id, columns=None, sentiments=None, min_rating=None, max_rating=None,
+                  date_from=None, date_to=None, limit=50, cursor=None):
+    """
+    One page of an app's comments, newest first, using keyset pagination on (comment_date, comment_id).
+    Comments without a comment_date cannot be paged by it and are left out. Dates are Jalali YYYYMMDD integers. Returns {"columns", "rows", "next_cursor"}; next_cursor is None on the last page.
+    """
+    columns = list(columns or DEFAULT_COLUMNS)
+    unknown = [c for c in columns if c not in COMMENT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown columns: {unknown}")
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+    conditions, params = comment_filters(sentiments, min_rating, max_rating, date_from, date_to)
+    conditions[:0] = ["app_id = %s", "comment_date IS NOT NULL"]
+    params.insert(0, app_id)
+    if cursor:
+        conditions.append("(comment_date, comment_id) < (%s, %s)")
+        params.extend(decode_cursor(cursor))
+
+    # comment_date and comment_id are always read for the cursor, and dropped unless requested
+    select_columns = columns + [c for c in ("comment_date", "comment_id") if c not in columns]
+    query = f"""
+        SELECT {", ".join(select_columns)}
+        FROM public.comment
+        WHERE {" AND ".join(conditions)}
+        ORDER BY comment_date DESC, comment_id DESC
+        LIMIT %s;
+    """
+    params.append(limit + 1)
+
+    conn = connect_db()
+    db_cursor = conn.cursor()
+    try:
+        db_cursor.execute(query, params)
+        rows = db_cursor.fetchall()
+    finally:
+        db_cursor.close()
+        conn.close()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = dict(zip(select_columns, rows[-1]))
+        next_cursor = encode_cursor(last["comment_date"], last["comment_id"])
+
+    width = len(columns)
+    return {
+        "columns": columns,
+        "rows": [[_serialize(value) for value in row[:width]] for row in rows],
+        "next_cursor": next_cursor,
+    }
@@ -14,8 +14,11 @@ from tenacity import retry, wait_exponential, stop_after_attempt
 from selenium.common.exceptions import TimeoutException
 # Connect to database
 from connect_to_database_func import connect_db
+from scrape_spool import SPOOL_ENABLED, insert_comment_rows, spool_crawl
+from crawl_coordinator import ensure_lease_held
 # Convert to jalali
 from convert_to_jalali_func import convert_to_jalali
+from tracing_func import span, traced
 from logging_config import setup_logger
 from dotenv import load_dotenv
 
@@ -82,6 +85,7 @@ def fetch_app_urls_to_crawl(app_ids=None):
         conn.close()
 
 
+@traced("db_write")
 def save_comments_to_db(comments):
     """Save comments in the database, ensuring uniqueness on `comment_idd`."""
     if not comments:
@@ -91,13 +95,8 @@ def save_comments_to_db(comments):
     conn = connect_db()
     cursor = conn.cursor()
     try:
-        insert_query = """
-        INSERT INTO public.comment (app_id, user_name, comment_text, comment_rating, comment_date, second_model_processed, comment_idd, comment_date_jalali)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        ON CONFLICT (comment_idd) DO NOTHING;
-        """
-        cursor.executemany(insert_query, comments)
-        new_comments_count = cursor.rowcount
+        # The new comments are counted in the dashboard rollups within the same transaction
+        new_comments_count = insert_comment_rows(cursor, comments)
         conn.commit()
 
         reset_query = """
@@ -115,19 +114,82 @@ def save_comments_to_db(comments):
         conn.close()
 
 
+def build_comment_row(app_id, username, comment_text, rating, date, comment_idd, date_format="%Y/%m/%d"):
+    """Build a `comment` table row; unparsable dates fall back to today, as on the website."""
+    try:
+        converted_date = datetime.strptime(date, date_format).strftime("%Y-%m-%d")
+    except (TypeError, ValueError):
+        converted_date = datetime.now().strftime("%Y-%m-%d")
+    comment_date_jalali = convert_to_jalali(converted_date)
+    return (app_id, username, comment_text, rating, converted_date, False, comment_idd, comment_date_jalali)
+
+
+def store_crawled_comments(app_id, comments_data, count_scraped_comments):
+    """
+    Save crawled comment rows and record the crawl in app_info. Returns the number of new comments,
+    or None when the rows went to the spool and are loaded by its drainer.
+    Raises LeaseLostError, storing nothing, when another node took over the app's crawl lease.
+    """
+    ensure_lease_held()
+    scraped_time_now = datetime.now().strftime("%Y-%m-%d")
+    comment_scraped_time = convert_to_jalali(scraped_time_now)
+    if SPOOL_ENABLED:
+        # Written to local disk first, so a slow or unavailable database never loses a finished crawl
+        spool_crawl(app_id, comments_data, count_scraped_comments, comment_scraped_time)
+        logger.info(f"Spooled {len(comments_data)} comments for app_id {app_id}.")
+        return None
+    new_comments_count = save_comments_to_db(comments_data)
+    save_details_to_app_info(app_id, count_scraped_comments, new_comments_count, comment_scraped_time)
+    return new_comments_count
+
+
 @retry(wait=wait_exponential(multiplier=1, min=4, max=10), stop=stop_after_attempt(3), reraise=True)
 def load_page(driver, url):
     """Load a page with retries."""
     try:
-        driver.get(url)
+        with span("page_load", url=url):
+            driver.get(url)
         logger.info(f"Successfully loaded page: {url}")
     except Exception as e:
         logger.error(f"Error loading page {url}: {e}", exc_info=True)
         raise
 
 
+@traced("extract")
+def extract_comment_rows(app_id, comments_elements):
+    """Read `comment` table rows out of the rendered comment elements."""
+    comments_data = []
+    for comment in tqdm(comments_elements, desc="Processing comments"):
+        try:
+            username = comment.find_element(By.CLASS_NAME, 'AppComment__username').text
+            comment_text = comment.find_element(By.CLASS_NAME, 'AppComment__body').text
+            date = comment.find_element(By.CLASS_NAME, 'AppComment__meta').text
+            comment_id_str = comment.get_attribute('id')
+            if comment_id_str is not None:
+                comment_idd = int(comment_id_str)
+            else:
+                logger.warning("Comment element missing 'id' attribute; skipping this comment.")
+                continue
+            style_attr = comment.find_element(By.CLASS_NAME, 'rating__fill').get_attribute('style')
+            if style_attr is not None:
+                try:
+                    rating_percent = style_attr.split()[1].split('%')[0]
+                    rating = int(rating_percent) / 20
+                except (IndexError, ValueError):
+                    logger.warning(f"Unexpected style format for rating: '{style_attr}'. Setting rating to 0.")
+                    rating = 0
+            else:
+                logger.warning("No 'style' attribute found for rating. Setting rating to 0.")
+                rating = 0
+
+            comments_data.append(build_comment_row(app_id, username, comment_text, rating, date, comment_idd))
+        except Exception as e:
+            logger.error(f"Error processing comment for app_id {app_id}: {e}", exc_info=True)
+    return comments_data
+
+
 def crawl_comments(app_id, app_url):
-    """Crawl comments for a specific app."""
+    """Crawl comments for a specific app. Raises TimeoutException when the app page does not load."""
     chrome_options = Options()
     chrome_options.add_argument("--headless")
     chrome_options.add_argument("--lang=fa")
@@ -149,7 +211,8 @@ def crawl_comments(app_id, app_url):
     except TimeoutException:
         logger.error(f"Timeout while loading page for app_id {app_id}.")
         driver.quit()
-        return
+        # Raised, so the caller does not count an unloaded page as a finished crawl
+        raise
 
     wait = WebDriverWait(driver, 10)
     
@@ -182,43 +245,7 @@ def crawl_comments(app_id, app_url):
     logger.info(f"Found {len(comments_elements)} comments for app_id {app_id}.")
 
     count_scraped_comments = len(comments_elements)
-    scraped_time_now = datetime.now().strftime("%Y-%m-%d")
-    comment_scraped_time = convert_to_jalali(scraped_time_now)
-
-    comments_data = []
-    for comment in tqdm(comments_elements, desc="Processing comments"):
-        try:
-            username = comment.find_element(By.CLASS_NAME, 'AppComment__username').text
-            comment_text = comment.find_element(By.CLASS_NAME, 'AppComment__body').text
-            date = comment.find_element(By.CLASS_NAME, 'AppComment__meta').text
-            comment_id_str = comment.get_attribute('id')
-            if comment_id_str is not None:
-                comment_idd = int(comment_id_str)
-            else:
-                logger.warning("Comment element missing 'id' attribute; skipping this comment.")
-                continue
-            style_attr = comment.find_element(By.CLASS_NAME, 'rating__fill').get_attribute('style')
-            if style_attr is not None:
-                try:
-                    rating_percent = style_attr.split()[1].split('%')[0]
-                    rating = int(rating_percent) / 20
-                except (IndexError, ValueError):
-                    logger.warning(f"Unexpected style format for rating: '{style_attr}'. Setting rating to 0.")
-                    rating = 0
-            else:
-                logger.warning("No 'style' attribute found for rating. Setting rating to 0.")
-                rating = 0
-            try:
-                converted_date = datetime.strptime(date, "%Y/%m/%d").strftime("%Y-%m-%d")
-                comment_date_jalali = convert_to_jalali(converted_date)
-            except ValueError:
-                converted_date = datetime.now().strftime("%Y-%m-%d")
-                comment_date_jalali = convert_to_jalali(converted_date)
-
-            comments_data.append((app_id, username, comment_text, rating, converted_date, False, comment_idd, comment_date_jalali))
-        except Exception as e:
-            logger.error(f"Error processing comment for app_id {app_id}: {e}", exc_info=True)
 
-    new_comments_count = save_comments_to_db(comments_data)
-    save_details_to_app_info(app_id, count_scraped_comments, new_comments_count, comment_scraped_time)
+    comments_data = extract_comment_rows(app_id, comments_elements)
+    store_crawled_comments(app_id, comments_data, count_scraped_comments)
     driver.quit()
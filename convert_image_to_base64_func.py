@@ -1,21 +1,121 @@
 # Libraries
 import base64
+import fcntl
+import hashlib
+import json
+import os
+import threading
 import requests
-from io import BytesIO
+from requests.adapters import HTTPAdapter
+from logging_config import setup_logger
 
-def convert_image_to_base64(image_url,last_base_64= None , size_h=32, size_w=32):
+# Setup logger
+logger = setup_logger('convert_image_to_base64', 'app_scraper_logging.log')
+
+# Validators (ETag/Last-Modified) and content hash of every icon seen, keyed by image URL
+ICON_CACHE_FILE = os.path.join("state", "icon_cache.json")
+# (connect, read) timeouts in seconds
+HTTP_TIMEOUT = (5, 20)
+
+_lock = threading.Lock()
+_session = None
+_icon_cache = None
+
+
+def get_session():
+    """Pooled HTTP session shared by every icon download."""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+
+def _read_cache_file():
+    try:
+        with open(ICON_CACHE_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _load_cache():
+    global _icon_cache
+    if _icon_cache is None:
+        _icon_cache = _read_cache_file()
+    return _icon_cache
+
+
+def _save_cache_entry(key, entry):
+    """
+    Store one entry in the cache file. Refresh workers in other processes write the same file, so the write is
+    serialized with a lock file, merged into the current contents and swapped in with a rename. Callers hold _lock.
+    """
+    global _icon_cache
     try:
-        image_reduced_size = image_url.split("?")[0]+f"?x-img=v1/resize,h_{size_h},w_{size_w},lossless_false/optimize"
-        # image_reduced_size = image_url
-        response = requests.get(image_reduced_size)
+        os.makedirs(os.path.dirname(ICON_CACHE_FILE), exist_ok=True)
+        with open(ICON_CACHE_FILE + ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            cache = _read_cache_file()
+            cache[key] = entry
+            with open(ICON_CACHE_FILE + ".tmp", "w") as f:
+                json.dump(cache, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(ICON_CACHE_FILE + ".tmp", ICON_CACHE_FILE)
+        _icon_cache = cache
+    except OSError as e:
+        _load_cache()[key] = entry
+        logger.error(f"Error saving icon cache to {ICON_CACHE_FILE}: {e}")
+
+
+def fetch_icon(image_url, last_base_64=None, size_h=32, size_w=32):
+    """
+    Fetch the resized icon as base64 with a conditional request.
+    Returns (base64_img, changed), where `changed` tells whether it differs from `last_base_64`.
+    """
+    image_reduced_size = image_url.split("?")[0] + f"?x-img=v1/resize,h_{size_h},w_{size_w},lossless_false/optimize"
+    last_hash = hashlib.sha256(last_base_64.encode()).hexdigest() if last_base_64 else None
+    with _lock:
+        entry = _load_cache().get(image_reduced_size)
+    if not isinstance(entry, dict):
+        # A malformed entry is a cache miss
+        entry = None
+
+    headers = {}
+    # Validators are only trusted while the stored icon is the one they were issued for
+    if entry and last_hash and entry.get("sha256") == last_hash:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    try:
+        response = get_session().get(image_reduced_size, headers=headers, timeout=HTTP_TIMEOUT)
+        if response.status_code == 304:
+            return last_base_64, False
         # Check if the request was successful
-        response.raise_for_status()  
-        # Read image data as bytes
-        img_data = BytesIO(response.content)  
+        response.raise_for_status()
         # Encode to base64 and decode to string
-        base64_img = base64.b64encode(img_data.getvalue()).decode('utf-8')  
-        return base64_img
+        base64_img = base64.b64encode(response.content).decode('utf-8')
     except requests.exceptions.RequestException as e:
-        print(f"Error fetching image from {image_url}: {e}")
-        return last_base_64
+        logger.error(f"Error fetching image from {image_url}: {e}")
+        return last_base_64, False
+
+    new_hash = hashlib.sha256(base64_img.encode()).hexdigest()
+    new_entry = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "sha256": new_hash,
+    }
+    if new_entry != entry:
+        with _lock:
+            _save_cache_entry(image_reduced_size, new_entry)
+    return base64_img, new_hash != last_hash
+
 
+def convert_image_to_base64(image_url, last_base_64=None, size_h=32, size_w=32):
+    return fetch_icon(image_url, last_base_64, size_h, size_w)[0]
@@ -1,83 +1,138 @@
 # Import packages
-from datetime import datetime, date
-from persiantools.jdatetime import JalaliDate
-import psycopg2
+import json
 import os
+import time
+from psycopg2.extras import execute_values
+from convert_to_jalali_func import convert_to_jalali_bulk
+# Connect to database
+from connect_to_database_func import connect_db
+from sentiment_rollup import rebuild_rollups
 from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
+# Rows read, converted, written and committed together
+BACKFILL_CHUNK_SIZE = int(os.getenv("BACKFILL_CHUNK_SIZE", 5000))
+# Last committed comment_id of an interrupted backfill, per app_id ("all" for every app)
+RESUME_FILE = os.path.join("state", "jalali_backfill.json")
 
-# Database connection function
-def connect_db():
-    conn = psycopg2.connect(
-        host=os.getenv("DB_HOST"),
-        database=os.getenv("DB_NAME"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASS"),
-        port=os.getenv("DB_PORT")
-    )
-    return conn
+
+def load_resume_key(scope):
+    try:
+        with open(RESUME_FILE) as f:
+            return json.load(f).get(scope, 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def save_resume_key(scope, comment_id):
+    try:
+        with open(RESUME_FILE) as f:
+            keys = json.load(f)
+    except (OSError, ValueError):
+        keys = {}
+    if comment_id is None:
+        keys.pop(scope, None)
+    else:
+        keys[scope] = comment_id
+    os.makedirs(os.path.dirname(RESUME_FILE), exist_ok=True)
+    with open(RESUME_FILE, "w") as f:
+        json.dump(keys, f)
+
+
+def convert_chunk(rows):
+    """Convert a chunk of (comment_id, comment_date) rows into (comment_id, jalali_date_int) pairs."""
+    jalali_dates = convert_to_jalali_bulk([comment_date for _, comment_date in rows])
+    return [(comment_id, jalali_date_int)
+            for (comment_id, _), jalali_date_int in zip(rows, jalali_dates)
+            if jalali_date_int is not None]
 
 
 # Function to update Jalali dates for comments
-def update_jalali_dates(app_id=None):
-    conn = connect_db()
-    cursor = conn.cursor()
+def update_jalali_dates(app_id=None, chunk_size=BACKFILL_CHUNK_SIZE, resume=True):
+    """
+    Backfill missing Jalali dates, streaming rows through a server-side cursor.
+    Every chunk is committed on its own, so an interrupted run resumes after the last committed comment_id.
+    """
+    scope = str(app_id) if app_id else "all"
+    start_after = load_resume_key(scope) if resume else 0
+    if start_after:
+        print(f"Resuming backfill after comment_id {start_after}.")
+
+    read_conn = connect_db()
+    write_conn = connect_db()
+    # Named cursor: rows stay on the server and arrive `itersize` at a time
+    read_cursor = read_conn.cursor(name="jalali_backfill")
+    read_cursor.itersize = chunk_size
+    write_cursor = write_conn.cursor()
 
     # SQL to fetch comments with missing Jalali dates
     query = """
-        SELECT comment_id, comment_date 
+        SELECT comment_id, comment_date
         FROM public.comment
-        WHERE (comment_date_jalali IS NULL OR comment_date_jalali = 0)
+        WHERE (comment_date_jalali IS NULL OR comment_date_jalali = 0) AND comment_id > %s
     """
-    params = []
+    params = [start_after]
     if app_id:
         query += " AND app_id = %s"
         params.append(app_id)
-    
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
+    query += " ORDER BY comment_id"
 
-    if not rows:
-        print("No rows to update.")
-        cursor.close()
-        conn.close()
-        return
-
-    updates = []
-    for comment_id, comment_date in rows:
-        try:
-            # Ensure `comment_date` is converted to `datetime.date` if necessary
-            if isinstance(comment_date, str):
-                comment_date = datetime.strptime(comment_date, "%Y-%m-%d").date()
-            
-            # Convert to Jalali and format as integer
-            jalali_date = JalaliDate(comment_date)
-            jalali_date_int = int(jalali_date.strftime("%Y%m%d"))  # Convert to integer in YYYYMMDD format
-            updates.append((jalali_date_int, comment_id))
-        except ValueError as e:
-            print(f"Skipping invalid date {comment_date}: {e}")
-        except Exception as e:
-            print(f"Error converting date {comment_date}: {e}")
-
-    if updates:
-        try:
-            cursor.executemany(
-                "UPDATE public.comment SET comment_date_jalali = %s WHERE comment_id = %s;",
-                updates,
-            )
-            conn.commit()
-            print(f"Successfully updated {len(updates)} rows.")
-        except Exception as e:
-            print(f"Error updating Jalali dates: {e}")
+    total_rows = total_updated = 0
+    start_time = time.monotonic()
+    try:
+        read_cursor.execute(query, params)
+        while True:
+            chunk_start = time.monotonic()
+            rows = read_cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+
+            updates = convert_chunk(rows)
+            if updates:
+                execute_values(
+                    write_cursor,
+                    """
+                    UPDATE public.comment AS c SET comment_date_jalali = v.jalali
+                    FROM (VALUES %s) AS v(comment_id, jalali)
+                    WHERE c.comment_id = v.comment_id;
+                    """,
+                    updates,
+                    page_size=chunk_size,
+                )
+            write_conn.commit()
+            save_resume_key(scope, rows[-1][0])
+
+            total_rows += len(rows)
+            total_updated += len(updates)
+            chunk_seconds = time.monotonic() - chunk_start
+            print(f"Updated {len(updates)} of {len(rows)} rows up to comment_id {rows[-1][0]} "
+                  f"({len(rows) / max(chunk_seconds, 1e-6):.0f} rows/s).")
+    except Exception as e:
+        write_conn.rollback()
+        print(f"Error updating Jalali dates, rerun to resume: {e}")
+        raise
+    finally:
+        read_cursor.close()
+        read_conn.close()
+        write_cursor.close()
+        write_conn.close()
+
+    # Finished: the next backfill starts from the beginning again
+    save_resume_key(scope, None)
+    if total_updated:
+        # Backfilled comments move out of the day-0 bucket of the dashboard rollups
+        rebuild_rollups(app_id)
+    elapsed = time.monotonic() - start_time
+    if total_rows:
+        print(f"Successfully updated {total_updated} of {total_rows} rows in {elapsed:.1f}s "
+              f"({total_rows / max(elapsed, 1e-6):.0f} rows/s).")
     else:
-        print("No valid dates to update.")
+        print("No rows to update.")
+    return {"rows": total_rows, "updated": total_updated, "seconds": round(elapsed, 1)}
 
-    cursor.close()
-    conn.close()
 
 if __name__ == "__main__":
     app_id = input("Enter app_id to test (or press Enter to process all): ").strip()
     app_id = int(app_id) if app_id else None
-    update_jalali_dates(app_id)
\ No newline at end of file
+    update_jalali_dates(app_id)
@@ -1,15 +1,80 @@
 # Import libraries
 from persiantools.jdatetime import JalaliDate
-from datetime import datetime
+from datetime import datetime, date, timedelta
+from functools import lru_cache
+
+# Dates in this range are converted through a precomputed day-number lookup table
+TABLE_START = date(2000, 1, 1)
+TABLE_END = date(2040, 12, 31)
+_jalali_table = None
+
+
+@lru_cache(maxsize=4096)
+def _parse_date(text):
+    return datetime.strptime(text, "%Y-%m-%d").date()
+
+
+def _to_date(gregorian_date):
+    if isinstance(gregorian_date, str):
+        return _parse_date(gregorian_date)
+    if isinstance(gregorian_date, datetime):
+        return gregorian_date.date()
+    return gregorian_date
+
+
+@lru_cache(maxsize=4096)
+def _jalali_int(gregorian_date):
+    return int(JalaliDate(gregorian_date).strftime("%Y%m%d"))
+
+
+def jalali_table():
+    """YYYYMMDD Jalali integers of every day from TABLE_START to TABLE_END, indexed by day number."""
+    global _jalali_table
+    if _jalali_table is None:
+        days = (TABLE_END - TABLE_START).days + 1
+        _jalali_table = [int(JalaliDate(TABLE_START + timedelta(days=i)).strftime("%Y%m%d")) for i in range(days)]
+    return _jalali_table
+
 
 def convert_to_jalali(gregorian_date):
     """Convert a Gregorian date to Jalali date in YYYYMMDD integer format."""
     try:
-        if isinstance(gregorian_date, str):
-            gregorian_date = datetime.strptime(gregorian_date, "%Y-%m-%d").date()
-        jalali_date = JalaliDate(gregorian_date)
-        return int(jalali_date.strftime("%Y%m%d"))
+        return _jalali_int(_to_date(gregorian_date))
     except Exception as e:
         print(f"Error converting date {gregorian_date}: {e}")
         return None
 
+
+def convert_to_jalali_bulk(gregorian_dates):
+    """
+    Convert many Gregorian dates (strings, dates, datetimes or a numpy datetime64 array)
+    to YYYYMMDD Jalali integers. Invalid dates become None.
+    """
+    if getattr(gregorian_dates, "dtype", None) is not None and gregorian_dates.dtype.kind == "M":
+        return _convert_datetime64(gregorian_dates)
+
+    table = jalali_table()
+    base = TABLE_START.toordinal()
+    result = []
+    for gregorian_date in gregorian_dates:
+        try:
+            index = _to_date(gregorian_date).toordinal() - base
+        except Exception:
+            result.append(convert_to_jalali(gregorian_date))
+            continue
+        result.append(table[index] if 0 <= index < len(table) else convert_to_jalali(gregorian_date))
+    return result
+
+
+def _convert_datetime64(gregorian_dates):
+    import numpy as np
+
+    table = np.asarray(jalali_table(), dtype=np.int64)
+    epoch_offset = (date(1970, 1, 1) - TABLE_START).days
+    indexes = gregorian_dates.astype("datetime64[D]").astype(np.int64) + epoch_offset
+    in_table = (indexes >= 0) & (indexes < len(table))
+    result = table[np.where(in_table, indexes, 0)].astype(object)
+    for i in np.flatnonzero(~in_table):
+        value = gregorian_dates[i]
+        result[i] = None if np.isnat(value) else convert_to_jalali(value.astype("datetime64[D]").item())
+    return result.tolist()
@@ -0,0 +1,175 @@
+# Import libraries
+import os
+import threading
+# Connect to database
+from connect_to_database_func import connect_db
+from worker_id_func import worker_id
+from logging_config import setup_logger
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Setup logger
+logger = setup_logger('crawl_coordinator', 'comment_scraper.log')
+
+# A crawl lease lapses if its holder stops heartbeating for this many seconds
+CRAWL_LEASE_SECONDS = int(os.getenv("CRAWL_LEASE_SECONDS", 300))
+CRAWL_HEARTBEAT_SECONDS = int(os.getenv("CRAWL_HEARTBEAT_SECONDS", 60))
+
+# Returned by run_leased when another node holds the app
+LEASED_ELSEWHERE = "leased-elsewhere"
+
+# Heartbeat of the lease held by the current thread, checked before crawl results are stored
+_held_lease = threading.local()
+
+
+class LeaseLostError(RuntimeError):
+    """The crawl lease went to another node while the crawl ran; its results must not be stored."""
+
+
+def ensure_lease_held():
+    """Raise LeaseLostError if this thread's crawl lease was lost. Does nothing outside run_leased."""
+    lease = getattr(_held_lease, "heartbeat", None)
+    if lease is not None and lease.lost.is_set():
+        raise LeaseLostError(f"Crawl lease of app_id {lease.app_id} was lost by {lease.owner}")
+
+
+def claim_app(app_id, owner, lease_seconds=CRAWL_LEASE_SECONDS):
+    """Lease an app to `owner` unless another live node holds it. Returns True when claimed."""
+    conn = connect_db()
+    cursor = conn.cursor()
+    try:
+        query = """
+            INSERT INTO crawl_lease (app_id, owner, expires_at, heartbeat_at)
+            VALUES (%s, %s, now() + make_interval(secs => %s), now())
+            ON CONFLICT (app_id) DO UPDATE
+            SET owner = EXCLUDED.owner, expires_at = EXCLUDED.expires_at, heartbeat_at = EXCLUDED.heartbeat_at
+            WHERE crawl_lease.owner IS NULL OR crawl_lease.expires_at < now()
+            RETURNING app_id;
+        """
+        cursor.execute(query, (app_id, owner, lease_seconds))
+        claimed = cursor.fetchone() is not None
+        conn.commit()
+        return claimed
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def heartbeat(app_id, owner, lease_seconds=CRAWL_LEASE_SECONDS):
+    """Extend a held lease. Returns False when the lease was lost to another node."""
+    conn = connect_db()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            UPDATE crawl_lease SET expires_at = now() + make_interval(secs => %s), heartbeat_at = now()
+            WHERE app_id = %s AND owner = %s;
+        """, (lease_seconds, app_id, owner))
+        alive = cursor.rowcount == 1
+        conn.commit()
+        return alive
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def release_app(app_id, owner, status):
+    """Give the app back and record how the crawl ended."""
+    conn = connect_db()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            UPDATE crawl_lease
+            SET owner = NULL, expires_at = NULL, last_finished_at = now(), last_status = %s
+            WHERE app_id = %s AND owner = %s;
+        """, (status, app_id, owner))
+        conn.commit()
+    except Exception as e:
+        logger.error(f"Error releasing crawl lease of app_id {app_id}: {e}", exc_info=True)
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def requeue_expired_leases():
+    """Free the leases of crashed crawler nodes. Returns the app_ids that were re-queued."""
+    conn = connect_db()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            UPDATE crawl_lease SET owner = NULL, expires_at = NULL, last_status = 'expired'
+            WHERE owner IS NOT NULL AND expires_at < now()
+            RETURNING app_id;
+        """)
+        app_ids = [row[0] for row in cursor.fetchall()]
+        conn.commit()
+        if app_ids:
+            logger.warning(f"Re-queued apps with expired crawl leases: {app_ids}")
+        return app_ids
+    finally:
+        cursor.close()
+        conn.close()
+
+
+class LeaseHeartbeat:
+    """
+    Heartbeat a crawl lease from a background thread while the crawl runs. When the lease is lost, `lost` is set,
+    storing results raises LeaseLostError, and leaving the block raises it too.
+    """
+
+    def __init__(self, app_id, owner, interval=CRAWL_HEARTBEAT_SECONDS):
+        self.app_id = app_id
+        self.owner = owner
+        self.interval = interval
+        self.lost = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._beat, name=f"lease-{app_id}", daemon=True)
+
+    def _beat(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                if not heartbeat(self.app_id, self.owner):
+                    logger.warning(f"Crawl lease of app_id {self.app_id} was lost by {self.owner}.")
+                    self.lost.set()
+                    return
+            except Exception as e:
+                logger.error(f"Heartbeat failed for app_id {self.app_id}: {e}")
+
+    def __enter__(self):
+        _held_lease.heartbeat = self
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stopped.set()
+        self._thread.join()
+        _held_lease.heartbeat = None
+        if self.lost.is_set() and exc_type is None:
+            raise LeaseLostError(f"Crawl lease of app_id {self.app_id} was lost by {self.owner}")
+
+
+def run_leased(app_id, crawl_function, *args):
+    """
+    Run crawl_function(*args) while holding the crawl lease of app_id.
+    Returns LEASED_ELSEWHERE without running it when another node holds the app, and raises LeaseLostError
+    when the lease is lost before the crawl ends.
+    """
+    owner = worker_id()
+    if not claim_app(app_id, owner):
+        logger.info(f"Skipping app_id {app_id}: another crawler holds its lease.")
+        return LEASED_ELSEWHERE
+
+    status = "failed"
+    lease = LeaseHeartbeat(app_id, owner)
+    try:
+        with lease:
+            result = crawl_function(*args)
+        status = "completed" if result else "failed"
+        return result
+    finally:
+        if lease.lost.is_set():
+            # The lease belongs to another node now; its status is not ours to record
+            logger.warning(f"Dropped the crawl of app_id {app_id}: its lease was lost.")
+        else:
+            release_app(app_id, owner, status)
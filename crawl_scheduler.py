@@ -0,0 +1,146 @@
+# Import libraries
+import os
+import re
+from datetime import date
+from persiantools.jdatetime import JalaliDate
+# Connect to database
+from connect_to_database_func import connect_db
+from logging_config import setup_logger
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Setup logger
+logger = setup_logger('crawl_scheduler', 'crawl_scheduler.log')
+
+# Minimum growth of the rating count that makes new comments likely
+CRAWL_MIN_NEW_RATINGS = int(os.getenv("CRAWL_MIN_NEW_RATINGS", 1))
+# Rough share of ratings that come with a written comment
+COMMENTS_PER_RATING = float(os.getenv("COMMENTS_PER_RATING", 0.3))
+# Comments expected after a new version or store update, when the rating count does not move
+VERSION_CHANGE_EXPECTED_COMMENTS = int(os.getenv("VERSION_CHANGE_EXPECTED_COMMENTS", 20))
+# Rating counts are rounded on the store page ("۲۵ هزار"), so crawl anyway after this many days
+CRAWL_MAX_AGE_DAYS = int(os.getenv("CRAWL_MAX_AGE_DAYS", 7))
+
+PERSIAN_DIGITS = str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩٫", "01234567890123456789.")
+MULTIPLIERS = {"هزار": 1_000, "میلیون": 1_000_000, "k": 1_000, "m": 1_000_000}
+
+
+def parse_rate_count(text):
+    """Parse a rating count such as '۲۵ هزار امتیاز' or '1,234 reviews' into an integer (None if unknown)."""
+    if not text:
+        return None
+    text = text.translate(PERSIAN_DIGITS).replace(",", "").replace("٬", "").lower()
+    match = re.search(r"\d+(\.\d+)?", text)
+    if not match:
+        return None
+    value = float(match.group())
+    suffix = text[match.end():].strip()
+    for word, multiplier in MULTIPLIERS.items():
+        if suffix.startswith(word):
+            value *= multiplier
+            break
+    return int(value)
+
+
+def days_since_jalali(jalali_int, today=None):
+    """Number of days between a YYYYMMDD Jalali integer and today."""
+    year, month, day = jalali_int // 10000, jalali_int // 100 % 100, jalali_int % 100
+    return ((today or date.today()) - JalaliDate(year, month, day).to_gregorian()).days
+
+
+def fetch_app_snapshots(app_ids=None):
+    """
+    For each active app, fetch the latest log_app snapshot and the last snapshot taken
+    before the previous comment crawl.
+    """
+    conn = connect_db()
+    cursor = conn.cursor()
+    try:
+        query = """
+            SELECT a.app_id, a.app_url, a.last_update_comment_scraping,
+                   cur.app_total_rate, cur.app_version, cur.app_last_update,
+                   prev.app_total_rate, prev.app_version, prev.app_last_update
+            FROM public.app_info a
+            LEFT JOIN LATERAL (
+                SELECT app_total_rate, app_version, app_last_update FROM public.log_app l
+                WHERE l.app_id = a.app_id
+                ORDER BY l.app_scraped_time DESC LIMIT 1
+            ) cur ON TRUE
+            LEFT JOIN LATERAL (
+                SELECT app_total_rate, app_version, app_last_update FROM public.log_app l
+                WHERE l.app_id = a.app_id AND l.app_scraped_time_jalali < a.last_update_comment_scraping
+                ORDER BY l.app_scraped_time DESC LIMIT 1
+            ) prev ON TRUE
+            WHERE a.active = TRUE AND a.deleted = FALSE
+        """
+        params = []
+        if app_ids:
+            query += " AND a.app_id = ANY(%s)"
+            params.append(list(app_ids))
+        cursor.execute(query, params)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def assess_app(snapshot, today=None):
+    """Decide whether an app likely has new comments. Returns a crawl plan entry."""
+    (app_id, app_url, last_crawl_jalali,
+     rate, version, last_update, prev_rate, prev_version, prev_last_update) = snapshot
+    plan = {"app_id": app_id, "app_url": app_url, "crawl": True, "reason": None, "expected_new_comments": 0}
+
+    current_count = parse_rate_count(rate)
+    if not last_crawl_jalali:
+        plan["reason"] = "never-crawled"
+        plan["expected_new_comments"] = int((current_count or 0) * COMMENTS_PER_RATING)
+        return plan
+    if rate is None:
+        plan["reason"] = "no-app-info"
+        return plan
+    if prev_rate is None:
+        plan["reason"] = "no-baseline"
+        return plan
+
+    previous_count = parse_rate_count(prev_rate)
+    if current_count is not None and previous_count is not None:
+        new_ratings = current_count - previous_count
+    else:
+        # Unparsable counts: fall back to comparing the raw text
+        new_ratings = CRAWL_MIN_NEW_RATINGS if rate != prev_rate else 0
+
+    if new_ratings >= CRAWL_MIN_NEW_RATINGS:
+        plan["reason"] = "new-ratings"
+        plan["expected_new_comments"] = max(1, int(new_ratings * COMMENTS_PER_RATING))
+    elif version != prev_version or last_update != prev_last_update:
+        plan["reason"] = "new-version"
+        plan["expected_new_comments"] = VERSION_CHANGE_EXPECTED_COMMENTS
+    elif days_since_jalali(last_crawl_jalali, today) >= CRAWL_MAX_AGE_DAYS:
+        plan["reason"] = "stale"
+        plan["expected_new_comments"] = 1
+    else:
+        plan["crawl"] = False
+        plan["reason"] = "unchanged"
+    return plan
+
+
+def plan_crawl(app_ids=None):
+    """Assess every app and return the plan, apps to crawl first, by expected volume."""
+    plans = []
+    for snapshot in fetch_app_snapshots(app_ids):
+        try:
+            plans.append(assess_app(snapshot))
+        except Exception as e:
+            logger.error(f"Error assessing app_id {snapshot[0]}, crawling it anyway: {e}", exc_info=True)
+            plans.append({"app_id": snapshot[0], "app_url": snapshot[1], "crawl": True,
+                          "reason": "assessment-error", "expected_new_comments": 0})
+
+    plans.sort(key=lambda p: (not p["crawl"], -p["expected_new_comments"]))
+    selected = [p for p in plans if p["crawl"]]
+    logger.info(f"Crawl plan: {len(selected)} of {len(plans)} apps likely have new comments.")
+    for p in plans:
+        logger.info(f"  app_id {p['app_id']}: {'crawl' if p['crawl'] else 'skip'} ({p['reason']}, "
+                    f"~{p['expected_new_comments']} new comments)")
+    return plans
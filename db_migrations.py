@@ -0,0 +1,208 @@
+# Import libraries
+import argparse
+import re
+# Connect to database
+from connect_to_database_func import connect_db
+from logging_config import setup_logger
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Setup logger
+logger = setup_logger('db_migrations', 'db_migrations.log')
+
+# Versioned schema changes, applied in order and recorded in schema_migrations.
+# Table names are unqualified so the migrations follow the connection's search_path.
+# A migration whose statements use CONCURRENTLY runs outside a transaction, one statement at a time.
+MIGRATIONS = [
+    (1, "Hot-path indexes", [
+        # fetch_comments_to_analyze: WHERE app_id = %s AND sentiment_score IS NULL
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_comment_app_unscored
+           ON comment (app_id, comment_id) WHERE sentiment_score IS NULL""",
+        # get_or_create_app_id: WHERE app_nickname = %s
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_app_info_nickname
+           ON app_info (app_nickname)""",
+        # check_and_create_app_id: WHERE app_name = %s AND app_nickname = %s
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_app_info_name_nickname
+           ON app_info (app_name, app_nickname)""",
+        # update_jalali_dates: WHERE (comment_date_jalali IS NULL OR comment_date_jalali = 0) ORDER BY comment_id
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_comment_missing_jalali
+           ON comment (comment_id) WHERE (comment_date_jalali IS NULL OR comment_date_jalali = 0)""",
+        # crawl_scheduler: latest log_app snapshots per app
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_log_app_app_scraped_time
+           ON log_app (app_id, app_scraped_time DESC)""",
+    ]),
+    (2, "Sentiment analysis work leases", [
+        # sentiment_work_queue: a claimed comment is leased to one analyzer until it is scored or the lease expires
+        """ALTER TABLE comment
+           ADD COLUMN IF NOT EXISTS analysis_lease_owner TEXT,
+           ADD COLUMN IF NOT EXISTS analysis_lease_expires TIMESTAMPTZ""",
+    ]),
+    (3, "Crawl leases", [
+        # crawl_coordinator: one crawler node at a time per app, kept alive by heartbeats
+        """CREATE TABLE IF NOT EXISTS crawl_lease (
+               app_id INTEGER PRIMARY KEY,
+               owner TEXT,
+               expires_at TIMESTAMPTZ,
+               heartbeat_at TIMESTAMPTZ,
+               last_finished_at TIMESTAMPTZ,
+               last_status TEXT
+           )""",
+    ]),
+    (4, "Daily sentiment rollups", [
+        # sentiment_rollup: comment counts and score sums per app, Jalali day and sentiment
+        """CREATE TABLE IF NOT EXISTS sentiment_daily_rollup (
+               app_id INTEGER NOT NULL,
+               comment_date_jalali INTEGER NOT NULL,
+               sentiment_result TEXT NOT NULL,
+               comment_count INTEGER NOT NULL DEFAULT 0,
+               score_sum BIGINT NOT NULL DEFAULT 0,
+               PRIMARY KEY (app_id, comment_date_jalali, sentiment_result)
+           )""",
+    ]),
+    (5, "Keyset pagination index", [
+        # comment_query_api: WHERE app_id = %s AND (comment_date, comment_id) < (...) ORDER BY comment_date DESC, comment_id DESC
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_comment_app_date_id
+           ON comment (app_id, comment_date DESC, comment_id DESC)""",
+    ]),
+    (6, "Sentiment model version", [
+        # sentiment_rescore: rows scored by an older model cascade are re-scored in the background
+        """ALTER TABLE comment ADD COLUMN IF NOT EXISTS model_version TEXT""",
+    ]),
+    (7, "Complaint and praise topics", [
+        # topic_extraction: latest topics per app, Jalali date window and polarity
+        """CREATE TABLE IF NOT EXISTS app_topic (
+               app_id INTEGER NOT NULL,
+               window_key TEXT NOT NULL,
+               polarity TEXT NOT NULL,
+               topic_id INTEGER NOT NULL,
+               comment_count INTEGER NOT NULL,
+               top_terms TEXT[] NOT NULL,
+               representative_comment_ids INTEGER[] NOT NULL,
+               representative_texts TEXT[] NOT NULL,
+               updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+               PRIMARY KEY (app_id, window_key, polarity, topic_id)
+           )""",
+    ]),
+    (8, "Idempotent replay of spooled scrape logs", [
+        # scrape_spool: INSERT INTO log_app ... ON CONFLICT (spool_record_id) DO NOTHING
+        """ALTER TABLE log_app ADD COLUMN IF NOT EXISTS spool_record_id TEXT""",
+        """CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_log_app_spool_record_id
+           ON log_app (spool_record_id)""",
+    ]),
+    (9, "Idempotent replay of spooled crawls", [
+        # scrape_spool: a replayed crawl keeps the count_new_comments of its first load
+        """ALTER TABLE app_info ADD COLUMN IF NOT EXISTS last_spool_record_id TEXT""",
+    ]),
+]
+
+# Serializes migration runners across hosts
+MIGRATION_LOCK_ID = 72_500_001
+
+CONCURRENT_INDEX = re.compile(r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)", re.I)
+
+
+def drop_invalid_index(cursor, index_name):
+    """Drop an index left INVALID by an interrupted CREATE INDEX CONCURRENTLY, so it is built again."""
+    cursor.execute("""
+        SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s AND NOT i.indisvalid AND pg_table_is_visible(c.oid);
+    """, (index_name,))
+    if cursor.fetchone():
+        logger.warning(f"Dropping invalid index {index_name} before rebuilding it.")
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name};")
+
+
+def applied_versions(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+    """)
+    cursor.execute("SELECT version FROM schema_migrations;")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def apply_migration(conn, version, description, statements):
+    cursor = conn.cursor()
+    try:
+        if any("CONCURRENTLY" in statement.upper() for statement in statements):
+            # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+            conn.autocommit = True
+            for statement in statements:
+                match = CONCURRENT_INDEX.search(statement)
+                if match:
+                    drop_invalid_index(cursor, match.group(1))
+                cursor.execute(statement)
+            cursor.execute("INSERT INTO schema_migrations (version, description) VALUES (%s, %s);",
+                           (version, description))
+        else:
+            conn.autocommit = False
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.execute("INSERT INTO schema_migrations (version, description) VALUES (%s, %s);",
+                           (version, description))
+            conn.commit()
+    except Exception:
+        if not conn.autocommit:
+            conn.rollback()
+        raise
+    finally:
+        conn.autocommit = True
+        cursor.close()
+
+
+def run_migrations(conn=None, target=None):
+    """Apply every pending migration up to `target` (all by default). Returns the applied versions."""
+    own_conn = conn is None
+    conn = conn or connect_db()
+    conn.autocommit = True
+    cursor = conn.cursor()
+    applied = []
+    try:
+        cursor.execute("SELECT pg_advisory_lock(%s);", (MIGRATION_LOCK_ID,))
+        done = applied_versions(cursor)
+        for version, description, statements in MIGRATIONS:
+            if version in done or (target is not None and version > target):
+                continue
+            logger.info(f"Applying migration {version}: {description}")
+            apply_migration(conn, version, description, statements)
+            applied.append(version)
+        logger.info(f"Schema is up to date ({len(applied)} migrations applied).")
+        return applied
+    finally:
+        cursor.execute("SELECT pg_advisory_unlock(%s);", (MIGRATION_LOCK_ID,))
+        cursor.close()
+        if own_conn:
+            conn.close()
+
+
+def migration_status(conn=None):
+    """List every known migration and whether it is applied."""
+    own_conn = conn is None
+    conn = conn or connect_db()
+    conn.autocommit = True
+    cursor = conn.cursor()
+    try:
+        done = applied_versions(cursor)
+        return [{"version": v, "description": d, "applied": v in done} for v, d, _ in MIGRATIONS]
+    finally:
+        cursor.close()
+        if own_conn:
+            conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply versioned schema migrations.")
+    parser.add_argument("--status", action="store_true", help="Only show which migrations are applied")
+    parser.add_argument("--target", type=int, help="Stop after this migration version")
+    args = parser.parse_args()
+
+    if args.status:
+        for migration in migration_status():
+            print(f"{migration['version']:>4}  {'applied' if migration['applied'] else 'pending':8} {migration['description']}")
+    else:
+        print(f"Applied migrations: {run_migrations(target=args.target) or 'none'}")
@@ -0,0 +1,64 @@
+# Import libraries
+import json
+import os
+import socket
+from inference_protocol_func import (OP_SCORE, OP_SECOND_MODEL, OP_STATUS, OP_SCORE_WITH_CONFIDENCE, STATUS_OK,
+                                     decode_pairs, send_frame, receive_frame)
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Unix socket of the inference service
+INFERENCE_SOCKET = os.getenv("INFERENCE_SOCKET", "state/inference.sock")
+# Seconds to wait for one answer of the inference service; a large batch on CPU can take minutes
+INFERENCE_TIMEOUT_SECONDS = float(os.getenv("INFERENCE_TIMEOUT_SECONDS", 600))
+
+
+class InferenceServiceError(RuntimeError):
+    """The inference service answered with an error."""
+
+
+class InferenceClient:
+    """Client of inference_service.py. Each request opens its own connection, so it is safe to share between threads."""
+
+    def __init__(self, socket_path, timeout=INFERENCE_TIMEOUT_SECONDS):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def _request(self, op, strings):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            send_frame(sock, op, strings)
+            status, results = receive_frame(sock)
+        if status != STATUS_OK:
+            raise InferenceServiceError(results[0] if results else "Unknown error")
+        return results
+
+    def score_sentiments(self, texts):
+        """MT5 labels of whole reviews, in the order of `texts`."""
+        if not texts:
+            return []
+        results = self._request(OP_SCORE, list(texts))
+        if len(results) != len(texts):
+            raise InferenceServiceError(f"Expected {len(texts)} labels, got {len(results)}")
+        return results
+
+    def score_sentiments_with_confidence(self, texts):
+        """(labels, probabilities of the labels) of whole reviews."""
+        if not texts:
+            return [], []
+        pairs = decode_pairs(self._request(OP_SCORE_WITH_CONFIDENCE, list(texts)))
+        if len(pairs) != len(texts):
+            raise InferenceServiceError(f"Expected {len(texts)} labels, got {len(pairs)}")
+        return [label for label, _ in pairs], [confidence for _, confidence in pairs]
+
+    def second_model_predictions(self, texts):
+        """(label, score) of the English classifier for each translated review."""
+        if not texts:
+            return []
+        return decode_pairs(self._request(OP_SECOND_MODEL, list(texts)))
+
+    def status(self):
+        return json.loads(self._request(OP_STATUS, [])[0])
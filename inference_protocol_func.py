@@ -0,0 +1,72 @@
+# Import libraries
+import struct
+
+# Operations of the inference service
+OP_SCORE = 1  # MT5 labels of whole reviews
+OP_SECOND_MODEL = 2  # translated English classifier labels and scores
+OP_STATUS = 3  # JSON status of the serving worker
+OP_SCORE_WITH_CONFIDENCE = 4  # MT5 labels and their probabilities
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+# A frame is its length followed by a one-byte code (operation or status), a string count and the strings,
+# each as its UTF-8 length and bytes
+_FRAME_LENGTH = struct.Struct(">I")
+_HEADER = struct.Struct(">BI")
+_STRING_LENGTH = struct.Struct(">I")
+# Refuse frames larger than this instead of allocating them
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+
+
+def encode_frame(code, strings):
+    parts = [_HEADER.pack(code, len(strings))]
+    for string in strings:
+        data = string.encode("utf-8")
+        parts.append(_STRING_LENGTH.pack(len(data)))
+        parts.append(data)
+    body = b"".join(parts)
+    return _FRAME_LENGTH.pack(len(body)) + body
+
+
+def decode_frame(body):
+    """Returns (code, strings) of a frame body."""
+    code, count = _HEADER.unpack_from(body)
+    offset = _HEADER.size
+    strings = []
+    for _ in range(count):
+        (length,) = _STRING_LENGTH.unpack_from(body, offset)
+        offset += _STRING_LENGTH.size
+        strings.append(body[offset:offset + length].decode("utf-8"))
+        offset += length
+    return code, strings
+
+
+def encode_pairs(pairs):
+    """Flatten (label, number or None) pairs into strings."""
+    return [string for label, number in pairs for string in (label, "" if number is None else repr(number))]
+
+
+def decode_pairs(strings):
+    return [(label, float(number) if number else None) for label, number in zip(strings[::2], strings[1::2])]
+
+
+def _read_exactly(sock, size):
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            raise ConnectionError("Connection closed in the middle of a frame")
+        buffer.extend(chunk)
+    return bytes(buffer)
+
+
+def send_frame(sock, code, strings):
+    sock.sendall(encode_frame(code, strings))
+
+
+def receive_frame(sock):
+    (length,) = _FRAME_LENGTH.unpack(_read_exactly(sock, _FRAME_LENGTH.size))
+    if length > MAX_FRAME_BYTES:
+        raise ValueError(f"Frame of {length} bytes is over the limit")
+    return decode_frame(_read_exactly(sock, length))
@@ -0,0 +1,159 @@
+# Import libraries
+import argparse
+import gc
+import json
+import os
+import signal
+import socket
+import sys
+import time
+import analyze_sentiment
+from inference_protocol_func import (OP_SCORE, OP_SECOND_MODEL, OP_STATUS, OP_SCORE_WITH_CONFIDENCE, STATUS_OK,
+                                     STATUS_ERROR, encode_pairs, send_frame, receive_frame)
+from inference_client import INFERENCE_SOCKET
+from logging_config import setup_logger, stop_logging
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Setup logger
+logger = setup_logger('inference_service', 'inference_service.log')
+
+# Worker processes; they share the weights loaded by the parent, so each one only adds CPU
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", 2))
+# Torch threads per worker; by default the cores are split between the workers
+INFERENCE_THREADS_PER_WORKER = int(os.getenv("INFERENCE_THREADS_PER_WORKER", 0))
+# Pause before replacing a worker that died, so a crashing worker cannot spin
+RESPAWN_DELAY_SECONDS = 1
+
+
+def handle_request(op, strings):
+    if op == OP_SCORE:
+        return analyze_sentiment.score_sentiments_in_process(strings)
+    if op == OP_SCORE_WITH_CONFIDENCE:
+        confidences = []
+        labels = analyze_sentiment.score_sentiments_in_process(strings, confidences)
+        return encode_pairs(zip(labels, confidences))
+    if op == OP_SECOND_MODEL:
+        return encode_pairs(analyze_sentiment.second_model_prediction_in_process(text) for text in strings)
+    if op == OP_STATUS:
+        return [json.dumps({"pid": os.getpid(), "parent_pid": os.getppid(), "workers": INFERENCE_WORKERS,
+                            "model_version": analyze_sentiment.MODEL_VERSION,
+                            "models": analyze_sentiment.model_registry.status()})]
+    raise ValueError(f"Unknown operation: {op}")
+
+
+def serve_connection(conn):
+    """Answer the single request of a connection."""
+    try:
+        op, strings = receive_frame(conn)
+    except (ConnectionError, ValueError) as e:
+        logger.warning(f"Dropped a malformed request: {e}")
+        return
+    start = time.monotonic()
+    try:
+        send_frame(conn, STATUS_OK, handle_request(op, strings))
+    except Exception as e:
+        logger.error(f"Error serving operation {op}: {e}", exc_info=True)
+        send_frame(conn, STATUS_ERROR, [str(e)])
+    logger.debug("Served operation %s with %d texts in %.3fs", op, len(strings), time.monotonic() - start)
+
+
+def _stop_worker(signum, frame):
+    raise SystemExit(0)
+
+
+def run_worker(server, threads):
+    signal.signal(signal.SIGTERM, _stop_worker)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(threads)
+    logger.info(f"Inference worker {os.getpid()} ready with {threads} threads.")
+    while True:
+        conn, _ = server.accept()
+        with conn:
+            try:
+                serve_connection(conn)
+            except OSError as e:
+                logger.warning(f"Client connection failed: {e}")
+
+
+def spawn_worker(server, threads):
+    pid = os.fork()
+    if pid:
+        return pid
+    exit_code = 0
+    try:
+        run_worker(server, threads)
+    except SystemExit:
+        pass
+    except BaseException as e:
+        logger.error(f"Inference worker {os.getpid()} failed: {e}", exc_info=True)
+        exit_code = 1
+    finally:
+        stop_logging()
+        # Skip the parent's exit handlers
+        os._exit(exit_code)
+
+
+def serve(socket_path=INFERENCE_SOCKET, workers=INFERENCE_WORKERS, threads=INFERENCE_THREADS_PER_WORKER):
+    """Load the models once, then fork workers that share them copy-on-write and answer on a Unix socket."""
+    # Released models would be reloaded privately by each worker, so they stay loaded for the life of the service
+    analyze_sentiment.model_registry.idle_ttl = 0
+    start = time.monotonic()
+    status = analyze_sentiment.model_registry.warmup()
+    logger.info(f"Loaded {', '.join(status)} in {time.monotonic() - start:.1f}s.")
+    # Inference must not run before the fork: the workers could inherit a busy OpenMP thread pool.
+    # Moving the loaded objects out of the collector's reach keeps its bookkeeping from copying their pages.
+    gc.collect()
+    gc.freeze()
+
+    threads = threads or max(1, (os.cpu_count() or 1) // workers)
+    os.makedirs(os.path.dirname(socket_path) or ".", exist_ok=True)
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    os.chmod(socket_path, 0o660)
+    server.listen(128)
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+
+    children = set()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    try:
+        for _ in range(workers):
+            children.add(spawn_worker(server, threads))
+        logger.info(f"Inference service listening on {socket_path} with {workers} workers.")
+        while children:
+            pid, exit_status = os.wait()
+            children.discard(pid)
+            if stopping:
+                continue
+            logger.error(f"Inference worker {pid} exited with status {exit_status}; starting a new one.")
+            time.sleep(RESPAWN_DELAY_SECONDS)
+            children.add(spawn_worker(server, threads))
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        logger.info("Inference service stopped.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the sentiment models to local clients over a Unix socket.")
+    parser.add_argument("--socket", default=INFERENCE_SOCKET, help="Path of the Unix socket")
+    parser.add_argument("--workers", type=int, default=INFERENCE_WORKERS, help="Number of worker processes")
+    parser.add_argument("--threads", type=int, default=INFERENCE_THREADS_PER_WORKER,
+                        help="Torch threads per worker (0 splits the cores between the workers)")
+    args = parser.parse_args()
+    serve(args.socket, args.workers, args.threads)
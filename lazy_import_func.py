@@ -0,0 +1,21 @@
+# Import libraries
+import importlib
+
+
+class LazyModule:
+    """Stand-in for a module that is imported on first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attribute):
+        # import_module is cached in sys.modules and safe to call from several threads
+        return getattr(importlib.import_module(self._name), attribute)
+
+    def __repr__(self):
+        return f"<lazy module {self._name!r}>"
+
+
+def lazy_module(name):
+    """Defer importing a heavy module (selenium, transformers, scikit-learn) until it is first used."""
+    return LazyModule(name)
@@ -0,0 +1,152 @@
+# Import libraries
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from logging_config import setup_logger
+
+# Setup logger
+logger = setup_logger('live_profiler', 'tracing.log')
+
+# Upper bound of one capture, in case nobody stops it
+MAX_CAPTURE_SECONDS = 600
+
+_lock = threading.Lock()
+_capture = None
+
+
+class SamplingCapture:
+    """Sample the stacks of every thread of the process at a fixed interval."""
+
+    mode = "sampling"
+
+    def __init__(self, interval_seconds):
+        self.interval_seconds = interval_seconds
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval_seconds):
+            if time.monotonic() - self.started > MAX_CAPTURE_SECONDS:
+                break
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = ";".join(f"{f.name} ({f.filename.rsplit('/', 1)[-1]}:{f.lineno})"
+                                 for f in traceback.extract_stack(frame))
+                self.stacks[stack] += 1
+            self.samples += 1
+
+    def stop(self, limit):
+        self._stop.set()
+        self._thread.join()
+        functions = Counter()
+        for stack, count in self.stacks.items():
+            # Innermost frame: where the time is spent
+            functions[stack.rsplit(";", 1)[-1]] += count
+        return {
+            "samples": self.samples,
+            "top_functions": [{"function": f, "samples": c} for f, c in functions.most_common(limit)],
+            # Collapsed stacks, the input format of flame graph tools
+            "collapsed_stacks": [f"{stack} {count}" for stack, count in self.stacks.most_common(limit)],
+        }
+
+
+class CProfileCapture:
+    """
+    Deterministic profile of the RPC tasks that start while the capture is active. Python allows one active
+    profiler per process, so one task is profiled at a time; tasks that start meanwhile run unprofiled.
+    """
+
+    mode = "cprofile"
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.stats = None
+        self.tasks = 0
+        self.unprofiled_tasks = 0
+        self._stats_lock = threading.Lock()
+        self._profiling = threading.Lock()
+
+    def run(self, function, *args):
+        if not self._profiling.acquire(blocking=False):
+            return self._run_unprofiled(function, *args)
+        try:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError as e:
+                # Another profiling tool, such as a debugger, is already active
+                logger.warning(f"Running a task unprofiled: {e}")
+                return self._run_unprofiled(function, *args)
+            try:
+                return function(*args)
+            finally:
+                profile.disable()
+                with self._stats_lock:
+                    if self.stats is None:
+                        self.stats = pstats.Stats(profile)
+                    else:
+                        self.stats.add(profile)
+                    self.tasks += 1
+        finally:
+            self._profiling.release()
+
+    def _run_unprofiled(self, function, *args):
+        with self._stats_lock:
+            self.unprofiled_tasks += 1
+        return function(*args)
+
+    def stop(self, limit):
+        with self._stats_lock:
+            if self.stats is None:
+                return {"tasks": 0, "unprofiled_tasks": self.unprofiled_tasks, "profile": ""}
+            output = io.StringIO()
+            self.stats.stream = output
+            self.stats.sort_stats("cumulative").print_stats(limit)
+            return {"tasks": self.tasks, "unprofiled_tasks": self.unprofiled_tasks, "profile": output.getvalue()}
+
+
+def start_capture(mode="sampling", interval_ms=10):
+    """Start a sampling capture of all threads, or a cProfile capture of the tasks started from now on."""
+    global _capture
+    with _lock:
+        if _capture is not None:
+            raise RuntimeError(f"A {_capture.mode} capture is already running")
+        if mode == "sampling":
+            _capture = SamplingCapture(max(interval_ms, 1) / 1000)
+        elif mode == "cprofile":
+            _capture = CProfileCapture()
+        else:
+            raise ValueError(f"Unknown profile mode: {mode}")
+    logger.info(f"Started {mode} capture.")
+    return {"mode": mode}
+
+
+def stop_capture(limit=50):
+    """Stop the running capture and return its report."""
+    global _capture
+    with _lock:
+        capture, _capture = _capture, None
+    if capture is None:
+        raise RuntimeError("No capture is running")
+    report = {"mode": capture.mode, "seconds": round(time.monotonic() - capture.started, 1), **capture.stop(limit)}
+    logger.info(f"Stopped {capture.mode} capture after {report['seconds']}s.")
+    return report
+
+
+def run_profiled(function, *args):
+    """Run a task function, under cProfile when a cprofile capture is active."""
+    capture = _capture
+    if isinstance(capture, CProfileCapture):
+        return capture.run(function, *args)
+    return function(*args)
@@ -1,32 +1,156 @@
+import atexit
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import os
+import queue
+import sys
+import threading
+import time
 
 # Create logs directory if it doesn't exist
 LOG_DIR = "logs"
 os.makedirs(LOG_DIR, exist_ok=True)
 
+# "text" (default) or "json" lines in the log files
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+# Seconds between summary lines of LogSummary
+LOG_SUMMARY_SECONDS = float(os.getenv("LOG_SUMMARY_SECONDS", 30))
+
+_setup_lock = threading.Lock()
+# One file handler per log file, shared by every logger that writes to it
+_file_handlers = {}
+_stream_handler = None
+_listener = None
+# Records wait here; the listener thread does the disk and terminal I/O
+_log_queue = queue.SimpleQueue()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log shippers."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "trace_id", None):
+            entry["trace_id"] = record.trace_id
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _LogFileQueueHandler(QueueHandler):
+    """Queue records of one logger together with the file they belong to."""
+
+    def __init__(self, log_queue, log_file):
+        super().__init__(log_queue)
+        self.log_file = log_file
+
+    def prepare(self, record):
+        record = super().prepare(record)
+        record.log_file = self.log_file
+        # Trace ids live in context variables of the calling thread, so they are read here
+        tracing = sys.modules.get("tracing_func")
+        record.trace_id = tracing.current_trace_id() if tracing else None
+        return record
+
+
+class _RoutingHandler(logging.Handler):
+    """Runs on the listener thread: writes each record to its own file and to the terminal."""
+
+    def handle(self, record):
+        file_handler = _file_handlers.get(record.log_file)
+        if file_handler is not None:
+            file_handler.handle(record)
+        _stream_handler.handle(record)
+        return True
+
+
+def _file_handler(log_file):
+    file_handler = RotatingFileHandler(os.path.join(LOG_DIR, log_file), maxBytes=50 * 1024 * 1024, backupCount=5,
+                                       encoding="utf-8")
+    if LOG_FORMAT == "json":
+        file_handler.setFormatter(JsonFormatter())
+    else:
+        file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    return file_handler
+
+
+def _start_listener():
+    global _stream_handler, _listener
+    _stream_handler = logging.StreamHandler()
+    _stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    _listener = QueueListener(_log_queue, _RoutingHandler())
+    _listener.start()
+    # Flush what is still queued when the process exits
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Write out the queued records and stop the listener thread."""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+def _restart_listener_in_child():
+    # Threads do not survive fork(), so a forked worker needs its own listener to drain the queue
+    global _listener
+    if _listener is not None:
+        _listener = QueueListener(_log_queue, _RoutingHandler())
+        _listener.start()
+
+
+os.register_at_fork(after_in_child=_restart_listener_in_child)
+
+
 def setup_logger(name, log_file, level=logging.INFO):
-    """Sets up a logger with both file rotation and terminal output."""
-    # LOG_DIR = "logs"
-    # os.makedirs(LOG_DIR, exist_ok=True)
-    # File handler
-    file_handler = RotatingFileHandler(os.path.join(LOG_DIR, log_file), maxBytes=50 * 1024 * 1024, backupCount=5)
-    file_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    file_handler.setFormatter(file_formatter)
-
-    # Stream handler for terminal output
-    stream_handler = logging.StreamHandler()
-    stream_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    stream_handler.setFormatter(stream_formatter)
-
-    # Create logger
+    """Sets up a logger with both file rotation and terminal output. Calling it again returns the same logger."""
     logger = logging.getLogger(name)
-    logger.setLevel(level)
-    logger.addHandler(file_handler)
-    logger.addHandler(stream_handler)
-
-    # Debug to verify handlers
-    logger.debug(f"Logger '{name}' initialized with file handler '{log_file}' and stream handler.")
-    
-    return logger
\ No newline at end of file
+    with _setup_lock:
+        if getattr(logger, "_log_file", None) is not None:
+            return logger
+        if _listener is None:
+            _start_listener()
+        if log_file not in _file_handlers:
+            _file_handlers[log_file] = _file_handler(log_file)
+
+        logger.setLevel(level)
+        logger.addHandler(_LogFileQueueHandler(_log_queue, log_file))
+        logger.propagate = False
+        logger._log_file = log_file
+
+    logger.debug("Logger '%s' initialized with file handler '%s' and stream handler.", name, log_file)
+    return logger
+
+
+class LogSummary:
+    """
+    Count per-item events (e.g. one per scored comment) and log them as one line every `interval` seconds,
+    instead of one line per item.
+    """
+
+    def __init__(self, logger, message, interval=LOG_SUMMARY_SECONDS, level=logging.INFO):
+        self.logger = logger
+        self.message = message
+        self.interval = interval
+        self.level = level
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._started = time.monotonic()
+
+    def add(self, key, count=1):
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + count
+            due = time.monotonic() - self._started >= self.interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            counts, self._counts = self._counts, {}
+            seconds, self._started = time.monotonic() - self._started, time.monotonic()
+        if counts:
+            details = ", ".join(f"{key}={count}" for key, count in sorted(counts.items(), key=lambda item: str(item[0])))
+            self.logger.log(self.level, "%s in %.1fs: %s", self.message, seconds, details)
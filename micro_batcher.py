@@ -0,0 +1,93 @@
+# Import libraries
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from logging_config import setup_logger
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Setup logger
+logger = setup_logger('micro_batcher', 'rpc_server.log')
+
+# Largest number of items sent to the model together
+MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", 32))
+# How long the first request of a batch waits for others to join it
+MICRO_BATCH_MAX_WAIT_MS = float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", 10))
+
+
+class MicroBatcher:
+    """
+    Combine the items of concurrent requests into one call of `process_batch`, which maps a list of items
+    to a list of results of the same length. A batch is sent once it holds `max_batch_size` items or its first
+    request has waited `max_wait_ms`. While a batch runs, new requests queue up and form the next one.
+    """
+
+    def __init__(self, process_batch, max_batch_size=MICRO_BATCH_MAX_SIZE, max_wait_ms=MICRO_BATCH_MAX_WAIT_MS,
+                 name="micro-batcher"):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_ms / 1000
+        self.name = name
+        self._requests = queue.SimpleQueue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, items, timeout=None):
+        """Results for `items`, in order, once the batch holding them has run."""
+        if not items:
+            return []
+        self._start()
+        future = Future()
+        self._requests.put((list(items), future))
+        return future.result(timeout)
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _collect(self, first):
+        batch = [first]
+        size = len(first[0])
+        deadline = time.monotonic() + self.max_wait_seconds
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if size + len(request[0]) > self.max_batch_size:
+                # Too big to join; it opens the next batch
+                return batch, request
+            batch.append(request)
+            size += len(request[0])
+        return batch, None
+
+    def _run(self):
+        carried = None
+        while True:
+            first = carried if carried is not None else self._requests.get()
+            batch, carried = self._collect(first)
+            items = [item for request_items, _ in batch for item in request_items]
+            try:
+                results = self.process_batch(items)
+                if len(results) != len(items):
+                    raise ValueError(f"Batch of {len(items)} items returned {len(results)} results")
+            except Exception as e:
+                logger.error(f"Error in {self.name} batch of {len(items)} items: {e}", exc_info=True)
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            logger.debug("%s ran a batch of %d items from %d requests", self.name, len(items), len(batch))
+            offset = 0
+            for request_items, future in batch:
+                future.set_result(results[offset:offset + len(request_items)])
+                offset += len(request_items)
+
@@ -0,0 +1,116 @@
+# Import libraries
+import os
+import threading
+import time
+from contextlib import contextmanager
+from logging_config import setup_logger
+
+# Setup logger
+logger = setup_logger('model_registry', 'model_registry.log')
+
+# Loaded models unused for this many seconds are released; 0 keeps them forever
+MODEL_IDLE_TTL_SECONDS = int(os.getenv("MODEL_IDLE_TTL_SECONDS", 1800))
+# How often idle models are looked for
+MODEL_REAPER_INTERVAL_SECONDS = 60
+
+
+class _Entry:
+    def __init__(self, loader):
+        self.loader = loader
+        self.value = None
+        self.lock = threading.Lock()
+        self.users = 0
+        self.loads = 0
+        self.load_seconds = None
+        self.last_used = None
+
+
+class ModelRegistry:
+    """
+    Load models on first use (or on warmup) and release the ones idle for longer than `idle_ttl`.
+    A model is never released while a `use` block holds it.
+    """
+
+    def __init__(self, idle_ttl=MODEL_IDLE_TTL_SECONDS):
+        self.idle_ttl = idle_ttl
+        self._entries = {}
+        self._reaper = None
+        self._reaper_lock = threading.Lock()
+
+    def register(self, name, loader):
+        self._entries[name] = _Entry(loader)
+
+    def _load(self, name, entry):
+        logger.info(f"Loading model {name}...")
+        start = time.monotonic()
+        entry.value = entry.loader()
+        entry.load_seconds = round(time.monotonic() - start, 2)
+        entry.loads += 1
+        logger.info(f"Loaded model {name} in {entry.load_seconds}s.")
+        self._start_reaper()
+
+    @contextmanager
+    def use(self, name):
+        """Hold a model for the block, loading it first if needed."""
+        entry = self._entries[name]
+        with entry.lock:
+            if entry.value is None:
+                self._load(name, entry)
+            entry.users += 1
+            value = entry.value
+        try:
+            yield value
+        finally:
+            with entry.lock:
+                entry.users -= 1
+                entry.last_used = time.monotonic()
+
+    def warmup(self, names=None):
+        """Load the given models (all by default) now. Returns their status."""
+        for name in names or list(self._entries):
+            with self.use(name):
+                pass
+        return self.status()
+
+    def release(self, name):
+        entry = self._entries[name]
+        with entry.lock:
+            if entry.value is None or entry.users:
+                return False
+            entry.value = None
+        logger.info(f"Released model {name}.")
+        return True
+
+    def release_idle(self):
+        now = time.monotonic()
+        released = []
+        for name, entry in self._entries.items():
+            if entry.value is not None and not entry.users and now - (entry.last_used or now) > self.idle_ttl:
+                if self.release(name):
+                    released.append(name)
+        return released
+
+    def _start_reaper(self):
+        with self._reaper_lock:
+            if self.idle_ttl <= 0 or self._reaper is not None:
+                return
+            self._reaper = threading.Thread(target=self._reap, name="model-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap(self):
+        while True:
+            time.sleep(min(MODEL_REAPER_INTERVAL_SECONDS, self.idle_ttl))
+            self.release_idle()
+
+    def status(self):
+        now = time.monotonic()
+        return {
+            name: {
+                "loaded": entry.value is not None,
+                "in_use": entry.users,
+                "loads": entry.loads,
+                "load_seconds": entry.load_seconds,
+                "idle_seconds": round(now - entry.last_used, 1) if entry.last_used and not entry.users else None,
+            }
+            for name, entry in self._entries.items()
+        }
@@ -0,0 +1,98 @@
+# Import libraries
+import os
+import random
+import zlib
+from collections import defaultdict
+from normalize_persian_text_func import duplicate_key
+
+# MinHash signature length, split into LSH bands of NUM_PERM / LSH_BANDS rows
+MINHASH_NUM_PERM = int(os.getenv("MINHASH_NUM_PERM", 64))
+LSH_BANDS = int(os.getenv("LSH_BANDS", 16))
+SHINGLE_SIZE = int(os.getenv("SHINGLE_SIZE", 4))
+# Estimated Jaccard similarity of character shingles above which two comments are one cluster
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", 0.8))
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+class NearDuplicateDetector:
+    """Group near-identical comments with MinHash over character shingles and LSH banding."""
+
+    def __init__(self, num_perm=MINHASH_NUM_PERM, bands=LSH_BANDS, shingle_size=SHINGLE_SIZE,
+                 threshold=NEAR_DUPLICATE_THRESHOLD, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+        rng = random.Random(seed)
+        self._permutations = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+                              for _ in range(num_perm)]
+
+    def shingles(self, key):
+        if len(key) <= self.shingle_size:
+            return {key}
+        return {key[i:i + self.shingle_size] for i in range(len(key) - self.shingle_size + 1)}
+
+    def signature(self, key):
+        hashes = [zlib.crc32(shingle.encode("utf-8")) for shingle in self.shingles(key)]
+        return tuple(
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self._permutations
+        )
+
+    def similarity(self, signature_a, signature_b):
+        """Estimated Jaccard similarity of two signatures."""
+        return sum(x == y for x, y in zip(signature_a, signature_b)) / self.num_perm
+
+    def cluster(self, texts):
+        """
+        Cluster normalized texts. Returns lists of indexes into `texts`, each list in input order;
+        the first index of a cluster is its representative.
+        """
+        parent = list(range(len(texts)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        def union(i, j):
+            root_i, root_j = find(i), find(j)
+            if root_i != root_j:
+                parent[max(root_i, root_j)] = min(root_i, root_j)
+
+        # Identical keys are merged without hashing; an empty key says nothing about the text, so it stays alone
+        first_by_key = {}
+        keys = [duplicate_key(text) for text in texts]
+        for i, key in enumerate(keys):
+            if not key:
+                continue
+            if key in first_by_key:
+                union(first_by_key[key], i)
+            else:
+                first_by_key[key] = i
+
+        signatures = {i: self.signature(key) for key, i in first_by_key.items()}
+        buckets = defaultdict(list)
+        for i, signature in signatures.items():
+            for band in range(self.bands):
+                buckets[(band, signature[band * self.rows:(band + 1) * self.rows])].append(i)
+
+        for candidates in buckets.values():
+            for position, j in enumerate(candidates):
+                for i in candidates[:position]:
+                    if find(i) == find(j):
+                        break
+                    if self.similarity(signatures[i], signatures[j]) >= self.threshold:
+                        union(i, j)
+                        break
+
+        clusters = defaultdict(list)
+        for i in range(len(texts)):
+            clusters[find(i)].append(i)
+        return sorted(clusters.values())
@@ -0,0 +1,47 @@
+# Import libraries
+import re
+
+# Arabic letters and digits that have a Persian form
+CHARACTER_MAP = str.maketrans({
+    "ي": "ی", "ى": "ی",  # Arabic yeh, alef maksura -> Persian yeh
+    "ك": "ک",  # Arabic kaf -> Persian keheh
+    "ة": "ه",  # teh marbuta -> heh
+    **{chr(0x0660 + i): str(i) for i in range(10)},  # Arabic-Indic digits
+    **{chr(0x06F0 + i): str(i) for i in range(10)},  # Persian digits
+})
+ZWNJ = "\u200c"
+
+# Harakat, superscript alef and tatweel
+DIACRITICS = re.compile("[\u064b-\u065f\u0670\u0640]")
+# Zero-width spaces and joiners, bidi marks and BOM; ZWNJ is kept
+INVISIBLE = re.compile("[\u200b\u200d\u200e\u200f\u202a-\u202e\u2066-\u2069\ufeff]")
+# The same letter three or more times in a row ("عاااالی"); digit runs are numbers and stay as they are
+REPEATED = re.compile(r"([^\W\d_])\1{2,}")
+ZWNJ_RUN = re.compile(f"{ZWNJ}{{2,}}")
+# ZWNJ next to a space or at either end of the text joins nothing
+ZWNJ_AT_BOUNDARY = re.compile(rf"\s*{ZWNJ}\s+|\s+{ZWNJ}\s*|^{ZWNJ}|{ZWNJ}$")
+WHITESPACE = re.compile(r"\s+")
+# Emoji and pictographs, dropped from duplicate keys
+EMOJI = re.compile("[\U0001F000-\U0001FAFF\u2600-\u27bf\u2b00-\u2bff\ufe0f]")
+
+
+def normalize_persian_text(text):
+    """Normalize a comment before inference: Persian letters, no diacritics, tidy ZWNJ, no letter stretching."""
+    if not text:
+        return ""
+    text = text.translate(CHARACTER_MAP)
+    text = DIACRITICS.sub("", text)
+    text = INVISIBLE.sub("", text)
+    text = REPEATED.sub(r"\1", text)
+    text = ZWNJ_RUN.sub(ZWNJ, text)
+    text = ZWNJ_AT_BOUNDARY.sub(" ", text)
+    return WHITESPACE.sub(" ", text).strip()
+
+
+def duplicate_key(text):
+    """
+    Aggressive form of a normalized comment used to find near duplicates: no emoji, ZWNJ or spaces.
+    Comments with nothing else, such as emoji-only ones, get an empty key and are not duplicates of anything.
+    """
+    text = EMOJI.sub("", text)
+    return text.replace(ZWNJ, "").replace(" ", "").lower()
@@ -0,0 +1,49 @@
+# Import libraries
+import threading
+from urllib.parse import urlparse, urlencode, parse_qsl, urlunparse
+from selenium.webdriver.chrome.options import Options
+
+ACCEPT_LANGUAGE = "fa-IR,fa;q=0.9"
+
+# Pages that came back in English although the Persian locale was forced
+_lock = threading.Lock()
+_locale_misses = 0
+
+
+def persian_url(url):
+    """Return the URL with the `l=fa` language parameter Cafe Bazaar understands."""
+    parsed = urlparse(url)
+    query = dict(parse_qsl(parsed.query))
+    query["l"] = "fa"
+    return urlunparse(parsed._replace(query=urlencode(query)))
+
+
+def persian_chrome_options():
+    """Chrome options that ask for Persian pages."""
+    chrome_options = Options()
+    chrome_options.add_argument("--lang=fa")
+    chrome_options.add_argument(f"--accept-lang={ACCEPT_LANGUAGE}")
+    chrome_options.add_experimental_option("prefs", {"intl.accept_languages": ACCEPT_LANGUAGE})
+    return chrome_options
+
+
+def apply_persian_locale(driver):
+    """Force the Accept-Language header and the JS locale of a Chrome session through CDP."""
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setExtraHTTPHeaders", {"headers": {"Accept-Language": ACCEPT_LANGUAGE}})
+    try:
+        driver.execute_cdp_cmd("Emulation.setLocaleOverride", {"locale": "fa-IR"})
+    except Exception:
+        # Already overridden in this session
+        pass
+
+
+def record_locale_miss():
+    global _locale_misses
+    with _lock:
+        _locale_misses += 1
+
+
+def locale_miss_count():
+    with _lock:
+        return _locale_misses
@@ -0,0 +1,345 @@
+# Import libraries
+import argparse
+import atexit
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import date, datetime
+import psycopg2
+from psycopg2 import errors
+from psycopg2.extras import execute_values
+# Connect to database
+from connect_to_database_func import connect_db
+from sentiment_rollup import record_new_comments
+from logging_config import setup_logger
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Setup logger
+logger = setup_logger('scrape_spool', 'scrape_spool.log')
+
+# Scraped data is appended here first and loaded into Postgres by the drainer
+SPOOL_DIR = os.getenv("SPOOL_DIR", "state/spool")
+# Set to false to write straight to the database, as before the spool
+SPOOL_ENABLED = os.getenv("SPOOL_ENABLED", "true").lower() in ("1", "true", "yes")
+# fsync every record, so a crash of the scraper process loses nothing that was reported as written
+SPOOL_FSYNC = os.getenv("SPOOL_FSYNC", "true").lower() in ("1", "true", "yes")
+# A segment is sealed for draining once it reaches this size
+SPOOL_SEGMENT_BYTES = int(os.getenv("SPOOL_SEGMENT_BYTES", 16 * 1024 * 1024))
+# Drainer wake-up interval, and the longest pause between retries while Postgres is unavailable
+SPOOL_DRAIN_INTERVAL_SECONDS = float(os.getenv("SPOOL_DRAIN_INTERVAL_SECONDS", 5))
+SPOOL_MAX_BACKOFF_SECONDS = 300
+
+# Segments being written end in .open (locked by their writer); sealed ones end in .jsonl.
+# A .offset file next to a segment holds the number of its records already loaded.
+OPEN_SUFFIX = ".open"
+SEALED_SUFFIX = ".jsonl"
+OFFSET_SUFFIX = ".offset"
+# Records the database refuses are moved to a file next to their segment; renamed to .jsonl, it is drained again
+REJECTED_SUFFIX = ".rejected"
+# Unlocked open segments older than this are sealed by the drainer
+ABANDONED_SEGMENT_SECONDS = 60
+# Errors every record would hit: the database is unreachable or not migrated yet. The drainer backs off and retries
+# them; any other error is a problem of the record, which is rejected so the records after it still load.
+RETRYABLE_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError, errors.UndefinedTable,
+                    errors.UndefinedColumn, errors.InvalidColumnReference)
+
+INSERT_COMMENTS_QUERY = """
+INSERT INTO public.comment (app_id, user_name, comment_text, comment_rating, comment_date, second_model_processed, comment_idd, comment_date_jalali)
+VALUES %s
+ON CONFLICT (comment_idd) DO NOTHING
+RETURNING app_id, comment_date_jalali;
+"""
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Cannot spool a value of type {type(value).__name__}")
+
+
+def insert_comment_rows(cursor, rows):
+    """Insert `comment` rows, skipping known comment_idd values, and count the new ones in the rollups."""
+    inserted = execute_values(cursor, INSERT_COMMENTS_QUERY, rows, fetch=True)
+    record_new_comments(cursor, inserted)
+    return len(inserted)
+
+
+# Loaders run inside the drainer's transaction and must be idempotent: a record may be loaded twice after a crash
+def load_crawl(cursor, record):
+    new_comments_count = insert_comment_rows(cursor, [tuple(row) for row in record["rows"]]) if record["rows"] else 0
+    # A replay inserts no comments; it keeps the count of the first load instead of resetting it to 0
+    cursor.execute("""
+        INSERT INTO public.app_info (app_id, count_scraped_comments, count_new_comments, last_update_comment_scraping,
+                                     last_spool_record_id)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (app_id) DO UPDATE
+        SET count_scraped_comments = EXCLUDED.count_scraped_comments,
+            count_new_comments = CASE WHEN app_info.last_spool_record_id = EXCLUDED.last_spool_record_id
+                                      THEN app_info.count_new_comments ELSE EXCLUDED.count_new_comments END,
+            last_update_comment_scraping = EXCLUDED.last_update_comment_scraping,
+            last_spool_record_id = EXCLUDED.last_spool_record_id;
+    """, (record["app_id"], record["count_scraped_comments"], new_comments_count, record["comment_scraped_time"],
+          record["id"]))
+    logger.info(f"Loaded {new_comments_count} new of {len(record['rows'])} spooled comments for app_id {record['app_id']}.")
+
+
+def load_scrape_log(cursor, record):
+    data = record["data"]
+    cursor.execute("""
+        INSERT INTO log_app (
+            app_id, app_name, app_name_company, app_version, app_total_rate,
+            app_average_rate, app_install, app_category, app_size,
+            app_last_update, app_scraped_time, app_scraped_time_jalali, app_nickname, spool_record_id
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (spool_record_id) DO NOTHING;
+    """, (
+        record["app_id"], data['App_Name'], data['App_Name_Company'], data['App_Version'],
+        data['App_Total_Rate'], data['App_Average_Rate'], data['App_Install'],
+        data['App_Category'], data['App_Size'], data['App_Last_Update'],
+        record["app_scraped_time"], record["app_scraped_time_jalali"], record["app_nickname"], record["id"],
+    ))
+
+
+LOADERS = {"crawl": load_crawl, "scrape_log": load_scrape_log}
+# Fields of the scraped app data that go into log_app; the icon is not spooled
+SCRAPE_LOG_FIELDS = ("App_Name", "App_Name_Company", "App_Version", "App_Total_Rate", "App_Average_Rate",
+                     "App_Install", "App_Category", "App_Size", "App_Last_Update")
+
+
+class ScrapeSpool:
+    """
+    Append-only spool of scraped data, one JSON record per line. Each process appends to its own segment;
+    the drainer of any process seals segments and loads them in order, one transaction per record.
+    """
+
+    def __init__(self, directory=SPOOL_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._drain_lock = threading.Lock()
+        self._file = None
+        self._path = None
+        self._wake = threading.Event()
+        self._drainer = None
+        self.last_error = None
+        self.last_drain = None
+        self.loaded_records = 0
+        self.rejected_records = 0
+
+    def append(self, kind, record):
+        """Durably write one record and wake the drainer. Returns the record id."""
+        record = dict(record, kind=kind, id=uuid.uuid4().hex)
+        line = json.dumps(record, ensure_ascii=False, default=_json_default).encode("utf-8") + b"\n"
+        with self._lock:
+            if self._file is None:
+                self._open_segment()
+            self._file.write(line)
+            self._file.flush()
+            if SPOOL_FSYNC:
+                os.fsync(self._file.fileno())
+            if self._file.tell() >= SPOOL_SEGMENT_BYTES:
+                self._seal_locked()
+        self.start_drainer()
+        self._wake.set()
+        return record["id"]
+
+    def _open_segment(self):
+        os.makedirs(self.directory, exist_ok=True)
+        # Names sort in creation order
+        self._path = os.path.join(self.directory, f"{time.time_ns():020d}-{os.getpid()}{OPEN_SUFFIX}")
+        self._file = open(self._path, "ab")
+        # Held while the segment is written, so other processes know it is not abandoned
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+
+    def _seal_locked(self):
+        os.replace(self._path, self._path[:-len(OPEN_SUFFIX)] + SEALED_SUFFIX)
+        self._file.close()
+        self._file = None
+        self._path = None
+
+    def seal(self):
+        """Close the segment being written, so it can be drained."""
+        with self._lock:
+            if self._file is not None:
+                self._seal_locked()
+
+    def _seal_abandoned(self):
+        # Open segments nobody holds a lock on belong to processes that exited without sealing them
+        for path in sorted(glob.glob(os.path.join(self.directory, f"*{OPEN_SUFFIX}"))):
+            # A segment is locked right after it is created; a young one may not be locked yet
+            if path == self._path or time.time() - os.path.getmtime(path) < ABANDONED_SEGMENT_SECONDS:
+                continue
+            try:
+                with open(path, "rb") as f:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    os.replace(path, path[:-len(OPEN_SUFFIX)] + SEALED_SUFFIX)
+                    logger.warning(f"Sealed abandoned spool segment {os.path.basename(path)}.")
+            except (BlockingIOError, FileNotFoundError):
+                continue
+
+    def pending_segments(self):
+        return sorted(glob.glob(os.path.join(self.directory, f"*{SEALED_SUFFIX}")))
+
+    def drain(self):
+        """Load every sealed segment into Postgres. Returns the number of records loaded; raises if the database fails."""
+        with self._drain_lock:
+            self.seal()
+            self._seal_abandoned()
+            loaded = 0
+            for path in self.pending_segments():
+                loaded += self._drain_segment(path)
+            self.last_drain = datetime.now().isoformat(timespec="seconds")
+            self.last_error = None
+            return loaded
+
+    def _drain_segment(self, path):
+        offset_path = path[:-len(SEALED_SUFFIX)] + OFFSET_SUFFIX
+        try:
+            segment = open(path, "rb")
+        except FileNotFoundError:
+            return 0
+        with segment:
+            try:
+                fcntl.flock(segment, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Another process is draining it
+                return 0
+            if os.fstat(segment.fileno()).st_nlink == 0:
+                # Finished and removed by another process after we opened it
+                return 0
+            done = 0
+            if os.path.exists(offset_path):
+                with open(offset_path) as f:
+                    done = int(f.read() or 0)
+
+            loaded = 0
+            conn = connect_db()
+            cursor = conn.cursor()
+            try:
+                for number, line in enumerate(segment):
+                    if number < done:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Only a record cut short by a crash can be unreadable; its writer never got an answer
+                        logger.error(f"Skipping unreadable record {number} of spool segment {os.path.basename(path)}.")
+                        continue
+                    try:
+                        LOADERS[record["kind"]](cursor, record)
+                        conn.commit()
+                        loaded += 1
+                    except RETRYABLE_ERRORS:
+                        raise
+                    except Exception as e:
+                        conn.rollback()
+                        self._reject(path, number, line, e)
+                    with open(offset_path, "w") as f:
+                        f.write(str(number + 1))
+            except Exception:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    # The connection is already gone
+                    pass
+                raise
+            finally:
+                cursor.close()
+                conn.close()
+
+            os.remove(path)
+            if os.path.exists(offset_path):
+                os.remove(offset_path)
+        self.loaded_records += loaded
+        logger.info(f"Loaded {loaded} records of spool segment {os.path.basename(path)}.")
+        return loaded
+
+    def _reject(self, path, number, line, error):
+        rejected_path = path[:-len(SEALED_SUFFIX)] + REJECTED_SUFFIX
+        with open(rejected_path, "ab") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        self.rejected_records += 1
+        logger.error(f"Rejected record {number} of spool segment {os.path.basename(path)}, "
+                     f"moved to {os.path.basename(rejected_path)}: {error}")
+
+    def start_drainer(self):
+        """Drain in a background thread, backing off while the database is unavailable."""
+        with self._lock:
+            if self._drainer is None:
+                self._drainer = threading.Thread(target=self._drain_forever, name="spool-drainer", daemon=True)
+                self._drainer.start()
+
+    def _drain_forever(self):
+        backoff = SPOOL_DRAIN_INTERVAL_SECONDS
+        while True:
+            self._wake.wait(SPOOL_DRAIN_INTERVAL_SECONDS)
+            self._wake.clear()
+            try:
+                self.drain()
+                backoff = SPOOL_DRAIN_INTERVAL_SECONDS
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning(f"Spool drain failed, retrying in {backoff:.0f}s: {e}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, SPOOL_MAX_BACKOFF_SECONDS)
+
+    def status(self):
+        segments = self.pending_segments()
+        return {
+            "enabled": SPOOL_ENABLED,
+            "pending_segments": len(segments),
+            "pending_bytes": sum(os.path.getsize(path) for path in segments if os.path.exists(path)),
+            "loaded_records": self.loaded_records,
+            "rejected_records": self.rejected_records,
+            "rejected_files": len(glob.glob(os.path.join(self.directory, f"*{REJECTED_SUFFIX}"))),
+            "last_drain": self.last_drain,
+            "last_error": self.last_error,
+        }
+
+
+spool = ScrapeSpool()
+# A segment left open at exit is sealed, so any process's drainer can pick it up
+atexit.register(spool.seal)
+
+
+def spool_crawl(app_id, comments_data, count_scraped_comments, comment_scraped_time):
+    """Spool the comment rows of one crawl together with its app_info counters."""
+    return spool.append("crawl", {"app_id": app_id, "rows": comments_data,
+                                  "count_scraped_comments": count_scraped_comments,
+                                  "comment_scraped_time": comment_scraped_time})
+
+
+def spool_scrape_log(data, app_id, app_nickname, app_scraped_time, app_scraped_time_jalali):
+    data = {field: data[field] for field in SCRAPE_LOG_FIELDS}
+    return spool.append("scrape_log", {"data": data, "app_id": app_id, "app_nickname": app_nickname,
+                                       "app_scraped_time": app_scraped_time,
+                                       "app_scraped_time_jalali": app_scraped_time_jalali})
+
+
+def drain_spool():
+    """Load spooled data now, e.g. before analyzing freshly crawled comments. Never raises."""
+    if not SPOOL_ENABLED:
+        return 0
+    try:
+        return spool.drain()
+    except Exception as e:
+        spool.last_error = str(e)
+        logger.warning(f"Spool drain failed; the data stays spooled: {e}")
+        return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load spooled scrape data into the database.")
+    parser.add_argument("--status", action="store_true", help="Only show the pending segments")
+    args = parser.parse_args()
+    if not args.status:
+        print(f"Loaded {spool.drain()} records.")
+    print(spool.status())
@@ -0,0 +1,178 @@
+# Import libraries
+import argparse
+import os
+import threading
+import time
+from itertools import groupby
+# Connect to database
+from connect_to_database_func import connect_db
+from analyze_sentiment import MODEL_VERSION, analyze_and_update_sentiment, sentiment_summary
+from sentiment_work_queue import ANALYSIS_LEASE_SECONDS
+from worker_id_func import worker_id
+from logging_config import setup_logger
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Setup logger
+logger = setup_logger('sentiment_rescore', 'analyze_sentiment.log')
+
+# Outdated comments leased and re-scored together
+RESCORE_CHUNK_SIZE = int(os.getenv("RESCORE_CHUNK_SIZE", 64))
+# Share of wall time spent scoring; the re-scorer sleeps the rest
+RESCORE_DUTY_CYCLE = min(max(float(os.getenv("RESCORE_DUTY_CYCLE", 0.5)), 0.01), 1.0)
+# Back off while the database runs more active queries than this
+RESCORE_MAX_ACTIVE_QUERIES = int(os.getenv("RESCORE_MAX_ACTIVE_QUERIES", 8))
+# Wait between checks while fresh comments or live load have priority
+RESCORE_BACKOFF_SECONDS = int(os.getenv("RESCORE_BACKOFF_SECONDS", 30))
+
+
+def _app_filter(app_ids, params):
+    if not app_ids:
+        return ""
+    params.append(list(app_ids))
+    return " AND app_id = ANY(%s)"
+
+
+def count_outdated(app_ids=None, model_version=MODEL_VERSION):
+    """Scored comments whose sentiment comes from another model version."""
+    params = [model_version]
+    query = """
+        SELECT count(*) FROM comment
+        WHERE sentiment_score IS NOT NULL AND model_version IS DISTINCT FROM %s
+    """ + _app_filter(app_ids, params)
+    conn = connect_db()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, params)
+        return cursor.fetchone()[0]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def live_load(cursor):
+    """Why re-scoring should wait right now, or None when the pipeline is idle enough."""
+    # Fresh comments leased to an analyzer: the live pipeline is running
+    cursor.execute("""
+        SELECT EXISTS (
+            SELECT 1 FROM comment
+            WHERE sentiment_score IS NULL AND analysis_lease_expires > now()
+        );
+    """)
+    if cursor.fetchone()[0]:
+        return "fresh comments are being analyzed"
+    cursor.execute("""
+        SELECT count(*) FROM pg_stat_activity
+        WHERE state = 'active' AND datname = current_database() AND pid <> pg_backend_pid();
+    """)
+    active = cursor.fetchone()[0]
+    if active > RESCORE_MAX_ACTIVE_QUERIES:
+        return f"{active} active database queries"
+    return None
+
+
+def claim_outdated(cursor, owner, after_id, app_ids=None, chunk_size=RESCORE_CHUNK_SIZE,
+                   model_version=MODEL_VERSION):
+    """Lease the next chunk of outdated comments after `after_id`, skipping rows other workers hold."""
+    params = [owner, ANALYSIS_LEASE_SECONDS, model_version, after_id]
+    app_filter = _app_filter(app_ids, params)
+    params.append(chunk_size)
+    cursor.execute(f"""
+        UPDATE comment AS c
+        SET analysis_lease_owner = %s,
+            analysis_lease_expires = now() + make_interval(secs => %s)
+        WHERE c.comment_id IN (
+            SELECT comment_id FROM comment
+            WHERE sentiment_score IS NOT NULL AND model_version IS DISTINCT FROM %s AND comment_id > %s
+              AND (analysis_lease_expires IS NULL OR analysis_lease_expires < now()){app_filter}
+            ORDER BY comment_id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING c.app_id, c.comment_id, c.comment_text, c.comment_rating;
+    """, params)
+    return sorted(cursor.fetchall())
+
+
+def release_outdated(cursor, owner, comment_ids):
+    cursor.execute("""
+        UPDATE comment SET analysis_lease_owner = NULL, analysis_lease_expires = NULL
+        WHERE analysis_lease_owner = %s AND comment_id = ANY(%s);
+    """, (owner, list(comment_ids)))
+
+
+def rescore_outdated(app_ids=None, max_rows=None, stop_event=None, progress=None):
+    """
+    Re-score comments scored by an older model version, one leased chunk at a time.
+    Yields to live analysis and database load, and sleeps between chunks to keep to RESCORE_DUTY_CYCLE.
+    `progress` (a dict) is updated in place so callers can report it while the run goes on.
+    """
+    stop_event = stop_event or threading.Event()
+    progress = progress if progress is not None else {}
+    owner = worker_id()
+    progress.update({"model_version": MODEL_VERSION, "total": count_outdated(app_ids), "done": 0,
+                     "last_comment_id": 0, "rows_per_second": 0.0, "paused": None})
+    logger.info(f"Re-scoring {progress['total']} comments with model version {MODEL_VERSION}.")
+
+    conn = connect_db()
+    conn.autocommit = True
+    cursor = conn.cursor()
+    scoring_seconds = 0.0
+    try:
+        while not stop_event.is_set() and (max_rows is None or progress["done"] < max_rows):
+            reason = live_load(cursor)
+            if reason:
+                if progress["paused"] != reason:
+                    logger.info(f"Re-scoring paused: {reason}.")
+                progress["paused"] = reason
+                stop_event.wait(RESCORE_BACKOFF_SECONDS)
+                continue
+            progress["paused"] = None
+
+            chunk_size = RESCORE_CHUNK_SIZE
+            if max_rows is not None:
+                chunk_size = min(chunk_size, max_rows - progress["done"])
+            rows = claim_outdated(cursor, owner, progress["last_comment_id"], app_ids, chunk_size)
+            if not rows:
+                break
+
+            chunk_start = time.monotonic()
+            try:
+                for app_id, app_rows in groupby(rows, key=lambda row: row[0]):
+                    analyze_and_update_sentiment([row[1:] for row in app_rows], app_id)
+            except Exception:
+                release_outdated(cursor, owner, [row[1] for row in rows])
+                raise
+            chunk_seconds = time.monotonic() - chunk_start
+            scoring_seconds += chunk_seconds
+
+            progress["done"] += len(rows)
+            progress["last_comment_id"] = max(row[1] for row in rows)
+            progress["rows_per_second"] = round(progress["done"] / max(scoring_seconds, 1e-6), 2)
+            logger.info(f"Re-scored {progress['done']} of {progress['total']} comments "
+                        f"up to comment_id {progress['last_comment_id']} ({progress['rows_per_second']} rows/s).")
+
+            # Leave the rest of the time to the live pipeline
+            stop_event.wait(chunk_seconds * (1 - RESCORE_DUTY_CYCLE) / RESCORE_DUTY_CYCLE)
+    finally:
+        cursor.close()
+        conn.close()
+
+    progress["paused"] = None
+    sentiment_summary.flush()
+    logger.info(f"Re-scoring {'stopped' if stop_event.is_set() else 'finished'} after {progress['done']} comments.")
+    return progress
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-score comments scored by an older sentiment model version.")
+    parser.add_argument("--app-id", type=int, action="append", help="Only re-score this app (repeatable)")
+    parser.add_argument("--max-rows", type=int, help="Stop after this many comments")
+    parser.add_argument("--count", action="store_true", help="Only print the number of outdated comments")
+    args = parser.parse_args()
+    if args.count:
+        print(f"{count_outdated(args.app_id)} comments are not scored with {MODEL_VERSION}.")
+    else:
+        print(rescore_outdated(args.app_id, args.max_rows))
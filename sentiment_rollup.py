@@ -0,0 +1,143 @@
+# Import libraries
+import argparse
+from collections import defaultdict
+from psycopg2.extras import execute_values
+# Connect to database
+from connect_to_database_func import connect_db
+from logging_config import setup_logger
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Setup logger
+logger = setup_logger('sentiment_rollup', 'sentiment_rollup.log')
+
+# Bucket of comments that have no sentiment yet
+UNSCORED = "unscored"
+# Results that carry no real score and are left out of averages
+EXCLUDED_FROM_AVERAGE = (UNSCORED, "Missed Value")
+
+
+def apply_rollup_deltas(cursor, deltas):
+    """
+    Add {(app_id, comment_date_jalali, sentiment_result): (count_delta, score_delta)} to the rollup table.
+    Runs on the caller's cursor, so the rollup commits together with the comment change.
+    """
+    rows = [(app_id, date or 0, result or UNSCORED, count, score)
+            for (app_id, date, result), (count, score) in deltas.items() if count or score]
+    if not rows:
+        return
+    execute_values(cursor, """
+        INSERT INTO sentiment_daily_rollup AS r (app_id, comment_date_jalali, sentiment_result, comment_count, score_sum)
+        VALUES %s
+        ON CONFLICT (app_id, comment_date_jalali, sentiment_result) DO UPDATE
+        SET comment_count = r.comment_count + EXCLUDED.comment_count,
+            score_sum = r.score_sum + EXCLUDED.score_sum;
+    """, sorted(rows))
+
+
+def record_new_comments(cursor, inserted):
+    """Count newly inserted comments, given as (app_id, comment_date_jalali) pairs, as unscored."""
+    deltas = defaultdict(lambda: [0, 0])
+    for app_id, comment_date_jalali in inserted:
+        deltas[(app_id, comment_date_jalali, UNSCORED)][0] += 1
+    apply_rollup_deltas(cursor, deltas)
+
+
+def record_sentiment_change(cursor, app_id, comment_date_jalali, old_result, old_score, new_result, new_score):
+    """Move one comment from its old sentiment bucket to the new one."""
+    deltas = defaultdict(lambda: [0, 0])
+    deltas[(app_id, comment_date_jalali, old_result or UNSCORED)][0] -= 1
+    deltas[(app_id, comment_date_jalali, old_result or UNSCORED)][1] -= old_score or 0
+    deltas[(app_id, comment_date_jalali, new_result)][0] += 1
+    deltas[(app_id, comment_date_jalali, new_result)][1] += new_score or 0
+    apply_rollup_deltas(cursor, deltas)
+
+
+def rebuild_rollups(app_id=None):
+    """Recompute the rollups of one app (or all apps) from the comment table."""
+    conn = connect_db()
+    cursor = conn.cursor()
+    try:
+        where = "WHERE app_id = %s" if app_id else ""
+        params = (app_id,) if app_id else ()
+        cursor.execute(f"DELETE FROM sentiment_daily_rollup {where};", params)
+        cursor.execute(f"""
+            INSERT INTO sentiment_daily_rollup (app_id, comment_date_jalali, sentiment_result, comment_count, score_sum)
+            SELECT app_id, COALESCE(comment_date_jalali, 0), COALESCE(sentiment_result, %s),
+                   count(*), COALESCE(sum(sentiment_score), 0)
+            FROM comment {where}
+            GROUP BY 1, 2, 3;
+        """, (UNSCORED, *params))
+        rows = cursor.rowcount
+        conn.commit()
+        logger.info(f"Rebuilt {rows} rollup rows for {'app_id ' + str(app_id) if app_id else 'all apps'}.")
+        return rows
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error rebuilding rollups: {e}", exc_info=True)
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def sentiment_trend(app_ids, date_from, date_to):
+    """Per app and Jalali day: comment counts per sentiment and the average score of scored comments."""
+    conn = connect_db()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT app_id, comment_date_jalali, sentiment_result, comment_count, score_sum
+            FROM sentiment_daily_rollup
+            WHERE app_id = ANY(%s) AND comment_date_jalali BETWEEN %s AND %s AND comment_count > 0
+            ORDER BY app_id, comment_date_jalali;
+        """, (list(app_ids), date_from, date_to))
+        days = {}
+        for app_id, date, result, count, score_sum in cursor.fetchall():
+            day = days.setdefault((app_id, date), {"app_id": app_id, "date": date, "counts": {},
+                                                   "scored": 0, "score_sum": 0})
+            day["counts"][result] = count
+            if result not in EXCLUDED_FROM_AVERAGE:
+                day["scored"] += count
+                day["score_sum"] += score_sum
+        for day in days.values():
+            day["average_score"] = round(day["score_sum"] / day["scored"], 3) if day["scored"] else None
+        return list(days.values())
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def compare_apps(app_ids, date_from, date_to):
+    """Totals per app over a Jalali date range, for comparing apps side by side."""
+    conn = connect_db()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT app_id, sentiment_result, sum(comment_count), sum(score_sum)
+            FROM sentiment_daily_rollup
+            WHERE app_id = ANY(%s) AND comment_date_jalali BETWEEN %s AND %s
+            GROUP BY app_id, sentiment_result;
+        """, (list(app_ids), date_from, date_to))
+        apps = {app_id: {"app_id": app_id, "counts": {}, "scored": 0, "score_sum": 0} for app_id in app_ids}
+        for app_id, result, count, score_sum in cursor.fetchall():
+            app = apps[app_id]
+            app["counts"][result] = int(count)
+            if result not in EXCLUDED_FROM_AVERAGE:
+                app["scored"] += int(count)
+                app["score_sum"] += int(score_sum)
+        for app in apps.values():
+            app["average_score"] = round(app["score_sum"] / app["scored"], 3) if app["scored"] else None
+        return list(apps.values())
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the daily sentiment rollups from the comment table.")
+    parser.add_argument("--app-id", type=int, help="Only rebuild this app")
+    args = parser.parse_args()
+    print(f"Rebuilt {rebuild_rollups(args.app_id)} rollup rows.")
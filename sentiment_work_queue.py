@@ -0,0 +1,96 @@
+# Import libraries
+import os
+# Connect to database
+from connect_to_database_func import connect_db
+from worker_id_func import worker_id
+from logging_config import setup_logger
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Setup logger
+logger = setup_logger('sentiment_work_queue', 'analyze_sentiment.log')
+
+# Comments claimed at once by one analyzer
+ANALYSIS_BATCH_SIZE = int(os.getenv("ANALYSIS_BATCH_SIZE", 32))
+# A claimed batch returns to the queue if it is not scored within this many seconds
+ANALYSIS_LEASE_SECONDS = int(os.getenv("ANALYSIS_LEASE_SECONDS", 600))
+
+
+def claim_comments_to_analyze(app_id, owner, batch_size=ANALYSIS_BATCH_SIZE, lease_seconds=ANALYSIS_LEASE_SECONDS):
+    """
+    Lease up to `batch_size` unscored comments of an app to `owner`.
+    SKIP LOCKED lets concurrent analyzers claim disjoint batches; expired leases are claimed again.
+    """
+    conn = connect_db()
+    cursor = conn.cursor()
+    try:
+        query = """
+            UPDATE comment AS c
+            SET analysis_lease_owner = %s,
+                analysis_lease_expires = now() + make_interval(secs => %s)
+            WHERE c.comment_id IN (
+                SELECT comment_id FROM comment
+                WHERE app_id = %s AND sentiment_score IS NULL
+                  AND (analysis_lease_expires IS NULL OR analysis_lease_expires < now())
+                ORDER BY comment_id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING c.comment_id, c.comment_text, c.comment_rating;
+        """
+        cursor.execute(query, (owner, lease_seconds, app_id, batch_size))
+        comments = sorted(cursor.fetchall())
+        conn.commit()
+        logger.debug("Claimed %d comments of app_id %s for %s.", len(comments), app_id, owner)
+        return comments
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error claiming comments for app_id {app_id}: {e}", exc_info=True)
+        return []
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def release_leases(owner, comment_ids=None):
+    """Return comments leased to `owner` (all of them by default) to the queue without scoring them."""
+    conn = connect_db()
+    cursor = conn.cursor()
+    try:
+        query = """
+            UPDATE comment SET analysis_lease_owner = NULL, analysis_lease_expires = NULL
+            WHERE analysis_lease_owner = %s AND sentiment_score IS NULL
+        """
+        params = [owner]
+        if comment_ids is not None:
+            query += " AND comment_id = ANY(%s)"
+            params.append(list(comment_ids))
+        cursor.execute(query, params)
+        released = cursor.rowcount
+        conn.commit()
+        if released:
+            logger.info(f"Released {released} leased comments of {owner}.")
+        return released
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error releasing leases of {owner}: {e}", exc_info=True)
+        return 0
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def iter_claimed_batches(app_id, owner=None, batch_size=ANALYSIS_BATCH_SIZE, lease_seconds=ANALYSIS_LEASE_SECONDS):
+    """Yield leased batches of an app until no unclaimed comment is left."""
+    owner = owner or worker_id()
+    while True:
+        comments = claim_comments_to_analyze(app_id, owner, batch_size, lease_seconds)
+        if not comments:
+            return
+        try:
+            yield comments
+        except GeneratorExit:
+            release_leases(owner, [comment[0] for comment in comments])
+            raise
@@ -0,0 +1,152 @@
+# Import libraries
+import json
+import os
+import random
+import threading
+from datetime import datetime, timedelta
+from logging_config import setup_logger
+
+# Setup logger
+logger = setup_logger('task_scheduler', 'daily_task.log')
+
+# Last run of every scheduler is kept here, so a restart knows what it missed
+STATE_DIR = "state"
+os.makedirs(STATE_DIR, exist_ok=True)
+
+# Never sleep longer than this, so wall-clock jumps (NTP, suspend) are noticed
+MAX_SLEEP_SECONDS = 60
+
+
+class DailyScheduler:
+    """
+    Run a job once a day at hour:minute.
+
+    Each day has one slot. A slot that was missed while the process was down, or while the
+    previous run was still going, is run as soon as possible if it is no older than
+    `catch_up_window`; several missed slots are coalesced into one run.
+    """
+
+    def __init__(self, name, job, hour, minute, jitter_seconds=0, catch_up_window=timedelta(hours=12)):
+        self.name = name
+        self.job = job
+        self.hour = hour
+        self.minute = minute
+        self.jitter_seconds = jitter_seconds
+        self.catch_up_window = catch_up_window
+        self.state_file = os.path.join(STATE_DIR, f"{name}_schedule.json")
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._running = False
+        self._run_requested = False
+        self._next_fire_time = None
+        self._state = self._load_state()
+
+    def _load_state(self):
+        try:
+            with open(self.state_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self):
+        try:
+            with open(self.state_file, "w") as f:
+                json.dump(self._state, f)
+        except OSError as e:
+            logger.error(f"Could not save scheduler state to {self.state_file}: {e}")
+
+    def slot_at_or_before(self, now):
+        """The most recent scheduled time that is not after `now`."""
+        slot = now.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+        return slot if slot <= now else slot - timedelta(days=1)
+
+    def next_fire_time(self, now):
+        """When the scheduler should next run the job, including catch-up and jitter."""
+        slot = self.slot_at_or_before(now)
+        last_slot = self._state.get("last_slot")
+        if (last_slot is None or datetime.fromisoformat(last_slot) < slot) and now - slot <= self.catch_up_window:
+            fire_slot = slot
+        else:
+            fire_slot = slot + timedelta(days=1)
+        # Jitter is derived from the slot so it stays the same across wakeups
+        jitter = random.Random(f"{self.name}{fire_slot.isoformat()}").uniform(0, self.jitter_seconds)
+        return fire_slot, fire_slot + timedelta(seconds=jitter)
+
+    def _run(self, slot, reason):
+        with self._lock:
+            self._running = True
+            self._state["last_started"] = datetime.now().isoformat(timespec="seconds")
+        logger.info(f"Scheduler '{self.name}': starting run for slot {slot} ({reason}).")
+        status, summary = "completed", None
+        try:
+            summary = self.job()
+        except Exception as e:
+            status = "failed"
+            logger.error(f"Scheduler '{self.name}': run failed: {e}", exc_info=True)
+        with self._lock:
+            self._running = False
+            self._state.update({
+                "last_slot": slot.isoformat(),
+                "last_finished": datetime.now().isoformat(timespec="seconds"),
+                "last_status": status,
+                "last_summary": summary if isinstance(summary, dict) else None,
+            })
+            self._save_state()
+        logger.info(f"Scheduler '{self.name}': run for slot {slot} {status}.")
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            now = datetime.now()
+            slot, fire_time = self.next_fire_time(now)
+            with self._lock:
+                self._next_fire_time = fire_time
+                run_requested, self._run_requested = self._run_requested, False
+
+            if run_requested:
+                # A manual run covers the current slot, so it is not repeated later today
+                self._run(self.slot_at_or_before(now), "requested")
+            elif fire_time <= now:
+                self._run(slot, "scheduled" if now - fire_time < timedelta(minutes=5) else "catch-up")
+            else:
+                self._wakeup.wait(min((fire_time - now).total_seconds(), MAX_SLEEP_SECONDS))
+                self._wakeup.clear()
+
+    def start(self):
+        """Start the scheduler in a daemon thread."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._loop, name=f"scheduler-{self.name}", daemon=True)
+            self._thread.start()
+            logger.info(f"Scheduler '{self.name}' started: daily at {self.hour:02d}:{self.minute:02d}.")
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+
+    def run_forever(self):
+        """Run the scheduler in the calling thread."""
+        self._loop()
+
+    def run_now(self):
+        """Request an immediate run; a request made while a run is going is coalesced into one more run."""
+        with self._lock:
+            self._run_requested = True
+        self._wakeup.set()
+
+    def status(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "schedule": f"{self.hour:02d}:{self.minute:02d}",
+                "running": self._running,
+                "run_requested": self._run_requested,
+                "next_run": self._next_fire_time.isoformat(timespec="seconds") if self._next_fire_time else None,
+                "last_slot": self._state.get("last_slot"),
+                "last_started": self._state.get("last_started"),
+                "last_finished": self._state.get("last_finished"),
+                "last_status": self._state.get("last_status"),
+                "last_summary": self._state.get("last_summary"),
+            }
@@ -0,0 +1,339 @@
+# Import libraries
+import argparse
+import heapq
+import os
+import pickle
+import re
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+from sklearn.utils import murmurhash3_32
+from scipy import sparse
+from psycopg2.extras import execute_values
+# Connect to database
+from connect_to_database_func import connect_db
+from normalize_persian_text_func import normalize_persian_text
+from logging_config import setup_logger
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Setup logger
+logger = setup_logger('topic_extraction', 'topic_extraction.log')
+
+# Complaint (negative) and praise (positive) topics per app
+POLARITIES = {"complaint": "sentiment_score < 0", "praise": "sentiment_score > 0"}
+TOPIC_CLUSTERS = int(os.getenv("TOPIC_CLUSTERS", 8))
+# Comments read, vectorized and fitted together; bounds the memory of one pass
+TOPIC_CHUNK_SIZE = int(os.getenv("TOPIC_CHUNK_SIZE", 5000))
+# Hashed feature space of unigrams and bigrams
+TOPIC_FEATURES = 2 ** int(os.getenv("TOPIC_FEATURE_BITS", 18))
+TOPIC_TOP_TERMS = int(os.getenv("TOPIC_TOP_TERMS", 10))
+TOPIC_REPRESENTATIVES = int(os.getenv("TOPIC_REPRESENTATIVES", 3))
+REPRESENTATIVE_TEXT_LENGTH = 300
+# Topic sizes and representatives are recounted over the whole window with the current centres once the comments
+# added since the last recount exceed this share of all comments; in between, only new comments are counted
+TOPIC_RECOUNT_FRACTION = float(os.getenv("TOPIC_RECOUNT_FRACTION", 0.2))
+# Fitted models and watermarks, one file per app, window and polarity
+MODEL_DIR = os.path.join("state", "topics")
+
+WORD = re.compile(r"[^\W\d_]{2,}")
+# Common Persian function words and app-store filler that would dominate every topic
+STOPWORDS = set("""
+و در به از که این را با است برای آن یک تا هم من ما شما او بود شد می نمی های ها ای هست نیست
+ولی اما یا اگر چون پس باید دارد داره کنم کنید کرد کردم شده میشه نمیشه خیلی بسیار همه هر چه چرا
+رو هی دیگه فقط الان واقعا لطفا برنامه اپ اپلیکیشن
+""".split())
+
+
+def tokenize(text):
+    """Unigrams and bigrams of a normalized comment, without stopwords."""
+    words = [word for word in WORD.findall(normalize_persian_text(text)) if word not in STOPWORDS]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+# Stateless: new comments are vectorized without refitting a vocabulary; input is already tokenized
+vectorizer = HashingVectorizer(analyzer=list, n_features=TOPIC_FEATURES, alternate_sign=False, norm=None)
+
+
+def feature_index(term):
+    """Column of a term in the hashed feature space, as computed by the vectorizer."""
+    return abs(murmurhash3_32(term, positive=False)) % TOPIC_FEATURES
+
+
+def window_key(date_from=None, date_to=None):
+    return f"{date_from or 'start'}-{date_to or 'end'}"
+
+
+class TopicModel:
+    """Incremental TF-IDF + mini-batch k-means over the comments of one app, window and polarity."""
+
+    def __init__(self, n_clusters=TOPIC_CLUSTERS):
+        self.kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=0, n_init=3)
+        self.document_frequency = np.zeros(TOPIC_FEATURES, dtype=np.int64)
+        self.documents = 0
+        # Hashed feature -> one term that maps to it, for printing top terms
+        self.terms = {}
+        self.counts = np.zeros(n_clusters, dtype=np.int64)
+        # Per topic: heap of (-distance, comment_id, text) of the comments closest to its centre
+        self.representatives = [[] for _ in range(n_clusters)]
+        self.last_comment_id = 0
+        # Documents fitted when counts and representatives were last recomputed from every comment
+        self.recounted_documents = 0
+        # Comments seen before there were enough to initialise the clusters
+        self.pending = None
+
+    @property
+    def fitted(self):
+        return hasattr(self.kmeans, "cluster_centers_")
+
+    def _tfidf(self, counts):
+        idf = np.log((1 + self.documents) / (1 + self.document_frequency)) + 1
+        return normalize(sparse.csr_matrix(counts.multiply(idf)))
+
+    def _remember_terms(self, tokens):
+        for term in set(term for document in tokens for term in document):
+            self.terms.setdefault(feature_index(term), term)
+
+    def partial_fit(self, rows):
+        """Fit (comment_id, comment_text) rows: update document frequencies and move the cluster centres."""
+        rows = list(rows)
+        tokens = [tokenize(text) for _, text in rows]
+        counts = vectorizer.transform(tokens)
+        self.document_frequency += np.bincount(counts.indices, minlength=TOPIC_FEATURES)
+        self.documents += len(rows)
+        self._remember_terms(tokens)
+
+        if self.pending:
+            pending_rows, pending_counts = self.pending
+            rows, counts = pending_rows + rows, sparse.vstack([pending_counts, counts]).tocsr()
+        if not self.fitted and len(rows) < self.kmeans.n_clusters:
+            self.pending = (rows, counts)
+            return
+        self.pending = None
+        self.kmeans.partial_fit(self._tfidf(counts))
+
+    def _nearest(self, texts):
+        distances = self.kmeans.transform(self._tfidf(vectorizer.transform([tokenize(text) for text in texts])))
+        labels = distances.argmin(axis=1)
+        return labels, distances[np.arange(len(texts)), labels]
+
+    def _offer_representatives(self, rows, labels, distances):
+        for (comment_id, text), label, distance in zip(rows, labels, distances):
+            heap = self.representatives[label]
+            entry = (-float(distance), comment_id, text[:REPRESENTATIVE_TEXT_LENGTH])
+            if len(heap) < TOPIC_REPRESENTATIVES:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+
+    def assign(self, rows):
+        """Count (comment_id, comment_text) rows in their nearest topic with the current centres."""
+        rows = list(rows)
+        labels, distances = self._nearest([text for _, text in rows])
+        np.add.at(self.counts, labels, 1)
+        self._offer_representatives(rows, labels, distances)
+
+    def needs_recount(self):
+        # Models saved before recounts existed have never been recounted
+        recounted = getattr(self, "recounted_documents", 0)
+        return self.documents - recounted > TOPIC_RECOUNT_FRACTION * self.documents
+
+    def reset_stats(self):
+        """Forget counts and representatives before a recount of every comment."""
+        self.counts[:] = 0
+        self.representatives = [[] for _ in range(self.kmeans.n_clusters)]
+        self.recounted_documents = self.documents
+
+    def rerank_representatives(self):
+        """Move the kept representatives to their nearest topic under the current centres."""
+        rows = [(comment_id, text) for heap in self.representatives for _, comment_id, text in heap]
+        self.representatives = [[] for _ in range(self.kmeans.n_clusters)]
+        if rows:
+            # Distances come from the stored, possibly shortened texts
+            labels, distances = self._nearest([text for _, text in rows])
+            self._offer_representatives(rows, labels, distances)
+
+    def topics(self):
+        """Topics, largest first: comment count, top terms and representative comments."""
+        if not self.fitted:
+            return []
+        topics = []
+        for topic_id, centre in enumerate(self.kmeans.cluster_centers_):
+            if not self.counts[topic_id]:
+                continue
+            heaviest = np.argpartition(centre, -TOPIC_TOP_TERMS)[-TOPIC_TOP_TERMS:]
+            top = [self.terms[i] for i in heaviest[np.argsort(centre[heaviest])[::-1]]
+                   if centre[i] > 0 and i in self.terms]
+            closest = sorted(self.representatives[topic_id], reverse=True)
+            topics.append({
+                "topic_id": topic_id,
+                "comment_count": int(self.counts[topic_id]),
+                "top_terms": top[:TOPIC_TOP_TERMS],
+                "representative_comment_ids": [comment_id for _, comment_id, _ in closest],
+                "representative_texts": [text for _, _, text in closest],
+            })
+        return sorted(topics, key=lambda topic: -topic["comment_count"])
+
+
+def model_path(app_id, window, polarity):
+    return os.path.join(MODEL_DIR, f"{app_id}_{window}_{polarity}.pkl")
+
+
+def load_model(app_id, window, polarity):
+    try:
+        with open(model_path(app_id, window, polarity), "rb") as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return TopicModel()
+
+
+def save_model(app_id, window, polarity, topic_model):
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    path = model_path(app_id, window, polarity)
+    with open(path + ".tmp", "wb") as f:
+        pickle.dump(topic_model, f)
+    os.replace(path + ".tmp", path)
+
+
+def scored_watermark(cursor, app_id):
+    """Highest comment_id below which every comment of the app is scored; later ones may still change."""
+    cursor.execute("""
+        SELECT COALESCE(
+            (SELECT min(comment_id) - 1 FROM comment WHERE app_id = %s AND sentiment_score IS NULL),
+            (SELECT max(comment_id) FROM comment WHERE app_id = %s),
+            0);
+    """, (app_id, app_id))
+    return cursor.fetchone()[0]
+
+
+def store_topics(cursor, app_id, window, polarity, topics):
+    cursor.execute("DELETE FROM app_topic WHERE app_id = %s AND window_key = %s AND polarity = %s;",
+                   (app_id, window, polarity))
+    if topics:
+        execute_values(cursor, """
+            INSERT INTO app_topic (app_id, window_key, polarity, topic_id, comment_count, top_terms,
+                                   representative_comment_ids, representative_texts)
+            VALUES %s;
+        """, [(app_id, window, polarity, t["topic_id"], t["comment_count"], t["top_terms"],
+               t["representative_comment_ids"], t["representative_texts"]) for t in topics])
+
+
+def extract_topics(app_id, date_from=None, date_to=None, rebuild=False, chunk_size=TOPIC_CHUNK_SIZE):
+    """
+    Update the complaint and praise topics of an app for a Jalali date window (YYYYMMDD, open by default).
+    Only comments scored since the last run are read, streamed in chunks; `rebuild` starts from scratch.
+    """
+    window = window_key(date_from, date_to)
+    read_conn = connect_db()
+    write_conn = connect_db()
+    write_cursor = write_conn.cursor()
+    summary = {}
+
+    def stream(polarity, condition, first_id, last_id, handle_chunk):
+        """Pass the window's comments with first_id < comment_id <= last_id to handle_chunk, chunk by chunk."""
+        query = f"""
+            SELECT comment_id, comment_text FROM comment
+            WHERE app_id = %s AND comment_id > %s AND comment_id <= %s
+              AND {condition} AND sentiment_result <> 'Missed Value'
+        """
+        params = [app_id, first_id, last_id]
+        if date_from is not None:
+            query += " AND comment_date_jalali >= %s"
+            params.append(date_from)
+        if date_to is not None:
+            query += " AND comment_date_jalali <= %s"
+            params.append(date_to)
+        query += " ORDER BY comment_id"
+
+        # Named cursor: only one chunk of comments is in memory at a time
+        read_cursor = read_conn.cursor(name=f"topics_{polarity}")
+        read_cursor.itersize = chunk_size
+        streamed = 0
+        try:
+            read_cursor.execute(query, params)
+            while True:
+                rows = read_cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                handle_chunk(rows)
+                streamed += len(rows)
+        finally:
+            read_cursor.close()
+        read_conn.commit()
+        return streamed
+
+    try:
+        watermark = scored_watermark(write_cursor, app_id)
+        for polarity, condition in POLARITIES.items():
+            topic_model = TopicModel() if rebuild else load_model(app_id, window, polarity)
+            previous_comment_id = topic_model.last_comment_id
+            added = stream(polarity, condition, previous_comment_id, watermark, topic_model.partial_fit)
+            topic_model.last_comment_id = max(topic_model.last_comment_id, watermark)
+
+            # Counts and representatives are taken with the centres as they are now, not as they were when each
+            # comment was fitted
+            if topic_model.fitted:
+                if topic_model.needs_recount():
+                    topic_model.reset_stats()
+                    stream(polarity, condition, 0, watermark, topic_model.assign)
+                elif added:
+                    topic_model.rerank_representatives()
+                    stream(polarity, condition, previous_comment_id, watermark, topic_model.assign)
+
+            topics = topic_model.topics()
+            store_topics(write_cursor, app_id, window, polarity, topics)
+            write_conn.commit()
+            save_model(app_id, window, polarity, topic_model)
+            summary[polarity] = {"new_comments": added, "comments": topic_model.documents, "topics": len(topics)}
+            logger.info(f"Updated {len(topics)} {polarity} topics of app_id {app_id} ({window}) "
+                        f"with {added} new comments.")
+        return summary
+    except Exception as e:
+        write_conn.rollback()
+        logger.error(f"Error extracting topics for app_id {app_id}: {e}", exc_info=True)
+        raise
+    finally:
+        write_cursor.close()
+        write_conn.close()
+        read_conn.close()
+
+
+def get_topics(app_id, polarity=None, date_from=None, date_to=None):
+    """Stored topics of an app and window, largest first."""
+    query = """
+        SELECT polarity, topic_id, comment_count, top_terms, representative_comment_ids,
+               representative_texts, updated_at
+        FROM app_topic WHERE app_id = %s AND window_key = %s
+    """
+    params = [app_id, window_key(date_from, date_to)]
+    if polarity:
+        query += " AND polarity = %s"
+        params.append(polarity)
+    query += " ORDER BY polarity, comment_count DESC;"
+    conn = connect_db()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, params)
+        columns = [column[0] for column in cursor.description]
+        topics = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        for topic in topics:
+            topic["updated_at"] = topic["updated_at"].isoformat()
+        return topics
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract complaint and praise topics of an app.")
+    parser.add_argument("app_id", type=int)
+    parser.add_argument("--date-from", type=int, help="Jalali date YYYYMMDD")
+    parser.add_argument("--date-to", type=int, help="Jalali date YYYYMMDD")
+    parser.add_argument("--rebuild", action="store_true", help="Refit from scratch instead of updating")
+    args = parser.parse_args()
+    print(extract_topics(args.app_id, args.date_from, args.date_to, args.rebuild))
+    for topic in get_topics(args.app_id, date_from=args.date_from, date_to=args.date_to):
+        print(f"[{topic['polarity']}] {topic['comment_count']}: {', '.join(topic['top_terms'])}")
@@ -0,0 +1,117 @@
+# Import libraries
+import contextvars
+import functools
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from logging_config import setup_logger
+
+# Setup logger
+logger = setup_logger('tracing', 'tracing.log')
+
+# Spans are timed unless switched off here or through the set_tracing RPC method
+_enabled = os.getenv("TRACING_ENABLED", "true").lower() in ("1", "true", "yes")
+# Spans slower than this are logged with their trace id
+TRACE_SLOW_SPAN_SECONDS = float(os.getenv("TRACE_SLOW_SPAN_SECONDS", 30))
+# Finished spans kept for trace_spans
+TRACE_RECENT_SPANS = int(os.getenv("TRACE_RECENT_SPANS", 2000))
+# Per-trace totals kept; the oldest are dropped first
+TRACE_MAX_STATS = 5000
+
+_trace_id = contextvars.ContextVar("trace_id", default=None)
+_lock = threading.Lock()
+# (trace_id, span name) -> [count, total seconds, max seconds]
+_stats = defaultdict(lambda: [0, 0.0, 0.0])
+_recent = deque(maxlen=TRACE_RECENT_SPANS)
+
+
+def set_tracing(enabled):
+    global _enabled
+    _enabled = bool(enabled)
+    logger.info(f"Tracing {'enabled' if _enabled else 'disabled'}.")
+
+
+def tracing_enabled():
+    return _enabled
+
+
+def current_trace_id():
+    return _trace_id.get()
+
+
+@contextmanager
+def trace(name):
+    """Run the block under a new trace id, e.g. one per RPC task run. Yields the trace id."""
+    trace_id = f"{name}-{uuid.uuid4().hex[:8]}"
+    token = _trace_id.set(trace_id)
+    try:
+        yield trace_id
+    finally:
+        _trace_id.reset(token)
+
+
+@contextmanager
+def span(name, **attributes):
+    """Time a stage (fetch, infer, second_model, db_write, page_load, extract) of the current trace."""
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        trace_id = _trace_id.get()
+        with _lock:
+            stats = _stats[(trace_id, name)]
+            if len(_stats) > TRACE_MAX_STATS:
+                del _stats[next(iter(_stats))]
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+            _recent.append({"trace_id": trace_id, "span": name, "seconds": round(seconds, 4),
+                            "thread": threading.current_thread().name, **attributes})
+        if seconds > TRACE_SLOW_SPAN_SECONDS:
+            logger.warning(f"Slow span {name} ({seconds:.1f}s) in trace {trace_id}: {attributes}")
+
+
+def traced(name):
+    """Decorator form of span()."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def span_stats(trace_id=None):
+    """Count, total and max seconds per span name, for one trace or summed over all of them."""
+    totals = defaultdict(lambda: [0, 0.0, 0.0])
+    with _lock:
+        for (span_trace_id, name), (count, seconds, longest) in _stats.items():
+            if trace_id is not None and span_trace_id != trace_id:
+                continue
+            total = totals[name]
+            total[0] += count
+            total[1] += seconds
+            total[2] = max(total[2], longest)
+    return {name: {"count": count, "seconds": round(seconds, 3), "max_seconds": round(longest, 3),
+                   "mean_ms": round(seconds / count * 1000, 2)}
+            for name, (count, seconds, longest) in sorted(totals.items(), key=lambda item: -item[1][1])}
+
+
+def recent_spans(trace_id=None, limit=100):
+    with _lock:
+        spans = [s for s in _recent if trace_id is None or s["trace_id"] == trace_id]
+    return spans[-limit:]
+
+
+def reset_spans():
+    with _lock:
+        _stats.clear()
+        _recent.clear()
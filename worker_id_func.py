@@ -0,0 +1,9 @@
+# Import libraries
+import os
+import socket
+import threading
+
+
+def worker_id():
+    """Identify a worker (crawler or analyzer) across hosts, processes and threads, e.g. as a lease owner."""
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"